@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Throughput of concurrent tool calls against a slow local Spotify stand-in.
+
+Compares running spotipy inline on the event loop (the old behaviour) with
+the bounded thread-pool dispatcher and the native async backend. The
+response cache, single-flight coalescing, playback watcher, rate limit and
+lane concurrency limit are turned off, so every call is a real upstream
+request.
+
+    python benchmarks/bench_dispatch.py --calls 32 --latency 0.2 --workers 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_spotify import FakeSpotifyServer, prepare_home
+
+
+class InlineDispatcher:
+    """Calls spotipy directly on the loop, as the tools used to."""
+
+    timeout = None
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        return fn(*args, **kwargs)
+
+
+async def run_calls(server, calls: int) -> float:
+    start = time.perf_counter()
+    results = await asyncio.gather(*(server.current_track() for _ in range(calls)))
+    elapsed = time.perf_counter() - start
+    if hasattr(server.sp, "aclose"):
+        await server.sp.aclose()
+    errors = [r for r in results if r.startswith("Error")]
+    if errors:
+        raise RuntimeError(errors[0])
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=32, help="concurrent tool calls")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake API latency in seconds")
+    parser.add_argument("--workers", type=int, default=8, help="dispatcher pool size")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    fake = FakeSpotifyServer(("127.0.0.1", 0), latency=args.latency).start()
+    with tempfile.TemporaryDirectory() as home:
+        prepare_home(Path(home))
+        os.environ.update(
+            MUSIC_MCP_CACHE="0",
+            MUSIC_MCP_ETAG_CACHE="0",
+            MUSIC_MCP_WATCH="0",
+            MUSIC_MCP_RATE="100000",
+            MUSIC_MCP_BURST=str(args.calls),
+            MUSIC_MCP_INTERACTIVE_CONCURRENCY=str(args.calls),
+        )
+        import spotipy
+        from music_mcp_server import server
+        from music_mcp_server.async_client import AsyncSpotify
+        from music_mcp_server.dispatch import Dispatcher
+        from music_mcp_server.singleflight import SingleFlight
+
+        server.singleflight = SingleFlight(methods=frozenset())
+
+        blocking = spotipy.Spotify(auth="fake-access")
+        blocking.prefix = fake.url
+        native = AsyncSpotify(auth="fake-access", max_connections=args.calls)
+        native.prefix = fake.url
+
+        print(f"{args.calls} concurrent current_track calls, {args.latency * 1000:.0f} ms upstream latency")
+        for label, client, dispatcher in [
+            ("inline (blocking loop)", blocking, InlineDispatcher()),
+            (f"dispatcher ({args.workers} workers)", blocking, Dispatcher(max_workers=args.workers)),
+            ("async backend", native, Dispatcher()),
+        ]:
+            server.sp = client
+            server.dispatcher = dispatcher
+            elapsed = asyncio.run(run_calls(server, args.calls))
+            print(f"  {label:<28} {elapsed:7.2f} s  {args.calls / elapsed:7.1f} calls/s")
+            if isinstance(dispatcher, Dispatcher):
+                dispatcher.shutdown()
+    fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
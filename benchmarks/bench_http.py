@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Many simultaneous MCP sessions against one streamable HTTP server.
+
+Starts `music-mcp-server --transport streamable-http` against the local fake
+Web API, opens --sessions client sessions at once, and has each make --calls
+tool calls from a mix of playback, search and playlist reads. Reports the
+connect and call latency percentiles, throughput, the upstream and token
+requests it took, and the server's peak RSS. With --stdio the same sessions
+each spawn their own stdio server instead, the way editors run it otherwise,
+for comparison (the RSS reported is then that of the largest process).
+
+    python benchmarks/bench_http.py --sessions 48 --calls 20 --latency 0.05
+    python benchmarks/bench_http.py --sessions 48 --calls 20 --latency 0.05 --stdio
+    python benchmarks/bench_http.py --sessions 64 --max-concurrency 16 --env MUSIC_MCP_RATE=100
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_spotify import FakeLibrary, FakeSpotifyServer, prepare_home
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+# A client's tool calls, as a function of (session, call number). Sessions
+# repeat each other's searches and playlist reads, as a team sharing a
+# library would.
+WORKLOAD = [
+    ("current_track", lambda s, n: {}),
+    ("search_tracks", lambda s, n: {"query": f"team {(s + n) % 8}", "limit": 10}),
+    ("get_playlists", lambda s, n: {}),
+    ("get_playlist_tracks", lambda s, n: {"playlist_id": f"playlist{(s + n) % 4:04d}", "limit": 100}),
+    ("get_devices", lambda s, n: {}),
+]
+
+
+def percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited with status {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise SystemExit(f"server did not listen on port {port} within {timeout:g}s")
+
+
+class Barrier:
+    """Releases everyone waiting once parties have arrived."""
+
+    def __init__(self, parties: int):
+        self.parties = parties
+        self.arrived = 0
+        self.released = 0.0
+        self.event = asyncio.Event()
+
+    async def wait(self) -> None:
+        self.arrived += 1
+        if self.arrived >= self.parties:
+            self.released = time.perf_counter()
+            self.event.set()
+        await self.event.wait()
+
+
+async def exercise(session: ClientSession, number: int, calls: int, start: Barrier) -> tuple[float, list[float], int]:
+    """Initialize one session, wait for the others, then run its calls; return (connect s, call s, errors)."""
+    begin = time.perf_counter()
+    await session.initialize()
+    connected = time.perf_counter() - begin
+    await start.wait()
+    latencies, errors = [], 0
+    for n in range(calls):
+        name, make_args = WORKLOAD[(number + n) % len(WORKLOAD)]
+        begin = time.perf_counter()
+        result = await session.call_tool(name, make_args(number, n))
+        latencies.append(time.perf_counter() - begin)
+        text = result.content[0].text if result.content else ""
+        errors += result.isError or text.startswith("Error")
+    return connected, latencies, errors
+
+
+async def run_sessions(args, connect) -> tuple[list[tuple[float, list[float], int]], float]:
+    """
+    Run args.sessions sessions at once, each over connect(number), an async
+    context giving its streams. Return their results and the seconds from the
+    first call to the last.
+    """
+    start = Barrier(args.sessions)
+
+    async def one(number: int):
+        async with connect(number) as streams:
+            async with ClientSession(streams[0], streams[1]) as session:
+                result = await exercise(session, number, args.calls, start)
+                return result, time.perf_counter()
+
+    finished = await asyncio.gather(*(one(i) for i in range(args.sessions)))
+    return [result for result, _ in finished], max(end for _, end in finished) - start.released
+
+
+def report(args, fake: FakeSpotifyServer, results, elapsed: float, before: tuple[int, int], label: str) -> None:
+    connects = [r[0] * 1000 for r in results]
+    latencies = [t * 1000 for r in results for t in r[1]]
+    total = len(latencies)
+    print(
+        f"{label}: {args.sessions} sessions x {args.calls} calls\n"
+        f"  connect   p50 {percentile(connects, 50):7.1f} ms  p99 {percentile(connects, 99):7.1f} ms\n"
+        f"  calls     p50 {percentile(latencies, 50):7.1f} ms  p95 {percentile(latencies, 95):7.1f} ms  "
+        f"p99 {percentile(latencies, 99):7.1f} ms\n"
+        f"  {total / elapsed:.1f} calls/s, {sum(r[2] for r in results)} errors, "
+        f"{fake.request_count - before[0]} upstream requests, {fake.token_count - before[1]} token requests"
+    )
+    # Every server has exited and been reaped by now; ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(f"  server peak RSS: {peak / (2**20 if sys.platform == 'darwin' else 2**10):.1f} MB")
+
+
+async def bench_http(args, fake: FakeSpotifyServer, env: dict) -> None:
+    port = free_port()
+    command = [sys.executable, "-m", "music_mcp_server.cli", "--transport", "streamable-http", "--port", str(port)]
+    if args.max_concurrency is not None:
+        command += ["--max-concurrency", str(args.max_concurrency)]
+    if args.workers is not None:
+        command += ["--workers", str(args.workers)]
+    with open(os.devnull, "w") as devnull:
+        server = subprocess.Popen(command, env=env, cwd=str(ROOT), stdout=devnull, stderr=devnull)
+    try:
+        wait_for_port(port, server)
+        url = f"http://127.0.0.1:{port}/mcp"
+        before = fake.request_count, fake.token_count
+        results, elapsed = await run_sessions(args, lambda number: streamablehttp_client(url, timeout=120))
+    finally:
+        server.terminate()
+        server.wait()
+    report(args, fake, results, elapsed, before, "one streamable HTTP server")
+
+
+async def bench_stdio(args, fake: FakeSpotifyServer, env: dict) -> None:
+    params = StdioServerParameters(
+        command=sys.executable, args=["-m", "music_mcp_server.server"], env=env, cwd=str(ROOT),
+    )
+    with open(os.devnull, "w") as devnull:
+        before = fake.request_count, fake.token_count
+        results, elapsed = await run_sessions(args, lambda number: stdio_client(params, errlog=devnull))
+    report(args, fake, results, elapsed, before, "one stdio server per session")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=32, help="client sessions open at once")
+    parser.add_argument("--calls", type=int, default=20, help="tool calls per session")
+    parser.add_argument("--stdio", action="store_true", help="give every session its own stdio server instead")
+    parser.add_argument("--max-concurrency", type=int, help="server's limit on tool calls run at once")
+    parser.add_argument("--workers", type=int, help="server's threads for blocking Spotify calls")
+    parser.add_argument("--backend", choices=["spotipy", "async"], default="spotipy")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake API latency in seconds")
+    parser.add_argument("--playlists", type=int, default=20, help="playlists in the fake library")
+    parser.add_argument("--tracks", type=int, default=200, help="tracks per fake playlist")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra server environment")
+    args = parser.parse_args()
+    args.playlists = max(args.playlists, 4)  # the workload reads the first four
+
+    fake = FakeSpotifyServer(
+        ("127.0.0.1", 0),
+        latency=args.latency,
+        library=FakeLibrary(playlists=args.playlists, tracks_per_playlist=args.tracks),
+    ).start()
+    with tempfile.TemporaryDirectory() as home:
+        prepare_home(Path(home))
+        env = dict(
+            os.environ,
+            HOME=home,
+            PYTHONPATH=str(ROOT),
+            MUSIC_MCP_API_URL=fake.url,
+            MUSIC_MCP_TOKEN_URL=fake.token_url,
+            MUSIC_MCP_BACKEND=args.backend,
+        )
+        env.update(item.split("=", 1) for item in args.env)
+        print(
+            f"{args.backend} backend, {args.latency * 1000:.0f} ms upstream latency, "
+            f"{args.playlists} playlists x {args.tracks} tracks"
+        )
+        asyncio.run(bench_stdio(args, fake, env) if args.stdio else bench_http(args, fake, env))
+    fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Latency of playback controls while a bulk job saturates the request queue.
+
+Queues a burst of bulk searches, then issues pause/next calls one after
+another and reports their latency percentiles, once with priority lanes and
+once with every call in a single lane.
+
+    python benchmarks/bench_priority.py --bulk 100 --controls 20 --rate 20
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_spotify import FakeSpotifyServer, prepare_home
+
+
+def percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+async def run_load(server, bulk: int, controls: int) -> tuple[list[float], float]:
+    start = time.perf_counter()
+    bulk_jobs = [asyncio.create_task(server.search_tracks(f"bulk {i}")) for i in range(bulk)]
+    await asyncio.sleep(0.05)
+    latencies = []
+    for i in range(controls):
+        t = time.perf_counter()
+        result = await (server.pause_music() if i % 2 else server.next_track())
+        if result.startswith("Error"):
+            raise RuntimeError(result)
+        latencies.append(time.perf_counter() - t)
+    await asyncio.gather(*bulk_jobs)
+    elapsed = time.perf_counter() - start
+    await server.sp.aclose()
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--bulk", type=int, default=100, help="bulk searches queued up front")
+    parser.add_argument("--controls", type=int, default=20, help="playback calls issued during the bulk job")
+    parser.add_argument("--rate", type=float, default=20.0, help="scheduler requests per second")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake API latency in seconds")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    fake = FakeSpotifyServer(("127.0.0.1", 0), latency=args.latency).start()
+    with tempfile.TemporaryDirectory() as home:
+        prepare_home(Path(home))
+        from music_mcp_server import server
+        from music_mcp_server.async_client import AsyncSpotify
+        from music_mcp_server.scheduler import BULK, Scheduler, lane_for
+
+        print(
+            f"{args.controls} playback calls behind {args.bulk} bulk searches, "
+            f"{args.rate:g} req/s, {args.latency * 1000:.0f} ms upstream latency"
+        )
+        for label, lanes in [("single lane", lambda method: BULK), ("priority lanes", lane_for)]:
+            server.sp = AsyncSpotify(auth="fake-access")
+            server.sp.prefix = fake.url
+            server.scheduler = Scheduler(rate=args.rate, burst=5, deadline=600)
+            server.lane_for = lanes
+            server.search_cache = None
+            latencies, elapsed = asyncio.run(run_load(server, args.bulk, args.controls))
+            ms = [s * 1000 for s in latencies]
+            print(
+                f"  {label:<15} controls p50 {statistics.median(ms):7.1f} ms  p99 {percentile(ms, 99):7.1f} ms  "
+                f"bulk done in {elapsed:5.2f} s"
+            )
+    fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Time from spawning the server to its first `tools/list` response.
+
+Editors launch one server per window, so this is the latency a user sees
+before any music tool is available. Speaks raw JSON-RPC over the child's
+stdio so the client side adds nothing measurable.
+
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --runs 10 --shared   # shim in front of a running daemon
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_spotify import prepare_home
+
+HANDSHAKE = [
+    {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "initialize",
+        "params": {
+            "protocolVersion": "2024-11-05",
+            "capabilities": {},
+            "clientInfo": {"name": "bench-startup", "version": "1.0.0"},
+        },
+    },
+    {"jsonrpc": "2.0", "method": "notifications/initialized"},
+    {"jsonrpc": "2.0", "id": 2, "method": "tools/list", "params": {}},
+]
+
+
+def time_to_tools_list(env: dict, command: list[str]) -> tuple[float, float]:
+    """Return (seconds to initialize reply, seconds to tools/list reply)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", *command],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=env,
+        cwd=ROOT,
+    )
+    try:
+        for message in HANDSHAKE:
+            proc.stdin.write(json.dumps(message).encode() + b"\n")
+        proc.stdin.flush()
+        initialized = None
+        while True:
+            line = proc.stdout.readline()
+            if not line:
+                raise RuntimeError("server exited before answering tools/list")
+            reply = json.loads(line)
+            if reply.get("id") == 1:
+                initialized = time.perf_counter() - start
+            if reply.get("id") == 2:
+                return initialized, time.perf_counter() - start
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--shared", action="store_true", help="time the stdio shim against a running daemon")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        config_dir = prepare_home(Path(home))
+        env = dict(os.environ, HOME=home, PYTHONPATH=str(ROOT))
+        command = ["music_mcp_server.server"]
+        daemon = None
+        if args.shared:
+            socket_path = str(config_dir / "daemon.sock")
+            daemon = subprocess.Popen(
+                [sys.executable, "-m", "music_mcp_server.cli", "--daemon", "--socket", socket_path, "--idle-timeout", "0"],
+                stderr=subprocess.DEVNULL,
+                env=env,
+                cwd=ROOT,
+            )
+            command = ["music_mcp_server.cli", "--shared", "--socket", socket_path]
+        try:
+            time_to_tools_list(env, command)  # warm the OS file cache (and wait for the daemon)
+            results = [time_to_tools_list(env, command) for _ in range(args.runs)]
+        finally:
+            if daemon is not None:
+                daemon.terminate()
+                daemon.wait()
+
+    for label, samples in [("initialize", [r[0] for r in results]), ("tools/list", [r[1] for r in results])]:
+        samples = [s * 1000 for s in samples]
+        print(
+            f"{label:<11} median {statistics.median(samples):7.1f} ms  "
+            f"min {min(samples):7.1f} ms  max {max(samples):7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
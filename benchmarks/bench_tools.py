@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Latency, throughput, upstream traffic and memory of every MCP tool.
+
+Spawns the server the way an editor does, talking MCP over its stdio, with
+the Web API and token endpoint pointed at the local fake. Each tool is first
+called --rounds times one call at a time, for its latency percentiles and
+the upstream requests it costs per call. Then --calls calls cycling through
+all the tools run --concurrency at a time, for throughput. The server's peak
+RSS is read once it has exited.
+
+    python benchmarks/bench_tools.py --rounds 20 --calls 400 --concurrency 16 --latency 0.05
+    python benchmarks/bench_tools.py --backend async --playlists 200 --tracks 500 --throttle-every 50 \\
+        --env MUSIC_MCP_RATE=100
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_spotify import FakeLibrary, FakeSpotifyServer, make_track, prepare_home
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+
+def percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def tool_arguments(playlists: int, tracks_per_playlist: int) -> dict:
+    """Arguments for each tool, as a function of the round number."""
+    extra = [make_track(10_000_000 + i)["uri"] for i in range(10)]
+    synced = [make_track(i)["uri"] for i in range(2 * tracks_per_playlist, 3 * tracks_per_playlist)]
+    return {
+        "play_music": lambda n: {},
+        "pause_music": lambda n: {},
+        "next_track": lambda n: {},
+        "previous_track": lambda n: {},
+        "current_track": lambda n: {},
+        "get_devices": lambda n: {},
+        "transfer_playback": lambda n: {"device_id": ("device-phone", "device-laptop")[n % 2]},
+        "get_playlists": lambda n: {},
+        "create_playlist": lambda n: {"name": f"Bench {n}"},
+        "add_to_playlist": lambda n: {"playlist_id": "playlist0000", "track_uri": extra[0]},
+        "remove_from_playlist": lambda n: {"playlist_id": "playlist0000", "track_uri": extra[0]},
+        "add_tracks_to_playlist": lambda n: {"playlist_id": "playlist0001", "track_uris": extra},
+        "remove_tracks_from_playlist": lambda n: {"playlist_id": "playlist0001", "track_uris": extra},
+        # Alternate between two orders so every round has work to do
+        "sync_playlist": lambda n: {"playlist_id": "playlist0002", "track_uris": synced[::-1] if n % 2 else synced},
+        "get_playlist_tracks": lambda n: {"playlist_id": "playlist0003"},
+        # The playlists create_playlist made, which the fake numbers after the library's own
+        "delete_playlist": lambda n: {"playlist_id": f"playlist{playlists + n:04d}"},
+        "sync_library": lambda n: {},
+        "search_library": lambda n: {"query": f"Track {n}"},
+        "search_tracks": lambda n: {"query": f"bench {n}"},
+        "play_track": lambda n: {"track_uri": extra[n % len(extra)]},
+    }
+
+
+async def call(session: ClientSession, name: str, arguments: dict) -> tuple[float, bool]:
+    """Call one tool; return (seconds, whether it reported an error)."""
+    start = time.perf_counter()
+    result = await session.call_tool(name, arguments)
+    elapsed = time.perf_counter() - start
+    text = result.content[0].text if result.content else ""
+    return elapsed, result.isError or text.startswith("Error")
+
+
+async def run(args, fake: FakeSpotifyServer, env: dict) -> None:
+    params = StdioServerParameters(
+        command=sys.executable, args=["-m", "music_mcp_server.server"], env=env, cwd=str(ROOT),
+    )
+    arguments = tool_arguments(args.playlists, args.tracks)
+    with open(os.devnull, "w") as devnull:
+        async with stdio_client(params, errlog=devnull) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                tools = (await session.list_tools()).tools
+                plan = {}
+                for tool in tools:
+                    if tool.name in arguments:
+                        plan[tool.name] = arguments[tool.name]
+                    elif not tool.inputSchema.get("required"):
+                        plan[tool.name] = lambda n: {}
+                    else:
+                        print(f"  skipping {tool.name}: no benchmark arguments for it")
+                await call(session, "current_track", {})  # token refresh and client warm-up
+
+                print(f"{'tool':<28} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'upstream/call':>14} {'errors':>7}")
+                for name, make_args in plan.items():
+                    samples, errors = [], 0
+                    before = fake.request_count
+                    for n in range(args.rounds):
+                        elapsed, failed = await call(session, name, make_args(n))
+                        samples.append(elapsed * 1000)
+                        errors += failed
+                    upstream = (fake.request_count - before) / args.rounds
+                    print(
+                        f"{name:<28} {percentile(samples, 50):8.1f} {percentile(samples, 95):8.1f} "
+                        f"{percentile(samples, 99):8.1f} {upstream:14.2f} {errors:7d}"
+                    )
+
+                names = list(plan)
+                gate = asyncio.Semaphore(args.concurrency)
+
+                async def one(i: int) -> tuple[float, bool]:
+                    async with gate:
+                        name = names[i % len(names)]
+                        return await call(session, name, plan[name](i))
+
+                before, throttled = fake.request_count, fake.throttled_count
+                start = time.perf_counter()
+                results = await asyncio.gather(*(one(i) for i in range(args.calls)))
+                elapsed = time.perf_counter() - start
+                latencies = [r[0] * 1000 for r in results]
+                print(
+                    f"\n{args.calls} mixed calls, {args.concurrency} at a time: {args.calls / elapsed:.1f} calls/s, "
+                    f"p50 {percentile(latencies, 50):.1f} ms, p99 {percentile(latencies, 99):.1f} ms, "
+                    f"{sum(r[1] for r in results)} errors, {fake.request_count - before} upstream requests "
+                    f"({fake.throttled_count - throttled} answered 429)"
+                )
+    # The server has exited and been reaped by now; ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(f"server peak RSS: {peak / (2**20 if sys.platform == 'darwin' else 2**10):.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=20, help="sequential calls per tool")
+    parser.add_argument("--calls", type=int, default=400, help="calls in the concurrent phase")
+    parser.add_argument("--concurrency", type=int, default=16, help="calls in flight at once in the concurrent phase")
+    parser.add_argument("--backend", choices=["spotipy", "async"], default="spotipy")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake API latency in seconds")
+    parser.add_argument("--playlists", type=int, default=20, help="playlists in the fake library")
+    parser.add_argument("--tracks", type=int, default=200, help="tracks per fake playlist")
+    parser.add_argument("--throttle-every", type=int, default=0, help="answer every nth API request with a 429")
+    parser.add_argument("--retry-after", type=float, default=0.2, help="Retry-After seconds sent with those 429s")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="extra server environment")
+    args = parser.parse_args()
+    args.playlists = max(args.playlists, 4)  # the tool arguments use the first four
+
+    fake = FakeSpotifyServer(
+        ("127.0.0.1", 0),
+        latency=args.latency,
+        library=FakeLibrary(playlists=args.playlists, tracks_per_playlist=args.tracks),
+        throttle_every=args.throttle_every,
+        retry_after=args.retry_after,
+    ).start()
+    with tempfile.TemporaryDirectory() as home:
+        prepare_home(Path(home))
+        env = dict(
+            os.environ,
+            HOME=home,
+            PYTHONPATH=str(ROOT),
+            MUSIC_MCP_API_URL=fake.url,
+            MUSIC_MCP_TOKEN_URL=fake.token_url,
+            MUSIC_MCP_BACKEND=args.backend,
+        )
+        env.update(item.split("=", 1) for item in args.env)
+        print(
+            f"{args.backend} backend, {args.latency * 1000:.0f} ms upstream latency, "
+            f"{args.playlists} playlists x {args.tracks} tracks"
+            + (f", every {args.throttle_every}th request throttled" if args.throttle_every else "")
+        )
+        asyncio.run(run(args, fake, env))
+    fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Spotify Web API.
+
+Serves canned responses for the endpoints the MCP tools use, with a
+configurable per-request latency, 429 injection and synthetic libraries of
+any size, so benchmarks can run offline. Point a server at it with
+MUSIC_MCP_API_URL and MUSIC_MCP_TOKEN_URL.
+
+    python benchmarks/fake_spotify.py --port 8899 --latency 0.2 --playlists 200 --tracks 500
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+
+def prepare_home(home: Path) -> Path:
+    """Point HOME at a scratch directory holding fake credentials."""
+    os.environ["HOME"] = str(home)
+    from music_mcp_server.setup import get_config_dir
+    config_dir = get_config_dir()
+    with open(config_dir / "credentials.json", "w") as f:
+        json.dump({
+            "client_id": "fake-client",
+            "client_secret": "fake-secret",
+            "refresh_token": "fake-refresh",
+            "access_token": "fake-access",
+            "redirect_uri": "http://localhost:8888/callback",
+        }, f)
+    return config_dir
+
+
+def make_track(i: int) -> dict:
+    """Build a synthetic track object."""
+    return {
+        "id": f"{i:022d}",
+        "name": f"Track {i}",
+        "uri": f"spotify:track:{i:022d}",
+        "artists": [{"name": f"Artist {i % 97}"}],
+        "album": {"name": f"Album {i % 211}"},
+        "duration_ms": 180000 + (i % 120) * 1000,
+    }
+
+
+class FakeLibrary:
+    """In-memory playlists, devices and playback state."""
+
+    def __init__(self, playlists: int = 5, tracks_per_playlist: int = 50):
+        self.lock = threading.Lock()
+        self.playlists = {}
+        self.created = playlists
+        for p in range(playlists):
+            pid = f"playlist{p:04d}"
+            start = p * tracks_per_playlist
+            self.playlists[pid] = {
+                "name": f"Playlist {p}",
+                "tracks": [make_track(i)["uri"] for i in range(start, start + tracks_per_playlist)],
+                "version": 0,
+            }
+        self.devices = [
+            {"id": "device-laptop", "name": "Laptop", "type": "Computer", "is_active": True},
+            {"id": "device-phone", "name": "Phone", "type": "Smartphone", "is_active": False},
+        ]
+        self.playing = make_track(0)
+        self.is_playing = True
+        self.position_ms = 0
+        self.resumed_at = time.monotonic()
+
+    def next_id(self) -> int:
+        """Number for a new playlist ID, never reusing one of a deleted playlist."""
+        self.created += 1
+        return self.created - 1
+
+    def progress_ms(self) -> int:
+        """Playback position, advancing in real time while playing."""
+        position = self.position_ms
+        if self.is_playing:
+            position += int((time.monotonic() - self.resumed_at) * 1000)
+        return min(position, self.playing["duration_ms"])
+
+    def seek(self, position_ms: int, playing: bool) -> None:
+        self.position_ms = position_ms
+        self.resumed_at = time.monotonic()
+        self.is_playing = playing
+
+    def snapshot_id(self, pid: str) -> str:
+        return f"{pid}-v{self.playlists[pid]['version']}"
+
+
+def parse_fields(spec: str) -> dict:
+    """Parse a Web API fields filter like 'total,items(track(name,uri))' into a nested dict."""
+    def parse(i: int) -> tuple[dict, int]:
+        result, name = {}, ""
+        while i < len(spec):
+            char = spec[i]
+            if char == "(":
+                result[name], i = parse(i + 1)
+                name = ""
+            elif char == ")":
+                break
+            elif char == ",":
+                if name:
+                    result[name] = None
+                name = ""
+            else:
+                name += char
+            i += 1
+        if name:
+            result[name] = None
+        return result, i
+    return parse(0)[0]
+
+
+def apply_fields(value, fields: dict | None):
+    """Keep only the selected fields of a JSON value."""
+    if fields is None:
+        return value
+    if isinstance(value, list):
+        return [apply_fields(v, fields) for v in value]
+    if isinstance(value, dict):
+        return {k: apply_fields(value[k], sub) for k, sub in fields.items() if k in value}
+    return value
+
+
+def track_from_uri(uri: str) -> dict:
+    """Rebuild the synthetic track object for a URI."""
+    try:
+        return make_track(int(uri.rsplit(":", 1)[1]))
+    except ValueError:
+        return {"id": uri, "name": uri, "uri": uri, "artists": [], "album": {"name": ""}}
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the fake library and request counters."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(
+        self,
+        address,
+        latency: float = 0.0,
+        library: FakeLibrary | None = None,
+        throttle_every: int = 0,
+        retry_after: float = 1,
+    ):
+        super().__init__(address, FakeSpotifyHandler)
+        self.latency = latency
+        # Answer every nth API request with a 429 (0 = only when inject_429 asks)
+        self.throttle_every = throttle_every
+        self._api_count = 0
+        self.library = library or FakeLibrary()
+        self.request_count = 0
+        self.token_count = 0
+        self.token_lifetime = 3600
+        self.throttled_count = 0
+        self._throttle_left = 0
+        self._retry_after = retry_after
+        self.not_modified_count = 0
+        self.bytes_sent = 0
+        self._count_lock = threading.Lock()
+
+    @property
+    def origin(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        return f"{self.origin}/v1/"
+
+    @property
+    def token_url(self) -> str:
+        return f"{self.origin}/api/token"
+
+    def count(self) -> None:
+        with self._count_lock:
+            self.request_count += 1
+
+    def inject_429(self, count: int, retry_after: float = 1) -> None:
+        """Answer the next count API requests with 429 Too Many Requests."""
+        with self._count_lock:
+            self._throttle_left = count
+            self._retry_after = retry_after
+
+    def take_429(self) -> int | None:
+        """Return the Retry-After to send if this request should be throttled."""
+        with self._count_lock:
+            self._api_count += 1
+            if self.throttle_every and self._api_count % self.throttle_every == 0:
+                self.throttled_count += 1
+                return self._retry_after
+            if self._throttle_left <= 0:
+                return None
+            self._throttle_left -= 1
+            self.throttled_count += 1
+            return self._retry_after
+
+    def start(self) -> "FakeSpotifyServer":
+        """Serve in a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+    """Route Web API requests to the fake library."""
+
+    protocol_version = "HTTP/1.1"
+
+    routes = [
+        ("GET", r"/v1/me/?$", "me"),
+        ("GET", r"/v1/me/player/currently-playing$", "currently_playing"),
+        ("GET", r"/v1/me/player$", "playback"),
+        ("GET", r"/v1/me/player/devices$", "devices"),
+        ("PUT", r"/v1/me/player$", "transfer"),
+        ("PUT", r"/v1/me/player/play$", "play"),
+        ("PUT", r"/v1/me/player/pause$", "pause"),
+        ("POST", r"/v1/me/player/next$", "skip"),
+        ("POST", r"/v1/me/player/previous$", "skip"),
+        ("GET", r"/v1/me/playlists$", "my_playlists"),
+        ("GET", r"/v1/search$", "search"),
+        ("POST", r"/v1/users/([^/]+)/playlists$", "create_playlist"),
+        ("GET", r"/v1/playlists/([^/]+)$", "playlist"),
+        ("GET", r"/v1/playlists/([^/]+)/(?:tracks|items)$", "playlist_tracks"),
+        ("PUT", r"/v1/playlists/([^/]+)/(?:tracks|items)$", "replace_or_reorder"),
+        ("POST", r"/v1/playlists/([^/]+)/(?:tracks|items)$", "add_tracks"),
+        ("DELETE", r"/v1/playlists/([^/]+)/(?:tracks|items)$", "remove_tracks"),
+        ("DELETE", r"/v1/playlists/([^/]+)/followers$", "unfollow"),
+        ("POST", r"/api/token$", "token"),
+    ]
+
+    def log_message(self, format, *args):
+        pass  # Suppress logging
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def dispatch(self, method: str):
+        self.server.count()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.path.startswith("/v1/"):
+            retry_after = self.server.take_429()
+            if retry_after is not None:
+                self.route = self.path
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                return self.respond(429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                                    {"Retry-After": str(retry_after)})
+        parsed = urlparse(self.path)
+        self.route = parsed.path
+        self.query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+            self.body = {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+        else:
+            self.body = json.loads(raw) if raw else {}
+        for verb, pattern, name in self.routes:
+            match = re.match(pattern, parsed.path)
+            if verb == method and match:
+                with self.server.library.lock:
+                    status, payload = getattr(self, f"handle_{name}")(*match.groups())
+                return self.respond(status, payload)
+        self.respond(404, {"error": {"status": 404, "message": "Not found"}})
+
+    def respond(self, status: int, payload, headers: dict | None = None):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        if self.command == "GET" and status == 200 and self.route.startswith("/v1/"):
+            # Like the Web API, tag reads and answer matching revalidations with 304
+            etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+            headers = dict(headers or {}, ETag=etag)
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+                with self.server._count_lock:
+                    self.server.not_modified_count += 1
+        with self.server._count_lock:
+            self.server.bytes_sent += len(body)
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def page(self, items: list, default_limit: int, max_limit: int) -> dict:
+        limit = min(int(self.query.get("limit", default_limit)), max_limit)
+        offset = int(self.query.get("offset", 0))
+        end = offset + limit
+        return {
+            "items": items[offset:end],
+            "total": len(items),
+            "limit": limit,
+            "offset": offset,
+            "next": None if end >= len(items) else f"{self.server.origin}{self.route}?offset={end}&limit={limit}",
+        }
+
+    # -------------------------------------------------------------------------
+    # Endpoints
+    # -------------------------------------------------------------------------
+
+    @property
+    def library(self) -> FakeLibrary:
+        return self.server.library
+
+    def handle_me(self):
+        return 200, {"id": "fakeuser", "display_name": "Fake User"}
+
+    def handle_currently_playing(self):
+        return 200, {"is_playing": self.library.is_playing, "item": self.library.playing, "progress_ms": self.library.progress_ms()}
+
+    def handle_playback(self):
+        active = next((d for d in self.library.devices if d["is_active"]), None)
+        return 200, {
+            "is_playing": self.library.is_playing,
+            "item": self.library.playing,
+            "progress_ms": self.library.progress_ms(),
+            "device": active,
+            "shuffle_state": False,
+            "repeat_state": "off",
+        }
+
+    def handle_devices(self):
+        return 200, {"devices": self.library.devices}
+
+    def handle_transfer(self):
+        target = (self.body.get("device_ids") or [None])[0]
+        for device in self.library.devices:
+            device["is_active"] = device["id"] == target
+        return 204, None
+
+    def handle_play(self):
+        if self.body.get("uris"):
+            self.library.playing = track_from_uri(self.body["uris"][0])
+            self.library.seek(0, True)
+        else:
+            self.library.seek(self.library.progress_ms(), True)
+        return 204, None
+
+    def handle_pause(self):
+        self.library.seek(self.library.progress_ms(), False)
+        return 204, None
+
+    def handle_skip(self):
+        current = int(self.library.playing["id"]) if self.library.playing["id"].isdigit() else 0
+        step = 1 if self.path.endswith("/next") else -1
+        self.library.playing = make_track(max(current + step, 0))
+        self.library.seek(0, self.library.is_playing)
+        return 204, None
+
+    def handle_my_playlists(self):
+        items = [
+            {
+                "id": pid,
+                "name": pl["name"],
+                "snapshot_id": self.library.snapshot_id(pid),
+                "owner": {"id": "fakeuser"},
+                "tracks": {"total": len(pl["tracks"])},
+            }
+            for pid, pl in self.library.playlists.items()
+        ]
+        return 200, self.page(items, 50, 50)
+
+    def handle_search(self):
+        limit = min(int(self.query.get("limit", 10)), 50)
+        seed = sum(map(ord, self.query.get("q", "")))
+        items = [make_track(seed + i) for i in range(limit)]
+        return 200, {"tracks": {"items": items, "total": 1000, "limit": limit, "offset": 0}}
+
+    def handle_create_playlist(self, user_id):
+        pid = f"playlist{self.library.next_id():04d}"
+        self.library.playlists[pid] = {"name": self.body.get("name", ""), "tracks": [], "version": 0}
+        return 201, {"id": pid, "name": self.body.get("name", ""), "snapshot_id": self.library.snapshot_id(pid)}
+
+    def handle_playlist_tracks(self, pid):
+        if pid not in self.library.playlists:
+            return 404, {"error": {"status": 404, "message": "Invalid playlist Id"}}
+        items = [{"track": track_from_uri(uri)} for uri in self.library.playlists[pid]["tracks"]]
+        page = self.page(items, 100, 100)
+        if self.query.get("fields"):
+            page = apply_fields(page, parse_fields(self.query["fields"]))
+        return 200, page
+
+    def handle_add_tracks(self, pid):
+        if pid not in self.library.playlists:
+            return 404, {"error": {"status": 404, "message": "Invalid playlist Id"}}
+        # spotipy sends a bare list of URIs with ?position=, the API also takes {"uris", "position"}
+        body = self.body if isinstance(self.body, dict) else {"uris": self.body}
+        uris = body.get("uris", [])
+        if len(uris) > 100:
+            return 400, {"error": {"status": 400, "message": "Too many ids requested"}}
+        playlist = self.library.playlists[pid]
+        position = body.get("position", self.query.get("position"))
+        if position is None:
+            playlist["tracks"].extend(uris)
+        else:
+            position = int(position)
+            playlist["tracks"][position:position] = uris
+        playlist["version"] += 1
+        return 201, {"snapshot_id": self.library.snapshot_id(pid)}
+
+    def handle_remove_tracks(self, pid):
+        if pid not in self.library.playlists:
+            return 404, {"error": {"status": 404, "message": "Invalid playlist Id"}}
+        items = self.body.get("tracks") or self.body.get("items") or []
+        if len(items) > 100:
+            return 400, {"error": {"status": 400, "message": "Too many ids requested"}}
+        playlist = self.library.playlists[pid]
+        if any("positions" in item for item in items):
+            # Positions refer to the given snapshot; this fake only keeps the latest one
+            if self.body.get("snapshot_id", self.library.snapshot_id(pid)) != self.library.snapshot_id(pid):
+                return 400, {"error": {"status": 400, "message": "Snapshot out of date"}}
+            drop = set()
+            for item in items:
+                for position in item["positions"]:
+                    if position >= len(playlist["tracks"]) or playlist["tracks"][position] != item["uri"]:
+                        return 400, {"error": {"status": 400, "message": f"No {item['uri']} at position {position}"}}
+                    drop.add(position)
+            playlist["tracks"] = [uri for i, uri in enumerate(playlist["tracks"]) if i not in drop]
+        else:
+            uris = {item["uri"] for item in items}
+            playlist["tracks"] = [uri for uri in playlist["tracks"] if uri not in uris]
+        playlist["version"] += 1
+        return 200, {"snapshot_id": self.library.snapshot_id(pid)}
+
+    def handle_playlist(self, pid):
+        if pid not in self.library.playlists:
+            return 404, {"error": {"status": 404, "message": "Invalid playlist Id"}}
+        playlist = self.library.playlists[pid]
+        body = {
+            "id": pid,
+            "name": playlist["name"],
+            "snapshot_id": self.library.snapshot_id(pid),
+            "tracks": {"total": len(playlist["tracks"])},
+        }
+        if self.query.get("fields"):
+            body = apply_fields(body, parse_fields(self.query["fields"]))
+        return 200, body
+
+    def handle_replace_or_reorder(self, pid):
+        if pid not in self.library.playlists:
+            return 404, {"error": {"status": 404, "message": "Invalid playlist Id"}}
+        playlist = self.library.playlists[pid]
+        if "range_start" in self.body:
+            start, length = self.body["range_start"], self.body.get("range_length", 1)
+            before = self.body["insert_before"]
+            tracks = playlist["tracks"]
+            if start + length > len(tracks) or before > len(tracks):
+                return 400, {"error": {"status": 400, "message": "Index out of bounds"}}
+            moved = tracks[start:start + length]
+            rest = tracks[:start] + tracks[start + length:]
+            at = before if before <= start else before - length
+            playlist["tracks"] = rest[:at] + moved + rest[at:]
+        else:
+            uris = self.body.get("uris", [])
+            if len(uris) > 100:
+                return 400, {"error": {"status": 400, "message": "Too many ids requested"}}
+            playlist["tracks"] = list(uris)
+        playlist["version"] += 1
+        return 200, {"snapshot_id": self.library.snapshot_id(pid)}
+
+    def handle_unfollow(self, pid):
+        self.library.playlists.pop(pid, None)
+        return 200, None
+
+    def handle_token(self):
+        if self.body.get("grant_type") != "refresh_token":
+            return 400, {"error": "unsupported_grant_type"}
+        with self.server._count_lock:
+            self.server.token_count += 1
+            count = self.server.token_count
+        return 200, {
+            "access_token": f"fake-access-{count}",
+            "token_type": "Bearer",
+            "expires_in": self.server.token_lifetime,
+            "scope": "user-read-playback-state",
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Spotify Web API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--playlists", type=int, default=5, help="playlists in the library")
+    parser.add_argument("--tracks", type=int, default=50, help="tracks per playlist")
+    parser.add_argument("--throttle-every", type=int, default=0, help="answer every nth API request with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with those 429s")
+    args = parser.parse_args()
+    server = FakeSpotifyServer(
+        (args.host, args.port),
+        latency=args.latency,
+        library=FakeLibrary(playlists=args.playlists, tracks_per_playlist=args.tracks),
+        throttle_every=args.throttle_every,
+        retry_after=args.retry_after,
+    )
+    print(f"Fake Spotify API listening on {server.url} (token endpoint {server.token_url})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Multi-process stress test for the shared token store.
+
+Starts many worker processes that share one `.spotify_cache`, as editor
+windows do, with deliberately short-lived tokens from a local fake token
+endpoint. Each worker runs a TokenManager and keeps reading both its token
+and the raw cache file. The test fails on a torn read of the file or on a
+refresh stampede (many more token requests than token lifetimes elapsed).
+
+    python benchmarks/stress_tokens.py --processes 12 --duration 10 --lifetime 3
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_spotify import FakeSpotifyServer
+
+
+def worker(cache_path: str, token_url: str, duration: float, margin: float, results) -> None:
+    from music_mcp_server.tokens import TokenManager
+
+    manager = TokenManager("fake-client", "fake-secret", "fake-refresh", Path(cache_path), token_url=token_url, margin=margin)
+    manager.start()
+    torn = expired = reads = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        token = manager.get_access_token(as_dict=True)
+        if token["expires_at"] <= time.time():
+            expired += 1
+        try:
+            with open(cache_path) as f:
+                json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            torn += 1
+        reads += 1
+        time.sleep(0.001)
+    manager.stop()
+    results.put((torn, expired, reads))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--processes", type=int, default=12)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds each worker runs")
+    parser.add_argument("--lifetime", type=int, default=3, help="token lifetime in seconds")
+    parser.add_argument("--margin", type=float, default=1.0, help="refresh this long before expiry")
+    args = parser.parse_args()
+
+    fake = FakeSpotifyServer(("127.0.0.1", 0)).start()
+    fake.token_lifetime = args.lifetime
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = str(Path(tmp) / ".spotify_cache")
+        procs = [
+            ctx.Process(target=worker, args=(cache_path, fake.token_url, args.duration, args.margin, results))
+            for _ in range(args.processes)
+        ]
+        for proc in procs:
+            proc.start()
+        stats = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+    fake.shutdown()
+
+    torn = sum(s[0] for s in stats)
+    expired = sum(s[1] for s in stats)
+    reads = sum(s[2] for s in stats)
+    # One refresh per (lifetime - margin) window, plus the initial one
+    expected = int(args.duration / (args.lifetime - args.margin)) + 1
+    print(f"{args.processes} processes, {args.duration:g}s, {args.lifetime}s tokens")
+    print(f"  token requests: {fake.token_count} (about {expected} expected, {expected * args.processes} without sharing)")
+    print(f"  cache reads:    {reads}, torn: {torn}, expired tokens handed out: {expired}")
+    ok = torn == 0 and expired == 0 and fake.token_count <= expected * 2
+    print("  PASS" if ok else "  FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Native asyncio client for the Spotify Web API.
+
+An optional alternative to spotipy for the MCP tools. All requests share one
+pooled, keep-alive httpx client (HTTP/2 when the `h2` package is installed),
+so bursts of tool calls reuse warm connections instead of paying a TLS
+handshake and a thread hop each time.
+
+Methods mirror the spotipy methods the server uses, so an AsyncSpotify can
+stand in for the module-level `sp` object.
+"""
+import asyncio
+import importlib.util
+import json
+import time
+from typing import Any, Callable
+
+import httpx
+from spotipy.exceptions import SpotifyException
+
+from music_mcp_server.cache import ETagCache, etag_key
+
+API_PREFIX = "https://api.spotify.com/v1/"
+
+# Refresh the cached access token this many seconds before it expires
+TOKEN_MARGIN = 60
+
+
+def _get_id(kind: str, value: str) -> str:
+    """Extract a bare Spotify ID from an ID, URI or open.spotify.com URL."""
+    if value.startswith("spotify:"):
+        return value.split(":")[-1]
+    if "open.spotify.com" in value:
+        return value.rstrip("/").split("/")[-1].split("?")[0]
+    return value
+
+
+def _get_uri(kind: str, value: str) -> str:
+    """Turn a bare ID into a Spotify URI."""
+    if value.startswith("spotify:"):
+        return value
+    return f"spotify:{kind}:{_get_id(kind, value)}"
+
+
+class AsyncSpotify:
+    """Spotify Web API client built on a shared httpx.AsyncClient."""
+
+    def __init__(
+        self,
+        auth_manager=None,
+        auth: str | None = None,
+        max_connections: int = 20,
+        requests_timeout: float = 10.0,
+        etags: ETagCache | None = None,
+    ):
+        self.prefix = API_PREFIX
+        self.auth_manager = auth_manager
+        self.etags = etags
+        self.max_connections = max_connections
+        self.requests_timeout = requests_timeout
+        self._token = {"access_token": auth, "expires_at": float("inf")} if auth else None
+        self._token_lock = asyncio.Lock()
+        self._client: httpx.AsyncClient | None = None
+        # Called with every response, like requests' response hooks
+        self.hooks: list[Callable[[httpx.Response], None]] = []
+
+    @property
+    def http2(self) -> bool:
+        """Whether HTTP/2 support is available."""
+        return importlib.util.find_spec("h2") is not None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared connection pool, created on first use."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.requests_timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=120,
+                ),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the connection pool."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _access_token(self) -> str:
+        """Return a valid access token, asking the auth manager only near expiry."""
+        token = self._token
+        if token and token["expires_at"] - time.time() > TOKEN_MARGIN:
+            return token["access_token"]
+        async with self._token_lock:
+            token = self._token
+            if token and token["expires_at"] - time.time() > TOKEN_MARGIN:
+                return token["access_token"]
+            access_token = await asyncio.to_thread(self.auth_manager.get_access_token, as_dict=False)
+            cached = self.auth_manager.get_cached_token() if hasattr(self.auth_manager, "get_cached_token") else None
+            expires_at = cached["expires_at"] if cached else time.time() + 300
+            self._token = {"access_token": access_token, "expires_at": expires_at}
+            return access_token
+
+    async def _request(self, method: str, url: str, payload: Any = None, **params) -> Any:
+        if not url.startswith("http"):
+            url = self.prefix + url
+        headers = {"Authorization": f"Bearer {await self._access_token()}"}
+        content = None
+        if payload is not None:
+            headers["Content-Type"] = "application/json"
+            content = json.dumps(payload)
+        params = {k: v for k, v in params.items() if v is not None}
+        stored = None
+        if method == "GET" and self.etags is not None:
+            key = etag_key(url, params)
+            stored = self.etags.get(key)
+            if stored is not None:
+                headers["If-None-Match"] = stored[0]
+        response = await self.client.request(method, url, params=params, headers=headers, content=content)
+        for hook in self.hooks:
+            hook(response)
+        if response.status_code == 304 and stored is not None:
+            self.etags.not_modified(stored[1])
+            return json.loads(stored[1])
+        if method == "GET" and self.etags is not None and response.status_code == 200 and response.headers.get("ETag"):
+            self.etags.put(key, response.headers["ETag"], response.content)
+        if response.status_code >= 400:
+            try:
+                error = response.json().get("error", {})
+                msg, reason = error.get("message"), error.get("reason")
+            except ValueError:
+                msg, reason = response.text or None, None
+            raise SpotifyException(
+                response.status_code,
+                -1,
+                f"{response.url}:\n {msg}",
+                reason=reason,
+                headers=response.headers,
+            )
+        if not response.content:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    async def _get(self, url: str, **params) -> Any:
+        return await self._request("GET", url, **params)
+
+    async def _post(self, url: str, payload: Any = None, **params) -> Any:
+        return await self._request("POST", url, payload, **params)
+
+    async def _put(self, url: str, payload: Any = None, **params) -> Any:
+        return await self._request("PUT", url, payload, **params)
+
+    async def _delete(self, url: str, payload: Any = None, **params) -> Any:
+        return await self._request("DELETE", url, payload, **params)
+
+    async def next(self, result: dict) -> Any:
+        """Fetch the next page of a paged result."""
+        if result["next"]:
+            return await self._get(result["next"])
+        return None
+
+    # =========================================================================
+    # Playback
+    # =========================================================================
+
+    async def start_playback(self, device_id=None, context_uri=None, uris=None, offset=None, position_ms=None):
+        data = {}
+        if context_uri is not None:
+            data["context_uri"] = context_uri
+        if uris is not None:
+            data["uris"] = uris
+        if offset is not None:
+            data["offset"] = offset
+        if position_ms is not None:
+            data["position_ms"] = position_ms
+        return await self._put("me/player/play", payload=data, device_id=device_id)
+
+    async def pause_playback(self, device_id=None):
+        return await self._put("me/player/pause", device_id=device_id)
+
+    async def next_track(self, device_id=None):
+        return await self._post("me/player/next", device_id=device_id)
+
+    async def previous_track(self, device_id=None):
+        return await self._post("me/player/previous", device_id=device_id)
+
+    async def currently_playing(self, market=None, additional_types=None):
+        return await self._get("me/player/currently-playing", market=market, additional_types=additional_types)
+
+    async def current_playback(self, market=None, additional_types=None):
+        return await self._get("me/player", market=market, additional_types=additional_types)
+
+    # =========================================================================
+    # Devices
+    # =========================================================================
+
+    async def devices(self):
+        return await self._get("me/player/devices")
+
+    async def transfer_playback(self, device_id, force_play=True):
+        return await self._put("me/player", payload={"device_ids": [device_id], "play": force_play})
+
+    # =========================================================================
+    # Playlists
+    # =========================================================================
+
+    async def current_user(self):
+        return await self._get("me")
+
+    async def current_user_playlists(self, limit=50, offset=0):
+        return await self._get("me/playlists", limit=limit, offset=offset)
+
+    async def user_playlist_create(self, user, name, public=True, collaborative=False, description=""):
+        data = {"name": name, "public": public, "collaborative": collaborative, "description": description}
+        return await self._post(f"users/{user}/playlists", payload=data)
+
+    async def user_playlist_unfollow(self, user, playlist_id):
+        return await self._delete(f"playlists/{_get_id('playlist', playlist_id)}/followers")
+
+    async def playlist(self, playlist_id, fields=None, market=None, additional_types=("track",)):
+        return await self._get(
+            f"playlists/{_get_id('playlist', playlist_id)}",
+            fields=fields,
+            market=market,
+            additional_types=",".join(additional_types) if additional_types else None,
+        )
+
+    async def playlist_tracks(self, playlist_id, fields=None, limit=100, offset=0, market=None,
+                              additional_types=("track",)):
+        return await self._get(
+            f"playlists/{_get_id('playlist', playlist_id)}/tracks",
+            fields=fields,
+            limit=limit,
+            offset=offset,
+            market=market,
+            additional_types=",".join(additional_types) if additional_types else None,
+        )
+
+    async def playlist_add_items(self, playlist_id, items, position=None):
+        data = {"uris": [_get_uri("track", item) for item in items]}
+        if position is not None:
+            data["position"] = position
+        return await self._post(f"playlists/{_get_id('playlist', playlist_id)}/tracks", payload=data)
+
+    async def playlist_remove_all_occurrences_of_items(self, playlist_id, items, snapshot_id=None):
+        data = {"tracks": [{"uri": _get_uri("track", item)} for item in items]}
+        if snapshot_id:
+            data["snapshot_id"] = snapshot_id
+        return await self._delete(f"playlists/{_get_id('playlist', playlist_id)}/tracks", payload=data)
+
+    async def playlist_remove_specific_occurrences_of_items(self, playlist_id, items, snapshot_id=None):
+        data = {
+            "tracks": [{"uri": _get_uri("track", item["uri"]), "positions": item["positions"]} for item in items]
+        }
+        if snapshot_id:
+            data["snapshot_id"] = snapshot_id
+        return await self._delete(f"playlists/{_get_id('playlist', playlist_id)}/tracks", payload=data)
+
+    async def playlist_replace_items(self, playlist_id, items):
+        data = {"uris": [_get_uri("track", item) for item in items]}
+        return await self._put(f"playlists/{_get_id('playlist', playlist_id)}/tracks", payload=data)
+
+    async def playlist_reorder_items(self, playlist_id, range_start, insert_before, range_length=1, snapshot_id=None):
+        data = {"range_start": range_start, "range_length": range_length, "insert_before": insert_before}
+        if snapshot_id:
+            data["snapshot_id"] = snapshot_id
+        return await self._put(f"playlists/{_get_id('playlist', playlist_id)}/tracks", payload=data)
+
+    # =========================================================================
+    # Search
+    # =========================================================================
+
+    async def search(self, q, limit=10, offset=0, type="track", market=None):
+        return await self._get("search", q=q, limit=limit, offset=offset, type=type, market=market)
@@ -0,0 +1,208 @@
+"""
+In-memory response cache for Spotify read endpoints.
+
+Agents often ask for devices, playlists or the current track several times
+within a few seconds. Each read endpoint gets its own TTL and size limit,
+and every mutating call drops exactly the entries it can have changed.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from urllib.parse import urlencode
+
+# Read endpoint -> (ttl seconds, max entries)
+DEFAULT_POLICIES = {
+    "current_user": (3600.0, 1),
+    "devices": (10.0, 1),
+    "currently_playing": (5.0, 1),
+    "current_user_playlists": (60.0, 32),
+    "playlist_tracks": (60.0, 256),
+}
+
+# Mutating endpoint -> [(cached endpoint, index of the playlist ID argument or None for all entries)]
+INVALIDATES = {
+    "playlist_add_items": [("playlist_tracks", 0), ("current_user_playlists", None)],
+    "playlist_remove_all_occurrences_of_items": [("playlist_tracks", 0), ("current_user_playlists", None)],
+    "playlist_remove_specific_occurrences_of_items": [("playlist_tracks", 0), ("current_user_playlists", None)],
+    "playlist_replace_items": [("playlist_tracks", 0), ("current_user_playlists", None)],
+    "playlist_reorder_items": [("playlist_tracks", 0), ("current_user_playlists", None)],
+    "user_playlist_create": [("current_user_playlists", None)],
+    "user_playlist_unfollow": [("playlist_tracks", 1), ("current_user_playlists", None)],
+    "transfer_playback": [("devices", None), ("currently_playing", None)],
+    "start_playback": [("currently_playing", None)],
+    "pause_playback": [("currently_playing", None)],
+    "next_track": [("currently_playing", None)],
+    "previous_track": [("currently_playing", None)],
+}
+
+MISSING = object()
+
+
+def make_key(args: tuple, kwargs: dict) -> tuple:
+    """Build a hashable cache key from call arguments."""
+    def freeze(value):
+        if isinstance(value, (list, tuple)):
+            return tuple(freeze(v) for v in value)
+        if isinstance(value, dict):
+            return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+        return value
+    return freeze(args), freeze(kwargs)
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache keyed by endpoint and arguments.
+
+    Cached values are shared between callers and must be treated as read-only.
+    Every invalidation bumps a generation counter, per endpoint or per
+    playlist. A read notes the generation before its request and passes it
+    to put, so a response fetched before an overlapping mutation landed is
+    not cached over it.
+    """
+
+    def __init__(self, policies: dict[str, tuple[float, int]] | None = None, invalidates: dict | None = None):
+        self.policies = DEFAULT_POLICIES if policies is None else policies
+        self.invalidates = INVALIDATES if invalidates is None else invalidates
+        self._entries: dict[str, OrderedDict] = {method: OrderedDict() for method in self.policies}
+        self.hits = dict.fromkeys(self.policies, 0)
+        self.misses = dict.fromkeys(self.policies, 0)
+        self.invalidations = dict.fromkeys(self.policies, 0)
+        self.discarded = dict.fromkeys(self.policies, 0)
+        self._generations: dict[str, int] = dict.fromkeys(self.policies, 0)
+        self._playlist_generations: dict[tuple[str, str], int] = {}
+
+    def generation(self, method: str, key: tuple) -> tuple[int, int]:
+        """The invalidation generation of the entry for key, to hand back to put."""
+        playlist_id = key[0][0] if key[0] else None
+        return self._generations[method], self._playlist_generations.get((method, playlist_id), 0)
+
+    def get(self, method: str, key: tuple) -> Any:
+        """Return the cached value, or MISSING."""
+        entries = self._entries[method]
+        entry = entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del entries[key]
+            self.misses[method] += 1
+            return MISSING
+        entries.move_to_end(key)
+        self.hits[method] += 1
+        return entry[1]
+
+    def put(self, method: str, key: tuple, value: Any, generation: tuple[int, int] | None = None) -> None:
+        """Store value, unless key has been invalidated since generation was taken."""
+        if generation is not None and generation != self.generation(method, key):
+            self.discarded[method] += 1
+            return
+        ttl, max_entries = self.policies[method]
+        entries = self._entries[method]
+        entries[key] = (time.monotonic() + ttl, value)
+        entries.move_to_end(key)
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+
+    def invalidate(self, method: str, playlist_id: str | None = None) -> None:
+        """Drop all entries of method, or only those for one playlist."""
+        entries = self._entries[method]
+        if playlist_id is None:
+            self._generations[method] += 1
+            self.invalidations[method] += len(entries)
+            entries.clear()
+            return
+        self._playlist_generations[method, playlist_id] = self._playlist_generations.get((method, playlist_id), 0) + 1
+        stale = [key for key in entries if key[0] and key[0][0] == playlist_id]
+        for key in stale:
+            del entries[key]
+        self.invalidations[method] += len(stale)
+
+    def invalidate_for(self, method: str, args: tuple) -> None:
+        """Drop the entries a call to the mutating endpoint method may have changed."""
+        for cached, arg_index in self.invalidates.get(method, ()):
+            if cached not in self._entries:
+                continue
+            playlist_id = args[arg_index] if arg_index is not None and len(args) > arg_index else None
+            self.invalidate(cached, playlist_id)
+
+    def clear(self) -> None:
+        for entries in self._entries.values():
+            entries.clear()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Hit, miss, invalidation and size counts per endpoint."""
+        return {
+            method: {
+                "hits": self.hits[method],
+                "misses": self.misses[method],
+                "invalidations": self.invalidations[method],
+                "discarded": self.discarded[method],
+                "entries": len(self._entries[method]),
+            }
+            for method in self.policies
+        }
+
+
+DEFAULT_ETAG_BYTES = 32 * 1024 * 1024
+
+
+def etag_key(url: str, params: dict | None) -> str:
+    """Identify a GET request by its URL and non-empty query parameters."""
+    query = sorted((k, v) for k, v in (params or {}).items() if v is not None)
+    return f"{url}?{urlencode(query)}" if query else url
+
+
+class ETagCache:
+    """
+    Response bodies stored with their ETags, for conditional GET requests.
+
+    Unlike ResponseCache this never serves anything stale: every read still
+    goes to Spotify with If-None-Match, and a stored body is only reused when
+    Spotify answers 304 Not Modified. Shared by the HTTP client threads.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_ETAG_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, tuple[str, bytes]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.revalidated = 0
+        self.full = 0
+        self.bytes_saved = 0
+
+    def get(self, key: str) -> tuple[str, bytes] | None:
+        """Return the stored (etag, body) for a request, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, etag: str, body: bytes) -> None:
+        with self._lock:
+            self.full += 1
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            if len(body) > self.max_bytes:
+                return
+            self._entries[key] = (etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def not_modified(self, body: bytes) -> None:
+        """Count a 304 answered from the stored body."""
+        with self._lock:
+            self.revalidated += 1
+            self.bytes_saved += len(body)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "revalidated": self.revalidated,
+                "full": self.full,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "bytes_saved": self.bytes_saved,
+            }
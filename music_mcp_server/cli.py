@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Command line entry point for music-mcp-server.
+
+Picks how the server runs: a standalone stdio server (the default), an HTTP
+server that many clients connect to at once, the shared daemon, or a thin
+stdio shim in front of that daemon. Heavy modules are only imported for the
+mode that needs them.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+
+def main():
+    """Run the MCP server in the selected mode."""
+    parser = argparse.ArgumentParser(prog="music-mcp-server", description="Control Spotify from MCP clients.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--daemon",
+        action="store_true",
+        help="run the shared backend on a Unix socket",
+    )
+    mode.add_argument(
+        "--shared",
+        action="store_true",
+        default=os.environ.get("MUSIC_MCP_SHARED", "") not in ("", "0"),
+        help="forward stdio to the shared backend, starting it if needed (or set MUSIC_MCP_SHARED=1)",
+    )
+    mode.add_argument(
+        "--transport",
+        choices=["stdio", "sse", "streamable-http"],
+        help="serve MCP over stdio (default) or HTTP (or set MUSIC_MCP_TRANSPORT)",
+    )
+    parser.add_argument("--host", help="address the HTTP transports listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="port the HTTP transports listen on (default 8000)")
+    parser.add_argument("--workers", type=int, help="threads running blocking Spotify calls (default 8)")
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="tool calls run at once across all clients; the rest wait (default 0 = no limit)",
+    )
+    parser.add_argument("--socket", type=Path, help="daemon socket path")
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="seconds the daemon stays up with no clients (0 = forever)",
+    )
+    args = parser.parse_args()
+
+    if args.daemon or (args.shared and args.transport is None):
+        from music_mcp_server import daemon
+        if not daemon.is_supported():
+            print("⚠️ Shared mode needs Unix sockets; running a standalone server.", file=sys.stderr)
+        elif args.daemon:
+            idle_timeout = daemon.DEFAULT_IDLE_TIMEOUT if args.idle_timeout is None else args.idle_timeout
+            daemon.run_daemon(args.socket, idle_timeout)
+            return
+        else:
+            daemon.run_shim(args.socket)
+            return
+
+    from music_mcp_server.server import main as run_server
+    run_server(args.transport, args.host, args.port, args.workers, args.max_concurrency)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Config directory and credential helpers.
+
+Kept free of heavy imports so the stdio shim can use them without loading
+the MCP or Spotify libraries.
+"""
+import os
+import sys
+import json
+from pathlib import Path
+
+def get_config_dir() -> Path:
+    """Get the config directory for storing credentials."""
+    if sys.platform == "darwin":
+        config_dir = Path.home() / "Library" / "Application Support" / "music-mcp-server"
+    elif sys.platform == "win32":
+        config_dir = Path(os.environ.get("APPDATA", Path.home())) / "music-mcp-server"
+    else:
+        config_dir = Path.home() / ".config" / "music-mcp-server"
+    return config_dir
+
+def get_credentials_path() -> Path:
+    """Get path to credentials file."""
+    return get_config_dir() / "credentials.json"
+
+def load_credentials() -> dict | None:
+    """Load credentials from config file."""
+    creds_path = get_credentials_path()
+    if creds_path.exists():
+        with open(creds_path) as f:
+            return json.load(f)
+    return None
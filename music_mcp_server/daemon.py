@@ -0,0 +1,199 @@
+"""
+Shared daemon mode.
+
+One backend process (`music-mcp-server --daemon`) listens on a Unix socket
+and runs a full MCP session for every connection. Each editor window then
+starts a thin stdio shim (`music-mcp-server --shared`) that just copies
+bytes between its stdin/stdout and the socket. The Spotify client, token,
+connection pools and caches live once in the daemon instead of once per
+window.
+
+This module only uses the standard library at import time, so the shim
+never loads the MCP or Spotify libraries.
+"""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from music_mcp_server.config import get_config_dir
+from music_mcp_server.tokens import file_lock
+
+# Stop the daemon after this many seconds without any connected shim (0 = never)
+DEFAULT_IDLE_TIMEOUT = 600.0
+# Longest JSON-RPC line accepted from a shim
+MAX_LINE = 64 * 1024 * 1024
+
+
+def get_socket_path() -> Path:
+    """Get the path of the daemon's Unix socket."""
+    return Path(os.environ.get("MUSIC_MCP_SOCKET") or get_config_dir() / "daemon.sock")
+
+
+def is_supported() -> bool:
+    """Whether this platform has Unix sockets."""
+    return hasattr(socket, "AF_UNIX")
+
+
+def _connect(path: Path) -> socket.socket | None:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+# =============================================================================
+# Daemon
+# =============================================================================
+
+class _SocketLines:
+    """Adapt a socket stream to the async text file interface stdio_server expects."""
+
+    def __init__(self, stream):
+        from anyio.streams.buffered import BufferedByteReceiveStream
+        self._stream = stream
+        self._buffered = BufferedByteReceiveStream(stream)
+
+    async def __aiter__(self):
+        import anyio
+        while True:
+            try:
+                line = await self._buffered.receive_until(b"\n", MAX_LINE)
+            except (anyio.IncompleteRead, anyio.EndOfStream, anyio.BrokenResourceError):
+                return
+            yield line.decode("utf-8")
+
+    async def write(self, data: str) -> None:
+        await self._stream.send(data.encode("utf-8"))
+
+    async def flush(self) -> None:
+        pass
+
+
+async def serve(path: Path, idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> None:
+    """Accept shim connections on path and run one MCP session per connection."""
+    import anyio
+    from mcp.server.stdio import stdio_server
+    from music_mcp_server.server import app, warm_up
+
+    mcp_server = app._mcp_server
+    active = 0
+    idle_since = time.monotonic()
+
+    async def handle(stream):
+        nonlocal active, idle_since
+        active += 1
+        try:
+            async with stream:
+                lines = _SocketLines(stream)
+                async with stdio_server(lines, lines) as (read_stream, write_stream):
+                    await mcp_server.run(read_stream, write_stream, mcp_server.create_initialization_options())
+                    # The client hung up; stop the writer too
+                    await write_stream.aclose()
+        except anyio.BrokenResourceError:
+            pass
+        finally:
+            active -= 1
+            idle_since = time.monotonic()
+
+    with file_lock(path.with_name(path.name + ".lock")):
+        probe = _connect(path)
+        if probe is not None:
+            probe.close()
+            print(f"Daemon already running on {path}", file=sys.stderr)
+            return
+        path.unlink(missing_ok=True)
+        listener = await anyio.create_unix_listener(path)
+    os.chmod(path, 0o600)
+    threading.Thread(target=warm_up, name="spotify-warm-up", daemon=True).start()
+    print(f"Daemon listening on {path}", file=sys.stderr)
+
+    try:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(listener.serve, handle)
+            while True:
+                await anyio.sleep(min(idle_timeout, 5) if idle_timeout else 3600)
+                if idle_timeout and active == 0 and time.monotonic() - idle_since > idle_timeout:
+                    print("Daemon idle, shutting down", file=sys.stderr)
+                    tg.cancel_scope.cancel()
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def run_daemon(path: Path | None = None, idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> None:
+    """Run the shared backend until it has been idle for idle_timeout seconds."""
+    import anyio
+    path = path or get_socket_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    anyio.run(serve, path, idle_timeout)
+
+
+# =============================================================================
+# Shim
+# =============================================================================
+
+def _spawn_daemon(path: Path) -> None:
+    """Start a detached daemon that outlives this shim."""
+    log = open(path.with_name("daemon.log"), "ab")
+    subprocess.Popen(
+        [sys.executable, "-m", "music_mcp_server.cli", "--daemon", "--socket", str(path)],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=log,
+        start_new_session=True,
+    )
+    log.close()
+
+
+def connect(path: Path | None = None, timeout: float = 15.0) -> socket.socket:
+    """Connect to the daemon, starting one if none is listening."""
+    path = path or get_socket_path()
+    sock = _connect(path)
+    if sock is not None:
+        return sock
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _spawn_daemon(path)
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        sock = _connect(path)
+        if sock is not None:
+            return sock
+        delay = min(delay * 2, 0.5)
+    raise RuntimeError(f"Could not connect to the music-mcp-server daemon at {path}")
+
+
+def run_shim(path: Path | None = None) -> None:
+    """Forward this process's stdio to the daemon until either side closes."""
+    sock = connect(path)
+    stdin = sys.stdin.buffer.raw if hasattr(sys.stdin.buffer, "raw") else sys.stdin.buffer
+    stdout = sys.stdout.buffer
+
+    def pump_stdin():
+        try:
+            while chunk := stdin.read(65536):
+                sock.sendall(chunk)
+        except OSError:
+            pass
+        finally:
+            try:
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    threading.Thread(target=pump_stdin, name="shim-stdin", daemon=True).start()
+    try:
+        while chunk := sock.recv(65536):
+            stdout.write(chunk)
+            stdout.flush()
+    except OSError:
+        pass
+    finally:
+        sock.close()
@@ -0,0 +1,61 @@
+"""
+Off-loop dispatch for Spotify calls.
+
+spotipy is a blocking client, so every call is handed to a bounded thread
+pool instead of running on the MCP event loop. Slow round-trips then only
+hold up the tool that made them, and concurrent tool calls overlap.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 15.0
+
+
+class Dispatcher:
+    """Run blocking Spotify calls on a bounded thread pool."""
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, timeout: float | None = DEFAULT_TIMEOUT):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor: ThreadPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """The worker pool, created on first use."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="spotify",
+            )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: float | None = None, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) on the pool and await its result.
+
+        If the caller is cancelled (e.g. the MCP request was cancelled) or the
+        timeout expires, the pending work is cancelled. A call that is already
+        running in a worker finishes in the background and its result is dropped.
+
+        Coroutine functions (the async backend) are awaited directly on the
+        loop, under the same timeout.
+        """
+        limit = timeout if timeout is not None else self.timeout
+        if asyncio.iscoroutinefunction(fn):
+            future = fn(*args, **kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, limit)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Spotify call timed out after {limit:g}s") from None
+
+    def shutdown(self) -> None:
+        """Stop the worker pool without waiting for running calls."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
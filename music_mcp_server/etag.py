@@ -0,0 +1,36 @@
+"""
+Conditional GET support for the spotipy backend.
+
+ETagSession is a requests session that revalidates GET requests against an
+ETagCache: it sends If-None-Match for bodies it has seen, and turns a 304
+Not Modified back into the stored 200 response so spotipy never notices.
+"""
+import requests
+
+from music_mcp_server.cache import ETagCache, etag_key
+
+
+class ETagSession(requests.Session):
+    """requests session that revalidates GETs with If-None-Match."""
+
+    def __init__(self, etags: ETagCache):
+        super().__init__()
+        self.etags = etags
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        if method.upper() != "GET":
+            return super().request(method, url, params=params, headers=headers, **kwargs)
+        key = etag_key(url, params)
+        stored = self.etags.get(key)
+        if stored is not None:
+            headers = dict(headers or {}, **{"If-None-Match": stored[0]})
+        response = super().request(method, url, params=params, headers=headers, **kwargs)
+        if response.status_code == 304 and stored is not None:
+            # Present the stored body as the fresh 200 it is equivalent to
+            response.status_code = 200
+            response.reason = "OK"
+            response._content = stored[1]
+            self.etags.not_modified(stored[1])
+        elif response.status_code == 200 and response.headers.get("ETag"):
+            self.etags.put(key, response.headers["ETag"], response.content)
+        return response
@@ -0,0 +1,413 @@
+"""
+Local SQLite mirror of the user's playlists and their tracks.
+
+The mirror is filled by an incremental sync: the playlist listing is cheap,
+and only playlists whose snapshot_id changed since the last sync have their
+tracks fetched again. Read tools can then answer from the mirror while it is
+fresh. Mutations made through this server mark the playlists they touch as
+dirty so those are read from Spotify until the next sync. Each mark also
+bumps the playlist's dirty generation; a sync only clears the mark if the
+generation is still the one it saw before fetching the tracks.
+
+An FTS5 index over track names, artists, albums and playlist names is
+kept in step with the mirror, one playlist at a time, for offline search.
+
+Every method blocks on SQLite, so the server calls them on its worker
+threads. Reads use their own connection and lock: in WAL mode they see the
+last committed state while a sync is storing a playlist, instead of
+waiting for it.
+"""
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+SCHEMA_VERSION = 3
+# Serve reads from the mirror for this many seconds after a sync
+DEFAULT_MAX_AGE = 300.0
+
+# Mutating endpoint -> indexes of its playlist ID argument; None means the playlist listing changed
+MARKS_DIRTY = {
+    "playlist_add_items": [0],
+    "playlist_remove_all_occurrences_of_items": [0],
+    "playlist_remove_specific_occurrences_of_items": [0],
+    "playlist_replace_items": [0],
+    "playlist_reorder_items": [0],
+    "user_playlist_create": [None],
+    "user_playlist_unfollow": [1, None],
+}
+
+
+def track_row(playlist_id: str, position: int, track: dict | None) -> tuple:
+    """Flatten a playlist item's track object into a tracks table row."""
+    track = track or {}
+    return (
+        playlist_id,
+        position,
+        track.get("uri"),
+        track.get("id"),
+        track.get("name"),
+        json.dumps([artist["name"] for artist in track.get("artists", [])]),
+        (track.get("album") or {}).get("name"),
+        track.get("duration_ms"),
+    )
+
+
+class LibraryMirror:
+    """Playlists and playlist tracks stored in a SQLite file shared between processes."""
+
+    def __init__(self, path: Path, max_age: float = DEFAULT_MAX_AGE):
+        self.path = Path(path)
+        self.max_age = max_age
+        self._db: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._reader: sqlite3.Connection | None = None
+        self._read_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            try:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                # Another process may be creating the schema at the same time
+                db.execute("BEGIN IMMEDIATE")
+                if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    self._create_schema(db)
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                db.close()
+                raise
+            self._db = db
+        return self._db
+
+    def _read(self) -> sqlite3.Connection:
+        """The read connection; call with _read_lock held."""
+        if self._reader is None:
+            # The writer's connection creates the file and schema first
+            with self._lock:
+                self._connect()
+            self._reader = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        return self._reader
+
+    @staticmethod
+    def _create_schema(db: sqlite3.Connection) -> None:
+        for table in ("meta", "playlists", "tracks", "track_index", "dirty_marks"):
+            db.execute(f"DROP TABLE IF EXISTS {table}")
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value)")
+        db.execute("""
+            CREATE TABLE playlists (
+                id TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                owner TEXT,
+                snapshot_id TEXT,
+                total INTEGER NOT NULL,
+                dirty INTEGER NOT NULL DEFAULT 1
+            )
+        """)
+        db.execute("""
+            CREATE TABLE tracks (
+                playlist_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                uri TEXT,
+                id TEXT,
+                name TEXT,
+                artists TEXT NOT NULL,
+                album TEXT,
+                duration_ms INTEGER,
+                PRIMARY KEY (playlist_id, position)
+            )
+        """)
+        # Bumped by every dirty mark, also for playlists not mirrored yet
+        db.execute("CREATE TABLE dirty_marks (playlist_id TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+        # Rows share their rowid with the tracks row they index
+        db.execute("""
+            CREATE VIRTUAL TABLE track_index USING fts5(
+                name, artists, album, playlist,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """)
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _transaction(self):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        return db
+
+    def _meta(self, db: sqlite3.Connection, key: str, default=None):
+        row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    # -------------------------------------------------------------------------
+    # Sync
+    # -------------------------------------------------------------------------
+
+    def diff(self, listing: list[dict]) -> tuple[list[dict], list[dict], list[str]]:
+        """
+        Compare a fresh playlist listing with the mirror.
+
+        Returns the listed playlists that are new to the mirror, those whose
+        snapshot_id changed (or that are dirty), and the IDs of mirrored
+        playlists no longer listed.
+        """
+        with self._read_lock:
+            known = dict(self._read().execute(
+                "SELECT id, CASE WHEN dirty THEN NULL ELSE snapshot_id END FROM playlists"
+            ))
+        listed = {playlist["id"] for playlist in listing}
+        new = [p for p in listing if p["id"] not in known]
+        changed = [p for p in listing if p["id"] in known and (known[p["id"]] is None or known[p["id"]] != p.get("snapshot_id"))]
+        return new, changed, [pid for pid in known if pid not in listed]
+
+    def generation(self, playlist_id: str) -> int:
+        """The playlist's dirty generation, to pass to store_playlist with tracks fetched after reading it."""
+        with self._read_lock:
+            row = self._read().execute(
+                "SELECT generation FROM dirty_marks WHERE playlist_id = ?", (playlist_id,)
+            ).fetchone()
+        return 0 if row is None else row[0]
+
+    def store_playlist(self, playlist: dict, items: list[dict], generation: int | None = None) -> None:
+        """
+        Replace the mirrored tracks of one playlist.
+
+        If generation is given and the playlist was marked dirty since it was
+        read, the tracks may predate that mutation and the playlist stays dirty.
+        """
+        with self._lock:
+            db = self._transaction()
+            try:
+                row = db.execute(
+                    "SELECT generation FROM dirty_marks WHERE playlist_id = ?", (playlist["id"],)
+                ).fetchone()
+                dirty = int(generation is not None and (0 if row is None else row[0]) != generation)
+                self._unindex(db, playlist["id"])
+                db.execute("DELETE FROM tracks WHERE playlist_id = ?", (playlist["id"],))
+                db.executemany(
+                    "INSERT INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (track_row(playlist["id"], i, item.get("track")) for i, item in enumerate(items)),
+                )
+                db.execute(
+                    """INSERT INTO track_index (rowid, name, artists, album, playlist)
+                       SELECT rowid, name, (SELECT group_concat(value, ', ') FROM json_each(artists)), album, ?
+                       FROM tracks WHERE playlist_id = ? AND name IS NOT NULL""",
+                    (playlist.get("name", ""), playlist["id"]),
+                )
+                db.execute(
+                    """INSERT INTO playlists (id, position, name, owner, snapshot_id, total, dirty)
+                       VALUES (?, -1, ?, ?, ?, ?, ?)
+                       ON CONFLICT (id) DO UPDATE SET
+                           name = excluded.name, owner = excluded.owner,
+                           snapshot_id = excluded.snapshot_id, total = excluded.total, dirty = excluded.dirty""",
+                    (
+                        playlist["id"],
+                        playlist.get("name", ""),
+                        (playlist.get("owner") or {}).get("id"),
+                        playlist.get("snapshot_id"),
+                        len(items),
+                        dirty,
+                    ),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def store_listing(self, listing: list[dict]) -> None:
+        """Record the playlist listing in order, drop unlisted playlists and mark the mirror synced."""
+        with self._lock:
+            db = self._transaction()
+            try:
+                listed = {playlist["id"] for playlist in listing}
+                known = dict(db.execute("SELECT id, name FROM playlists"))
+                gone = [pid for pid in known if pid not in listed]
+                for pid in gone:
+                    self._unindex(db, pid)
+                db.executemany("DELETE FROM tracks WHERE playlist_id = ?", ((pid,) for pid in gone))
+                for p in listing:
+                    if p["id"] in known and known[p["id"]] != p.get("name", ""):
+                        db.execute(
+                            """UPDATE track_index SET playlist = ?
+                               WHERE rowid IN (SELECT rowid FROM tracks WHERE playlist_id = ?)""",
+                            (p.get("name", ""), p["id"]),
+                        )
+                db.executemany("DELETE FROM playlists WHERE id = ?", ((pid,) for pid in gone))
+                db.executemany("DELETE FROM dirty_marks WHERE playlist_id = ?", ((pid,) for pid in gone))
+                # Playlists whose tracks could not be fetched (new ones, or ones whose
+                # snapshot_id no longer matches the stored tracks) are left dirty
+                db.executemany(
+                    """INSERT INTO playlists (id, position, name, owner, snapshot_id, total, dirty)
+                       VALUES (?, ?, ?, ?, NULL, 0, 1)
+                       ON CONFLICT (id) DO UPDATE SET
+                           position = excluded.position, name = excluded.name,
+                           dirty = CASE WHEN snapshot_id IS ? THEN dirty ELSE 1 END""",
+                    (
+                        (p["id"], i, p.get("name", ""), (p.get("owner") or {}).get("id"), p.get("snapshot_id"))
+                        for i, p in enumerate(listing)
+                    ),
+                )
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('synced_at', ?)", (time.time(),))
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('listing_dirty', 0)")
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _unindex(db: sqlite3.Connection, playlist_id: str) -> None:
+        db.execute(
+            "DELETE FROM track_index WHERE rowid IN (SELECT rowid FROM tracks WHERE playlist_id = ?)",
+            (playlist_id,),
+        )
+
+    def mark_dirty_for(self, method: str, args: tuple) -> None:
+        """Mark what a call to the mutating endpoint method may have changed."""
+        targets = MARKS_DIRTY.get(method)
+        if not targets:
+            return
+        try:
+            with self._lock:
+                db = self._connect()
+                for index in targets:
+                    if index is None:
+                        db.execute("INSERT OR REPLACE INTO meta VALUES ('listing_dirty', 1)")
+                    elif len(args) > index:
+                        db.execute(
+                            """INSERT INTO dirty_marks VALUES (?, 1)
+                               ON CONFLICT (playlist_id) DO UPDATE SET generation = generation + 1""",
+                            (args[index],),
+                        )
+                        db.execute("UPDATE playlists SET dirty = 1 WHERE id = ?", (args[index],))
+        except sqlite3.Error as e:
+            # Without the mark the mirror could serve stale tracks, so stop serving it
+            print(f"⚠️ Library mirror unavailable ({e})", file=sys.stderr)
+            self.max_age = 0
+
+    # -------------------------------------------------------------------------
+    # Reads
+    # -------------------------------------------------------------------------
+
+    def synced_at(self) -> float | None:
+        with self._read_lock:
+            return self._meta(self._read(), "synced_at")
+
+    def is_fresh(self) -> bool:
+        """Whether the mirror was synced within max_age seconds."""
+        synced_at = self.synced_at()
+        return synced_at is not None and time.time() - synced_at <= self.max_age
+
+    def playlists(self, offset: int, limit: int) -> tuple[list[dict], int] | None:
+        """A page of the playlist listing and its total, or None if it can't be served locally."""
+        try:
+            return self._playlists(offset, limit)
+        except sqlite3.Error as e:
+            print(f"⚠️ Library mirror unavailable ({e})", file=sys.stderr)
+            return None
+
+    def _playlists(self, offset: int, limit: int) -> tuple[list[dict], int] | None:
+        if not self.is_fresh():
+            return None
+        with self._read_lock:
+            db = self._read()
+            if self._meta(db, "listing_dirty", 0):
+                return None
+            total = db.execute("SELECT COUNT(*) FROM playlists").fetchone()[0]
+            rows = db.execute(
+                "SELECT id, name FROM playlists ORDER BY position LIMIT ? OFFSET ?", (limit, offset)
+            ).fetchall()
+        return [{"id": pid, "name": name} for pid, name in rows], total
+
+    def playlist_items(self, playlist_id: str, offset: int, limit: int) -> tuple[list[dict], int] | None:
+        """A page of playlist items and the playlist total, or None if it can't be served locally."""
+        try:
+            return self._playlist_items(playlist_id, offset, limit)
+        except sqlite3.Error as e:
+            print(f"⚠️ Library mirror unavailable ({e})", file=sys.stderr)
+            return None
+
+    def _playlist_items(self, playlist_id: str, offset: int, limit: int) -> tuple[list[dict], int] | None:
+        if not self.is_fresh():
+            return None
+        with self._read_lock:
+            db = self._read()
+            row = db.execute("SELECT total, dirty FROM playlists WHERE id = ?", (playlist_id,)).fetchone()
+            if row is None or row[1]:
+                return None
+            rows = db.execute(
+                """SELECT uri, id, name, artists, album, duration_ms FROM tracks
+                   WHERE playlist_id = ? AND position >= ? ORDER BY position LIMIT ?""",
+                (playlist_id, offset, limit),
+            ).fetchall()
+        items = []
+        for uri, track_id, name, artists, album, duration_ms in rows:
+            if uri is None and name is None:
+                items.append({"track": None})
+                continue
+            items.append({"track": {
+                "uri": uri,
+                "id": track_id,
+                "name": name,
+                "artists": [{"name": artist} for artist in json.loads(artists)],
+                "album": {"name": album},
+                "duration_ms": duration_ms,
+            }})
+        return items, row[0]
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        """
+        Rank mirrored tracks against query, best match first.
+
+        Every word of the query must match, as a prefix, in the track name,
+        artists, album or playlist name. A track found in several playlists
+        is returned once, listing all of them.
+        """
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        match = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+        with self._read_lock:
+            rows = self._read().execute(
+                """SELECT t.uri, t.id, t.name, t.artists, t.album, t.duration_ms, p.name
+                   FROM track_index
+                   JOIN tracks t ON t.rowid = track_index.rowid
+                   JOIN playlists p ON p.id = t.playlist_id
+                   WHERE track_index MATCH ?
+                   ORDER BY bm25(track_index, 10.0, 5.0, 2.0, 1.0)
+                   LIMIT ?""",
+                (match, limit * 20),
+            ).fetchall()
+        results = {}
+        for uri, track_id, name, artists, album, duration_ms, playlist in rows:
+            hit = results.get(uri or name)
+            if hit is None:
+                if len(results) == limit:
+                    continue
+                hit = results[uri or name] = {
+                    "uri": uri,
+                    "id": track_id,
+                    "name": name,
+                    "artists": [{"name": artist} for artist in json.loads(artists)],
+                    "album": {"name": album},
+                    "duration_ms": duration_ms,
+                    "playlists": [],
+                }
+            if playlist not in hit["playlists"]:
+                hit["playlists"].append(playlist)
+        return list(results.values())
+
+    def stats(self) -> dict[str, int]:
+        """Mirrored playlists, how many of them are dirty, and tracks; all 0 if the file can't be read."""
+        try:
+            with self._read_lock:
+                db = self._read()
+                playlists, dirty = db.execute("SELECT COUNT(*), COALESCE(SUM(dirty), 0) FROM playlists").fetchone()
+                tracks = db.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+        except sqlite3.Error:
+            playlists = dirty = tracks = 0
+        return {"playlists": playlists, "dirty": dirty, "tracks": tracks}
@@ -0,0 +1,245 @@
+"""
+In-process metrics for the MCP tools and the Spotify requests behind them.
+
+Tool calls and outbound requests are timed into fixed-bucket histograms, and
+failures are counted by class (429, 401, 404, timeout, ...). Tools report
+errors as text rather than raising, so a tool call that returns an error is
+attributed to the last Spotify request it saw fail. Metrics can be read back
+with get_server_stats and written to a file periodically, as Prometheus text
+or JSON.
+"""
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+# Upper bounds, in seconds, of the latency histogram buckets (plus +Inf)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEFAULT_DUMP_INTERVAL = 60.0
+
+# Outcome of the tool call in progress, shared with the requests it makes
+_outcome: contextvars.ContextVar[dict | None] = contextvars.ContextVar("tool_outcome", default=None)
+
+
+def error_class(error: BaseException) -> str:
+    """Short class of an error: the HTTP status for API errors, "timeout", or the exception type."""
+    status = getattr(error, "http_status", None)
+    if status is not None:
+        return str(status)
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)) or "Timeout" in type(error).__name__:
+        return "timeout"
+    return type(error).__name__
+
+
+class Histogram:
+    """Counts of observations per latency bucket, with their sum."""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating within its bucket, as Prometheus does."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                if i == len(BUCKETS):
+                    return lower
+                return lower + (BUCKETS[i] - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-1]
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([*map(str, BUCKETS), "+Inf"], self.counts)),
+        }
+
+
+class Metrics:
+    """Latency histograms and error counts of tools and Spotify requests."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.tools: defaultdict[str, Histogram] = defaultdict(Histogram)
+        self.tool_errors: Counter = Counter()
+        self.upstream: defaultdict[str, Histogram] = defaultdict(Histogram)
+        self.upstream_errors: Counter = Counter()
+        self.responses = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        # Callables returning {cache name: {"hits": n, "misses": n}}, read on each snapshot
+        self.collectors: list[Callable[[], dict[str, dict[str, int]]]] = []
+        # Component name -> callable returning {label: {field: number}}, e.g. the scheduler's lanes
+        self.components: dict[str, Callable[[], dict[str, dict[str, float]]]] = {}
+        # Response hooks run on the dispatcher's worker threads
+        self._lock = threading.Lock()
+
+    def tool(self, fn: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        """Wrap a tool coroutine function to time its calls and count the failed ones."""
+        @functools.wraps(fn)
+        async def timed(*args, **kwargs):
+            outcome = {"error": None}
+            token = _outcome.set(outcome)
+            start = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                self.tool_errors[fn.__name__, error_class(e)] += 1
+                raise
+            finally:
+                self.tools[fn.__name__].observe(time.perf_counter() - start)
+                _outcome.reset(token)
+            if isinstance(result, str) and result.startswith("Error"):
+                self.tool_errors[fn.__name__, outcome["error"] or "other"] += 1
+            return result
+        return timed
+
+    async def outbound(self, method: str, request: Awaitable) -> Any:
+        """Await one Spotify request, timing it and counting its failure."""
+        start = time.perf_counter()
+        try:
+            return await request
+        except Exception as e:
+            kind = error_class(e)
+            self.upstream_errors[method, kind] += 1
+            outcome = _outcome.get()
+            if outcome is not None:
+                outcome["error"] = kind
+            raise
+        finally:
+            self.upstream[method].observe(time.perf_counter() - start)
+
+    def transferred(self, sent: int, received: int) -> None:
+        """Count the body bytes of one HTTP exchange."""
+        with self._lock:
+            self.responses += 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def caches(self) -> dict[str, dict[str, int]]:
+        counts = {}
+        for collect in self.collectors:
+            counts.update(collect())
+        return counts
+
+    def snapshot(self) -> dict[str, Any]:
+        """Everything recorded so far, as plain data."""
+        # Copies, since the dump thread may read while the event loop records
+        tool_errors, upstream_errors = dict(self.tool_errors), dict(self.upstream_errors)
+
+        def errors_by(counter: dict, name: str) -> dict[str, int]:
+            return {kind: n for (owner, kind), n in counter.items() if owner == name}
+
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "tools": {
+                name: dict(histogram.summary(), errors=errors_by(tool_errors, name))
+                for name, histogram in sorted(dict(self.tools).items())
+            },
+            "upstream": {
+                name: dict(histogram.summary(), errors=errors_by(upstream_errors, name))
+                for name, histogram in sorted(dict(self.upstream).items())
+            },
+            "transfer": {"responses": self.responses, "bytes_sent": self.bytes_sent, "bytes_received": self.bytes_received},
+            "caches": self.caches(),
+            **{name: collect() for name, collect in self.components.items()},
+        }
+
+    def prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def histogram(metric: str, help_text: str, label: str, series: dict) -> None:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, data in series.items():
+                cumulative = 0
+                for bound, count in data["buckets"].items():
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{label}="{name}"}} {data["mean"] * data["count"]:.6f}')
+                lines.append(f'{metric}_count{{{label}="{name}"}} {data["count"]}')
+
+        def errors(metric: str, help_text: str, label: str, series: dict) -> None:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for name, data in series.items():
+                for kind, count in data["errors"].items():
+                    lines.append(f'{metric}{{{label}="{name}",class="{kind}"}} {count}')
+
+        histogram("music_mcp_tool_duration_seconds", "Tool call latency.", "tool", snapshot["tools"])
+        errors("music_mcp_tool_errors_total", "Tool calls that returned an error.", "tool", snapshot["tools"])
+        histogram("music_mcp_upstream_duration_seconds", "Spotify request latency, including queueing.", "method", snapshot["upstream"])
+        errors("music_mcp_upstream_errors_total", "Failed Spotify requests.", "method", snapshot["upstream"])
+        transfer = snapshot["transfer"]
+        lines.append("# HELP music_mcp_upstream_bytes_total Body bytes exchanged with Spotify.")
+        lines.append("# TYPE music_mcp_upstream_bytes_total counter")
+        lines.append(f'music_mcp_upstream_bytes_total{{direction="sent"}} {transfer["bytes_sent"]}')
+        lines.append(f'music_mcp_upstream_bytes_total{{direction="received"}} {transfer["bytes_received"]}')
+        for outcome in ("hits", "misses"):
+            lines.append(f"# HELP music_mcp_cache_{outcome}_total Cache lookups that {'hit' if outcome == 'hits' else 'missed'}.")
+            lines.append(f"# TYPE music_mcp_cache_{outcome}_total counter")
+            for cache, counts in snapshot["caches"].items():
+                lines.append(f'music_mcp_cache_{outcome}_total{{cache="{cache}"}} {counts[outcome]}')
+        for name in self.components:
+            fields = sorted({field for values in snapshot[name].values() for field in values})
+            for field in fields:
+                lines.append(f"# TYPE music_mcp_{name}_{field} untyped")
+                for label, values in snapshot[name].items():
+                    if field in values:
+                        lines.append(f'music_mcp_{name}_{field}{{{name}="{label}"}} {values[field]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: Path) -> None:
+        """Write the metrics to path, as JSON if it ends in .json and Prometheus text otherwise."""
+        text = json.dumps(self.snapshot(), indent=2) if path.suffix == ".json" else self.prometheus()
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(text)
+        os.replace(tmp, path)
+
+    def start_dumping(self, path: Path, interval: float = DEFAULT_DUMP_INTERVAL) -> None:
+        """Rewrite path every interval seconds from a background thread, and once more at exit."""
+        def write():
+            try:
+                self.dump(path)
+            except OSError as e:
+                print(f"⚠️ Could not write metrics to {path} ({e})", file=sys.stderr)
+            except Exception as e:
+                # A failing component must not stop the dumps for good
+                print(f"⚠️ Could not collect metrics ({e})", file=sys.stderr)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                write()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        threading.Thread(target=run, name="metrics-dump", daemon=True).start()
+        atexit.register(write)
@@ -0,0 +1,45 @@
+"""
+Compact replies for tools that list things.
+
+Listing tools take an output argument. "text" (the default) is the usual
+formatted reply. "json" replies with the listing as compact JSON text, and
+"structured" sends it as MCP structured content, with a one-line summary as
+the text for clients that don't read structured content. Both hold only the
+requested fields, laid out as a table: the field names once, then one row of
+values per item. Tracks default to their ids rather than URIs there, and
+artists to one string. The "json" text is encoded by orjson when installed
+(pip install 'music-mcp-server[fast]'), otherwise by the standard library;
+structured content is serialized by the MCP SDK with the rest of the reply.
+"""
+import json
+from typing import Any
+
+from mcp.types import CallToolResult, TextContent
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+OUTPUT_FORMATS = ("text", "json", "structured")
+
+
+def check_output(output: str) -> bool:
+    """Whether output asks for a compact reply, raising ValueError if it is not a known format."""
+    if output not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output}'. Choose from: {', '.join(OUTPUT_FORMATS)}")
+    return output != "text"
+
+
+def dumps(obj: Any) -> str:
+    """obj as compact JSON, keeping non-ASCII text as is."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact(obj: dict[str, Any], output: str, summary: str) -> str | CallToolResult:
+    """The tool reply for obj: JSON text, or structured content described by summary."""
+    if output == "json":
+        return dumps(obj)
+    return CallToolResult(content=[TextContent(type="text", text=summary)], structuredContent=obj)
@@ -0,0 +1,150 @@
+"""
+Plan the Web API calls that turn one playlist track list into another.
+
+Tracks that already appear in the right relative order are kept in place.
+Surplus occurrences are removed by position, 100 per request. Runs of
+misplaced tracks are moved with one reorder each, and runs of missing
+tracks are inserted with one add each (100 per request). When a full
+replace would take fewer requests, that is planned instead.
+
+A plan is a list of steps, applied in order against the playlist as each
+previous step left it:
+
+    ("remove", [{"uri": ..., "positions": [...]}, ...])
+    ("move", range_start, insert_before, range_length)
+    ("add", uris, position)
+    ("replace", uris)
+"""
+from collections import Counter
+from difflib import SequenceMatcher
+
+# The Web API takes at most this many URIs (or URI/positions objects) per request
+MAX_ITEMS = 100
+
+
+def removal_positions(current: list[str], target: list[str]) -> list[int]:
+    """
+    Positions in current to delete so its tracks become a sub-multiset of target.
+
+    Occurrences outside the longest common runs with target are dropped first,
+    so tracks that are already in place stay put.
+    """
+    surplus = Counter(current) - Counter(target)
+    if not surplus:
+        return []
+    kept = set()
+    for a, _, size in SequenceMatcher(None, current, target, autojunk=False).get_matching_blocks():
+        kept.update(range(a, a + size))
+    remove = []
+    for in_place in (False, True):
+        for i, uri in enumerate(current):
+            if surplus[uri] > 0 and (i in kept) == in_place:
+                surplus[uri] -= 1
+                remove.append(i)
+    return sorted(remove)
+
+
+def removal_steps(current: list[str], positions: list[int]) -> list[tuple]:
+    """
+    Batch positional removals into requests of at most MAX_ITEMS URIs.
+
+    Batches go from the end of the playlist to the start, so the positions in
+    a later batch are not shifted by the earlier ones.
+    """
+    steps = []
+    batch: dict[str, list[int]] = {}
+    for position in sorted(positions, reverse=True):
+        uri = current[position]
+        if uri not in batch and len(batch) == MAX_ITEMS:
+            steps.append(("remove", [{"uri": u, "positions": sorted(p)} for u, p in batch.items()]))
+            batch = {}
+        batch.setdefault(uri, []).append(position)
+    if batch:
+        steps.append(("remove", [{"uri": u, "positions": sorted(p)} for u, p in batch.items()]))
+    return steps
+
+
+def arrange_steps(current: list[str], target: list[str]) -> list[tuple]:
+    """
+    Moves and adds that turn current into target.
+
+    Every track in current must also be wanted by target (removals come
+    first). Walks target left to right; at each mismatch either moves the
+    longest matching run found later in the playlist, or inserts the track
+    if the playlist has fewer copies left than target still needs.
+    """
+    cur = list(current)
+    remaining_cur = Counter(cur)
+    remaining_target = Counter(target)
+    steps = []
+    i = 0
+    while i < len(target):
+        uri = target[i]
+        if i < len(cur) and cur[i] == uri:
+            remaining_cur[uri] -= 1
+            remaining_target[uri] -= 1
+            i += 1
+            continue
+        if remaining_cur[uri] < remaining_target[uri]:
+            # Insert; extend the previous add if it ends right here
+            last = steps[-1] if steps else None
+            if last and last[0] == "add" and last[2] + len(last[1]) == i and len(last[1]) < MAX_ITEMS:
+                last[1].append(uri)
+            else:
+                steps.append(("add", [uri], i))
+            cur.insert(i, uri)
+            remaining_target[uri] -= 1
+            i += 1
+            continue
+        j = cur.index(uri, i + 1)
+        length = 1
+        while j + length < len(cur) and i + length < len(target) and cur[j + length] == target[i + length]:
+            length += 1
+        steps.append(("move", j, i, length))
+        block = cur[j:j + length]
+        del cur[j:j + length]
+        cur[i:i] = block
+        for moved in block:
+            remaining_cur[moved] -= 1
+            remaining_target[moved] -= 1
+        i += length
+    return steps
+
+
+def replace_steps(target: list[str]) -> list[tuple]:
+    """Replace the whole playlist, then append the rest in chunks."""
+    steps = [("replace", target[:MAX_ITEMS])]
+    for start in range(MAX_ITEMS, len(target), MAX_ITEMS):
+        steps.append(("add", target[start:start + MAX_ITEMS], None))
+    return steps
+
+
+def plan_sync(current: list[str], target: list[str]) -> list[tuple]:
+    """The shortest plan found to turn playlist current into target."""
+    if current == target:
+        return []
+    positions = removal_positions(current, target)
+    drop = set(positions)
+    kept = [uri for i, uri in enumerate(current) if i not in drop]
+    steps = removal_steps(current, positions) + arrange_steps(kept, target)
+    replace = replace_steps(target)
+    return replace if len(replace) < len(steps) else steps
+
+
+def apply_step(tracks: list[str], step: tuple) -> list[str]:
+    """Apply one plan step to a local track list, to check what a plan does."""
+    kind = step[0]
+    if kind == "remove":
+        drop = {p for item in step[1] for p in item["positions"]}
+        return [uri for i, uri in enumerate(tracks) if i not in drop]
+    if kind == "move":
+        _, start, before, length = step
+        block = tracks[start:start + length]
+        rest = tracks[:start] + tracks[start + length:]
+        at = before if before <= start else before - length
+        return rest[:at] + block + rest[at:]
+    if kind == "add":
+        _, uris, position = step
+        position = len(tracks) if position is None else position
+        return tracks[:position] + uris + tracks[position:]
+    return list(step[1])
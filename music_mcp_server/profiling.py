@@ -0,0 +1,206 @@
+"""
+On-demand profiling of slow tool calls.
+
+When enabled, a sample of tool calls runs under cProfile, and optionally
+tracemalloc. A call that takes longer than the threshold has its profile
+written to the profiles directory; faster ones are thrown away. Blocking
+Spotify calls that a profiled tool makes on the dispatcher's worker threads
+are profiled there and merged into its profile, so time spent on the
+network, JSON decoding and token refresh shows up next to the tool's own
+code. Only the newest dumps are kept.
+
+cProfile hooks a whole thread, so one tool call is profiled at a time, and
+its profile also holds whatever other tasks ran on the event loop meanwhile.
+"""
+import asyncio
+import cProfile
+import functools
+import io
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+DEFAULT_THRESHOLD = 1.0
+DEFAULT_SAMPLE_RATE = 1.0
+DEFAULT_KEEP = 50
+# Frames kept per traced allocation, and lines shown in the text reports
+TRACE_FRAMES = 10
+REPORT_LINES = 40
+
+
+class _Call:
+    """Profiles collected for one tool call."""
+
+    def __init__(self, name: str, arguments: dict, memory: bool):
+        self.name = name
+        self.arguments = arguments
+        self.memory = memory
+        self.profile = cProfile.Profile()
+        self.thread_profiles: list[cProfile.Profile] = []
+        self.before: tracemalloc.Snapshot | None = None
+        self.after: tracemalloc.Snapshot | None = None
+        self.peak = 0
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if self.memory and tracemalloc.is_tracing():
+            self.before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+        self.profile.enable()
+
+    def stop(self, keep_memory: bool) -> None:
+        self.profile.disable()
+        with self._lock:
+            self.finished = True
+        # Tracing may have been switched off during the call
+        if self.before is not None and keep_memory and tracemalloc.is_tracing():
+            self.after = tracemalloc.take_snapshot()
+            self.peak = tracemalloc.get_traced_memory()[1]
+
+    def add(self, profile: cProfile.Profile) -> None:
+        """Merge the profile of work done for this call on another thread."""
+        with self._lock:
+            if not self.finished:
+                self.thread_profiles.append(profile)
+
+
+class Profiler:
+    """Sample tool calls with cProfile and keep the profiles of slow ones."""
+
+    def __init__(
+        self,
+        directory: Path,
+        threshold: float = DEFAULT_THRESHOLD,
+        sample_rate: float = DEFAULT_SAMPLE_RATE,
+        keep: int = DEFAULT_KEEP,
+        memory: bool = False,
+    ):
+        self.directory = Path(directory)
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.keep = keep
+        self.memory = False
+        self.enabled = False
+        self.profiled = 0
+        self.dumped = 0
+        self._current: _Call | None = None
+        self._write_lock = threading.Lock()
+        self.configure(memory=memory)
+
+    def configure(
+        self,
+        enabled: bool | None = None,
+        threshold: float | None = None,
+        sample_rate: float | None = None,
+        memory: bool | None = None,
+    ) -> None:
+        """Change any of the settings; tracemalloc runs only while memory profiling is on."""
+        if threshold is not None:
+            self.threshold = threshold
+        if sample_rate is not None:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        if memory is not None:
+            self.memory = memory
+        if enabled is not None:
+            self.enabled = enabled
+        tracing = self.enabled and self.memory
+        if tracing and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        elif not tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def tool(self, fn: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        """Wrap a tool coroutine function so its calls can be sampled."""
+        @functools.wraps(fn)
+        async def sampled(*args, **kwargs):
+            if not self.enabled or self._current is not None or random.random() >= self.sample_rate:
+                return await fn(*args, **kwargs)
+            call = _Call(fn.__name__, kwargs, self.memory)
+            try:
+                call.start()
+            except ValueError:
+                # Some other profiler or debugger owns the hook
+                return await fn(*args, **kwargs)
+            self._current = call
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                slow = elapsed >= self.threshold
+                call.stop(keep_memory=slow)
+                self._current = None
+                self.profiled += 1
+                if slow:
+                    threading.Thread(target=self._write, args=(call, elapsed), name="profile-dump", daemon=True).start()
+        return sampled
+
+    def in_thread(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """fn, profiled into the current call's profile if it runs on a worker thread."""
+        call = self._current
+        if call is None or asyncio.iscoroutinefunction(fn):
+            return fn
+
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+ profiles every thread from the call's own profiler
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                call.add(profile)
+        return profiled
+
+    def _write(self, call: _Call, elapsed: float) -> None:
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+        base = self.directory / f"{stamp}-{call.name}-{elapsed * 1000:.0f}ms"
+        try:
+            with self._write_lock:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                stats = pstats.Stats(call.profile)
+                for profile in call.thread_profiles:
+                    stats.add(profile)
+                stats.dump_stats(base.with_suffix(".prof"))
+                report = io.StringIO()
+                report.write(f"{call.name}({call.arguments}) took {elapsed * 1000:.1f} ms\n")
+                report.write(f"Worker thread profiles merged: {len(call.thread_profiles)}\n\n")
+                stats.stream = report
+                stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+                if call.after is not None:
+                    report.write(f"Peak traced memory: {call.peak / 2**20:.1f} MB\nTop allocations during the call:\n")
+                    for stat in call.after.compare_to(call.before, "lineno")[:REPORT_LINES]:
+                        report.write(f"  {stat}\n")
+                base.with_suffix(".txt").write_text(report.getvalue())
+                self.dumped += 1
+                self._rotate()
+        except OSError as e:
+            print(f"⚠️ Could not write profile to {self.directory} ({e})", file=sys.stderr)
+
+    def _rotate(self) -> None:
+        """Delete all but the newest keep dumps."""
+        dumps = sorted(self.directory.glob("*.prof"))
+        for old in dumps[:max(len(dumps) - self.keep, 0)]:
+            old.unlink(missing_ok=True)
+            old.with_suffix(".txt").unlink(missing_ok=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "sample_rate": self.sample_rate,
+            "memory": self.memory,
+            "profiled": self.profiled,
+            "dumped": self.dumped,
+            "stored": len(list(self.directory.glob("*.prof"))) if self.directory.exists() else 0,
+        }
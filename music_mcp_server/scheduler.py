@@ -0,0 +1,234 @@
+"""
+Rate-limit-aware scheduling of outbound Spotify calls.
+
+Every Spotify request waits for a token from a shared token bucket before it
+is sent. When Spotify answers 429, the whole bucket pauses for the
+Retry-After period and the request is queued again instead of failing.
+Each call has a deadline covering queueing, retries and the request itself;
+if it cannot be met the call gives up with a TimeoutError.
+
+Calls are sorted into priority lanes. Interactive playback and device calls
+are always served before queued bulk catalog and playlist work. They also
+keep a few tokens of the bucket in reserve, so a long sync never delays a
+pause. Each lane has its own concurrency limit, and bulk work is rejected
+once its queue is full.
+"""
+import asyncio
+import contextlib
+import contextvars
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 20
+DEFAULT_DEADLINE = 30.0
+# Budget shared by all the calls of one tool that makes many requests
+DEFAULT_TOOL_DEADLINE = 120.0
+# Used when a 429 response carries no usable Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+# Lane -> (concurrency limit, max queued calls or 0 for unbounded, bucket tokens left for higher lanes)
+DEFAULT_LANES = {
+    INTERACTIVE: (4, 0, 0),
+    BULK: (4, 500, 2),
+}
+# Endpoints a user is waiting on right now; everything else is bulk
+INTERACTIVE_METHODS = frozenset({
+    "start_playback",
+    "pause_playback",
+    "next_track",
+    "previous_track",
+    "currently_playing",
+    "current_playback",
+    "devices",
+    "transfer_playback",
+})
+
+# Absolute deadline (time.monotonic()) shared by all calls made inside call_deadline()
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("spotify_deadline", default=None)
+
+
+@contextlib.contextmanager
+def call_deadline(seconds: float):
+    """Give every Spotify call made inside the block one shared time budget."""
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def lane_for(method: str) -> str:
+    """Priority lane of a Spotify client method."""
+    return INTERACTIVE if method in INTERACTIVE_METHODS else BULK
+
+
+def retry_after(error: Exception) -> float | None:
+    """
+    Return the Retry-After delay of a 429 response, or None for any other error.
+
+    spotipy also raises a 429 without response headers (an empty dict) when
+    its own retries run out; that is not Spotify throttling and is not
+    retried here.
+    """
+    headers = getattr(error, "headers", None)
+    if getattr(error, "http_status", None) != 429 or not headers:
+        return None
+    try:
+        return max(float(headers.get("Retry-After")), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class Overloaded(RuntimeError):
+    """Raised when a call is shed because its lane's queue is full."""
+
+
+class _Lane:
+    def __init__(self, name: str, limit: int, max_queue: int, reserve: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.reserve = reserve
+        self.active = 0
+        self.waiting: deque[asyncio.Future] = deque()
+        self.started = 0
+        self.shed = 0
+        self.queued_seconds = 0.0
+
+
+class Scheduler:
+    """Token bucket, priority lanes and Retry-After handling in front of the Spotify API."""
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        deadline: float = DEFAULT_DEADLINE,
+        lanes: dict[str, tuple[int, int, int]] | None = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.deadline = deadline
+        # Highest priority first
+        self.lanes = {
+            name: _Lane(name, limit, max_queue, min(reserve, max(burst - 1, 0)))
+            for name, (limit, max_queue, reserve) in (DEFAULT_LANES if lanes is None else lanes).items()
+        }
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+        self.throttled = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every request for the next seconds (after a 429)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _grant(self) -> None:
+        """Start waiting calls, highest lane first, as far as tokens and limits allow."""
+        self._timer = None
+        now = time.monotonic()
+        self._refill(now)
+        wake_in = None
+        for lane in self.lanes.values():
+            while lane.waiting and lane.active < lane.limit:
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1 + lane.reserve:
+                    self._tokens -= 1
+                    lane.active += 1
+                    lane.waiting.popleft().set_result(None)
+                    continue
+                else:
+                    wait = (1 + lane.reserve - self._tokens) / self.rate
+                wake_in = wait if wake_in is None else min(wake_in, wait)
+                break
+        if wake_in is not None:
+            self._timer = asyncio.get_running_loop().call_later(wake_in, self._grant)
+
+    def _regrant(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._grant()
+
+    def _release(self, lane: _Lane) -> None:
+        lane.active -= 1
+        self._regrant()
+
+    async def _acquire(self, lane: _Lane, deadline: float) -> None:
+        """Wait for a token and a free slot in lane without overrunning deadline."""
+        if lane.max_queue and len(lane.waiting) >= lane.max_queue:
+            lane.shed += 1
+            raise Overloaded(f"Too many queued Spotify requests ({len(lane.waiting)} {lane.name}); try again shortly")
+        if self._paused_until > deadline:
+            raise TimeoutError("Spotify rate limit: the pause Spotify asked for runs past this call's deadline")
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        lane.waiting.append(waiter)
+        self._regrant()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), deadline - start)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self._release(lane)
+            else:
+                waiter.cancel()
+                lane.waiting.remove(waiter)
+            raise
+        lane.started += 1
+        lane.queued_seconds += time.monotonic() - start
+
+    async def run(self, call: Callable[[float], Awaitable[Any]], lane: str = BULK) -> Any:
+        """
+        Run call(remaining_seconds) in lane once the rate limit allows it.
+
+        429 responses pause the bucket for their Retry-After and the call is
+        queued again, for as long as the deadline allows.
+        """
+        deadline = time.monotonic() + self.deadline
+        shared = _deadline.get()
+        if shared is not None:
+            deadline = min(deadline, shared)
+        lane = self.lanes[lane]
+        while True:
+            try:
+                await self._acquire(lane, deadline)
+            except asyncio.TimeoutError:
+                raise TimeoutError("Spotify rate limit: gave up waiting in the request queue") from None
+            try:
+                return await call(deadline - time.monotonic())
+            except Exception as e:
+                delay = retry_after(e)
+                if delay is None:
+                    raise
+                self.throttled += 1
+                self.pause(delay)
+                if time.monotonic() + delay > deadline:
+                    raise TimeoutError(
+                        f"Spotify rate limit: asked to retry after {delay:g}s, past this call's deadline"
+                    ) from None
+            finally:
+                self._release(lane)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Activity per lane."""
+        return {
+            lane.name: {
+                "active": lane.active,
+                "queued": len(lane.waiting),
+                "started": lane.started,
+                "shed": lane.shed,
+                "queued_seconds": round(lane.queued_seconds, 3),
+            }
+            for lane in self.lanes.values()
+        }
@@ -0,0 +1,139 @@
+"""
+Persistent on-disk cache of Spotify search results.
+
+Agents repeat the same searches across sessions, so results are kept in a
+small SQLite database in the config directory, keyed by normalized query,
+type and limit. Entries expire after a TTL and the least recently used ones
+are evicted once the database grows past its size budget. SQLite's WAL mode
+and busy timeout let several server processes share the file.
+"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+DEFAULT_TTL = 24 * 3600.0
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+# Hits refresh an entry's LRU position at most this often, to keep reads write-free
+TOUCH_INTERVAL = 60.0
+SCHEMA_VERSION = 1
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a search query."""
+    return " ".join(query.casefold().split())
+
+
+class SearchCache:
+    """TTL + LRU cache of search responses in a SQLite file shared between processes."""
+
+    def __init__(self, path: Path, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._db: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            try:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                # Another process may be creating the schema at the same time
+                db.execute("BEGIN IMMEDIATE")
+                if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                    db.execute("DROP TABLE IF EXISTS searches")
+                    db.execute("""
+                        CREATE TABLE searches (
+                            key TEXT PRIMARY KEY,
+                            results TEXT NOT NULL,
+                            size INTEGER NOT NULL,
+                            stored_at REAL NOT NULL,
+                            used_at REAL NOT NULL
+                        )
+                    """)
+                    db.execute("CREATE INDEX searches_used_at ON searches (used_at)")
+                    db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                db.execute("COMMIT")
+            except sqlite3.Error:
+                db.close()
+                raise
+            self._db = db
+        return self._db
+
+    @staticmethod
+    def make_key(query: str, search_type: str, limit: int) -> str:
+        return f"{search_type}:{limit}:{normalize_query(query)}"
+
+    def get(self, query: str, search_type: str, limit: int) -> Any | None:
+        """Return the stored response, or None if missing, expired or unreadable."""
+        key = self.make_key(query, search_type, limit)
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._connect()
+                row = db.execute(
+                    "SELECT results, used_at FROM searches WHERE key = ? AND stored_at > ?",
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row is not None and now - row[1] > TOUCH_INTERVAL:
+                    db.execute("UPDATE searches SET used_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"⚠️ Search cache unavailable ({e})", file=sys.stderr)
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, query: str, search_type: str, limit: int, results: Any) -> None:
+        """Store a response and evict expired and least recently used entries."""
+        data = json.dumps(results, separators=(",", ":"))
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._connect()
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    db.execute(
+                        "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?, ?)",
+                        (self.make_key(query, search_type, limit), data, len(data), now, now),
+                    )
+                    db.execute("DELETE FROM searches WHERE stored_at <= ?", (now - self.ttl,))
+                    excess = db.execute("SELECT SUM(size) FROM searches").fetchone()[0] - self.max_bytes
+                    if excess > 0:
+                        db.execute(
+                            """DELETE FROM searches WHERE key IN (
+                                SELECT key FROM (
+                                    SELECT key, size, SUM(size) OVER (ORDER BY used_at, key ROWS UNBOUNDED PRECEDING) AS freed FROM searches
+                                ) WHERE freed - size < ?
+                            )""",
+                            (excess,),
+                        )
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            print(f"⚠️ Search cache unavailable ({e})", file=sys.stderr)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM searches")
+
+    def stats(self) -> dict[str, int]:
+        """Hits and misses of this process, plus the shared entry count and size."""
+        try:
+            with self._lock:
+                entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM searches").fetchone()
+        except sqlite3.Error:
+            entries = size = 0
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
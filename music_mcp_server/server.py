@@ -7,72 +7,450 @@ Control Spotify playback from GitHub Copilot Chat via MCP.
 import os
 import sys
 import json
+import base64
+import asyncio
+import functools
+import threading
+import time
 from pathlib import Path
+from typing import TYPE_CHECKING
 from mcp.server.fastmcp import FastMCP
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-
-def get_config_dir() -> Path:
-    """Get the config directory for storing credentials."""
-    if sys.platform == "darwin":
-        config_dir = Path.home() / "Library" / "Application Support" / "music-mcp-server"
-    elif sys.platform == "win32":
-        config_dir = Path(os.environ.get("APPDATA", Path.home())) / "music-mcp-server"
-    else:
-        config_dir = Path.home() / ".config" / "music-mcp-server"
-    return config_dir
-
-def get_credentials_path() -> Path:
-    """Get path to credentials file."""
-    return get_config_dir() / "credentials.json"
-
-def load_credentials() -> dict | None:
-    """Load credentials from config file."""
-    creds_path = get_credentials_path()
-    if creds_path.exists():
-        with open(creds_path) as f:
-            return json.load(f)
-    return None
-
-def get_spotify_client() -> spotipy.Spotify:
-    """Get authenticated Spotify client."""
+from mcp.types import CallToolResult
+from music_mcp_server.cache import ResponseCache, ETagCache, MISSING, DEFAULT_ETAG_BYTES, make_key
+from music_mcp_server.config import get_config_dir, get_credentials_path, load_credentials
+from music_mcp_server.dispatch import Dispatcher, DEFAULT_WORKERS, DEFAULT_TIMEOUT
+from music_mcp_server.playlist_diff import plan_sync
+from music_mcp_server.metrics import Metrics, DEFAULT_DUMP_INTERVAL
+from music_mcp_server.output import check_output, compact
+from music_mcp_server.profiling import Profiler, DEFAULT_THRESHOLD as PROFILE_THRESHOLD, DEFAULT_SAMPLE_RATE, DEFAULT_KEEP
+from music_mcp_server.library import LibraryMirror, DEFAULT_MAX_AGE as LIBRARY_MAX_AGE, MARKS_DIRTY
+from music_mcp_server.search_cache import SearchCache, DEFAULT_TTL as SEARCH_TTL, DEFAULT_MAX_BYTES as SEARCH_MAX_BYTES
+from music_mcp_server.singleflight import SingleFlight
+from music_mcp_server.scheduler import (
+    Scheduler, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_DEADLINE, DEFAULT_TOOL_DEADLINE, DEFAULT_LANES, INTERACTIVE, BULK,
+    call_deadline, lane_for,
+)
+from music_mcp_server.tokens import TokenManager, TOKEN_URL
+from music_mcp_server.watcher import PlaybackWatcher, PLAYBACK_WRITES, DEFAULT_WINDOW, summarize
+
+if TYPE_CHECKING:
+    import spotipy
+    from music_mcp_server.async_client import AsyncSpotify
+
+def get_spotify_client(backend: str = "spotipy") -> "spotipy.Spotify | AsyncSpotify":
+    """
+    Get authenticated Spotify client.
+
+    backend is "spotipy" (blocking client, run on the dispatcher pool) or
+    "async" (native asyncio client with a pooled keep-alive connection).
+    spotipy and requests are imported here rather than at module load so the
+    server can answer the MCP handshake before they are needed.
+    """
     creds = load_credentials()
     
     if not creds:
-        print("❌ No credentials found. Please run 'music-mcp-setup' first.", file=sys.stderr)
-        sys.exit(1)
-    
-    # Create a cache handler that uses our stored credentials
-    cache_path = get_config_dir() / ".spotify_cache"
+        raise RuntimeError("No credentials found. Please run 'music-mcp-setup' first.")
     
-    # Write spotipy-compatible cache
-    cache_data = {
-        "access_token": creds["access_token"],
-        "refresh_token": creds["refresh_token"],
-        "token_type": "Bearer",
-        "expires_in": 3600,
-        "scope": "user-read-playback-state user-modify-playback-state user-read-currently-playing playlist-modify-public playlist-modify-private playlist-read-private",
-        "expires_at": 0,  # Force refresh on first use
-    }
-    with open(cache_path, "w") as f:
-        json.dump(cache_data, f)
-    
-    auth_manager = SpotifyOAuth(
+    # Tokens are cached in a spotipy-compatible file and refreshed ahead of expiry
+    auth_manager = TokenManager(
         client_id=creds["client_id"],
         client_secret=creds["client_secret"],
-        redirect_uri="http://localhost:8888/callback",
-        scope="user-read-playback-state,user-modify-playback-state,user-read-currently-playing,playlist-modify-public,playlist-modify-private,playlist-read-private",
-        cache_path=str(cache_path),
+        refresh_token=creds["refresh_token"],
+        cache_path=get_config_dir() / ".spotify_cache",
+        token_url=os.environ.get("MUSIC_MCP_TOKEN_URL", TOKEN_URL),
     )
+    auth_manager.start()
     
-    return spotipy.Spotify(auth_manager=auth_manager)
+    if backend == "async":
+        from music_mcp_server.async_client import AsyncSpotify
+        client = AsyncSpotify(auth_manager=auth_manager, etags=etag_cache)
+        client.prefix = os.environ.get("MUSIC_MCP_API_URL", client.prefix)
+        if metrics is not None:
+            client.hooks.append(lambda response: metrics.transferred(len(response.request.content), len(response.content)))
+        return client
+    import requests
+    import spotipy
+    from music_mcp_server.etag import ETagSession
+    from urllib3.util.retry import Retry
+    # Server errors are retried here; 429s are left to the scheduler, which
+    # honors Retry-After without tying up a worker thread. Once the retries
+    # run out the last 5xx response is returned, so it surfaces with its own
+    # status instead of spotipy's generic "Max Retries" 429.
+    retry = Retry(
+        total=3,
+        read=False,
+        allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    session = ETagSession(etag_cache) if etag_cache is not None else requests.Session()
+    session.mount("https://", requests.adapters.HTTPAdapter(max_retries=retry))
+    session.mount("http://", requests.adapters.HTTPAdapter(max_retries=retry))
+    if metrics is not None:
+        session.hooks["response"].append(
+            lambda response, *args, **kwargs: metrics.transferred(len(response.request.body or b""), len(response.content))
+        )
+    client = spotipy.Spotify(auth_manager=auth_manager, requests_session=session)
+    client.prefix = os.environ.get("MUSIC_MCP_API_URL", client.prefix)
+    return client
+
+# Spotify client, built on first use (see get_client)
+sp = None
+_client_lock = threading.Lock()
+
+def get_client() -> "spotipy.Spotify | AsyncSpotify":
+    """Return the shared Spotify client, building it on first use."""
+    global sp
+    if sp is None:
+        with _client_lock:
+            if sp is None:
+                sp = get_spotify_client(os.environ.get("MUSIC_MCP_BACKEND", "spotipy"))
+    return sp
+
+def warm_up():
+    """Build the Spotify client in the background so the first tool call doesn't pay for it."""
+    try:
+        get_client()
+    except Exception as e:
+        print(f"❌ {e}", file=sys.stderr)
+
+# Blocking spotipy calls run on a bounded pool so they never stall the event loop
+dispatcher = Dispatcher(
+    max_workers=int(os.environ.get("MUSIC_MCP_WORKERS", DEFAULT_WORKERS)),
+    timeout=float(os.environ.get("MUSIC_MCP_CALL_TIMEOUT", DEFAULT_TIMEOUT)),
+)
+
+# Every request waits for the shared rate-limit budget; 429s are queued and retried.
+# Playback and device calls run in their own lane ahead of bulk playlist/catalog work.
+scheduler = Scheduler(
+    rate=float(os.environ.get("MUSIC_MCP_RATE", DEFAULT_RATE)),
+    burst=int(os.environ.get("MUSIC_MCP_BURST", DEFAULT_BURST)),
+    deadline=float(os.environ.get("MUSIC_MCP_DEADLINE", DEFAULT_DEADLINE)),
+    lanes={
+        INTERACTIVE: (
+            int(os.environ.get("MUSIC_MCP_INTERACTIVE_CONCURRENCY", DEFAULT_LANES[INTERACTIVE][0])),
+            *DEFAULT_LANES[INTERACTIVE][1:],
+        ),
+        BULK: (
+            int(os.environ.get("MUSIC_MCP_BULK_CONCURRENCY", DEFAULT_LANES[BULK][0])),
+            int(os.environ.get("MUSIC_MCP_BULK_QUEUE", DEFAULT_LANES[BULK][1])),
+            DEFAULT_LANES[BULK][2],
+        ),
+    },
+)
+
+# Short-lived cache for read endpoints; mutating calls invalidate what they touch
+cache = ResponseCache() if os.environ.get("MUSIC_MCP_CACHE", "1") != "0" else ResponseCache(policies={})
+
+# Bodies of read responses, revalidated with If-None-Match so they are never stale
+etag_cache = None
+if os.environ.get("MUSIC_MCP_ETAG_CACHE", "1") != "0":
+    etag_cache = ETagCache(
+        max_bytes=int(float(os.environ.get("MUSIC_MCP_ETAG_CACHE_MB", DEFAULT_ETAG_BYTES / 2**20)) * 2**20)
+    )
 
-# Initialize Spotify client
-sp = get_spotify_client()
+# Search results persist across sessions and are shared by every server process
+search_cache = None
+if os.environ.get("MUSIC_MCP_SEARCH_CACHE", "1") != "0":
+    search_cache = SearchCache(
+        get_config_dir() / "search_cache.sqlite3",
+        ttl=float(os.environ.get("MUSIC_MCP_SEARCH_TTL", SEARCH_TTL)),
+        max_bytes=int(float(os.environ.get("MUSIC_MCP_SEARCH_CACHE_MB", SEARCH_MAX_BYTES / 2**20)) * 2**20),
+    )
+
+# Local mirror of playlists and their tracks, filled by sync_library
+library = LibraryMirror(
+    get_config_dir() / "library.sqlite3",
+    max_age=float(os.environ.get("MUSIC_MCP_LIBRARY_MAX_AGE", LIBRARY_MAX_AGE)),
+)
+
+# Identical reads that overlap in time share one upstream request
+singleflight = SingleFlight()
+
+# Latency and error accounting of every tool call and Spotify request
+metrics = None
+if os.environ.get("MUSIC_MCP_METRICS", "1") != "0":
+    metrics = Metrics()
+    if os.environ.get("MUSIC_MCP_METRICS_FILE"):
+        metrics.start_dumping(
+            Path(os.environ["MUSIC_MCP_METRICS_FILE"]).expanduser(),
+            interval=float(os.environ.get("MUSIC_MCP_METRICS_INTERVAL", DEFAULT_DUMP_INTERVAL)),
+        )
+
+# Profiles of slow tool calls, off unless MUSIC_MCP_PROFILE=1 or set_profiling turns it on
+profiler = Profiler(
+    get_config_dir() / "profiles",
+    threshold=float(os.environ.get("MUSIC_MCP_PROFILE_THRESHOLD", PROFILE_THRESHOLD)),
+    sample_rate=float(os.environ.get("MUSIC_MCP_PROFILE_SAMPLE", DEFAULT_SAMPLE_RATE)),
+    keep=int(os.environ.get("MUSIC_MCP_PROFILE_KEEP", DEFAULT_KEEP)),
+)
+profiler.configure(
+    enabled=os.environ.get("MUSIC_MCP_PROFILE", "0") == "1",
+    memory=os.environ.get("MUSIC_MCP_PROFILE_MEMORY", "0") == "1",
+)
+
+# Playback state, polled in the background while someone reads or subscribes to it
+# and updated optimistically by playback commands
+watcher = None
+if os.environ.get("MUSIC_MCP_WATCH", "1") != "0":
+    watcher = PlaybackWatcher(
+        lambda: call_spotify("current_playback"),
+        window=float(os.environ.get("MUSIC_MCP_CONSISTENCY_WINDOW", DEFAULT_WINDOW)),
+    )
+
+# Tool calls that run at once across every connected client; the rest wait their turn
+tool_slots = None
+if int(os.environ.get("MUSIC_MCP_MAX_CONCURRENCY", "0")) > 0:
+    tool_slots = asyncio.Semaphore(int(os.environ["MUSIC_MCP_MAX_CONCURRENCY"]))
+
+async def _request(method: str, *args, **kwargs):
+    """Send one Spotify call through the scheduler and dispatcher."""
+    client = sp if sp is not None else await dispatcher.run(get_client)
+    fn = profiler.in_thread(getattr(client, method))
+    request = scheduler.run(
+        lambda remaining: dispatcher.run(fn, *args, timeout=min(remaining, dispatcher.timeout or remaining), **kwargs),
+        lane=lane_for(method),
+    )
+    return await (request if metrics is None else metrics.outbound(method, request))
+
+async def call_spotify(method: str, *args, **kwargs):
+    """Call a method of the Spotify client without blocking the event loop."""
+    if method in cache.policies or method in singleflight.methods:
+        key = make_key(args, kwargs)
+    generation = None
+    if method in cache.policies:
+        result = cache.get(method, key)
+        if result is not MISSING:
+            return result
+        generation = cache.generation(method, key)
+    if method in singleflight.methods:
+        # A request started before an invalidation is never joined after it
+        result = await singleflight.do(method, (key, generation), lambda: _request(method, *args, **kwargs))
+    else:
+        applied = False
+        try:
+            result = await _request(method, *args, **kwargs)
+            applied = True
+        finally:
+            # Even a failed mutation may have been applied upstream, and reads
+            # already in flight may predate it
+            cache.invalidate_for(method, args)
+            singleflight.forget()
+            if watcher is not None and method in PLAYBACK_WRITES:
+                if applied:
+                    watcher.apply(method, args, kwargs)
+                else:
+                    watcher.poke()
+            if method in MARKS_DIRTY:
+                # Shielded so the mark is made even if this call was cancelled
+                await asyncio.shield(dispatcher.run(library.mark_dirty_for, method, args))
+    if method in cache.policies:
+        # Not cached if a mutation of the same data landed while this read was in flight
+        cache.put(method, key, result, generation)
+    return result
+
+# Playlist pages are at most 100 items; this many are fetched at once
+PAGE_SIZE = 100
+PAGE_CONCURRENCY = int(os.environ.get("MUSIC_MCP_PAGE_CONCURRENCY", 4))
+
+# Default and maximum number of items a listing tool returns per call
+TRACK_PAGE_DEFAULT = 200
+TRACK_PAGE_MAX = 1000
+PLAYLIST_PAGE_MAX = 50
+
+def encode_cursor(offset: int, limit: int) -> str:
+    """Build the opaque continuation cursor handed back to the client."""
+    return base64.urlsafe_b64encode(json.dumps([offset, limit], separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[int, int]:
+    """Read (offset, limit) back out of a cursor from encode_cursor."""
+    try:
+        offset, limit = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(offset), int(limit)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+
+def page_window(offset: int, limit: int, cursor: str, max_limit: int) -> tuple[int, int]:
+    """Resolve the offset/limit of a paged tool call, preferring the cursor."""
+    if cursor:
+        offset, limit = decode_cursor(cursor)
+    if offset < 0 or not 1 <= limit <= max_limit:
+        raise ValueError(f"offset must be >= 0 and limit between 1 and {max_limit}")
+    return offset, limit
+
+def next_cursor(offset: int, count: int, total: int, limit: int) -> str | None:
+    """Cursor for the page after this one, or None at the end of the listing."""
+    end = offset + count
+    return encode_cursor(end, limit) if end < total else None
+
+def more_footer(offset: int, count: int, total: int, limit: int) -> str:
+    """Continuation line for a page that doesn't reach the end of the listing."""
+    cursor = next_cursor(offset, count, total, limit)
+    if cursor is None:
+        return ""
+    return f"\n… {total - offset - count} more. Call again with cursor=\"{cursor}\" for the next page."
+
+# Track attributes that get_playlist_tracks can request, as Web API field filters
+TRACK_FIELDS = {
+    "name": "name",
+    "artists": "artists(name)",
+    "uri": "uri",
+    "album": "album(name)",
+    "id": "id",
+    "duration_ms": "duration_ms",
+}
+
+# Track fields shown when a tool is not given any: a text reply shows URIs,
+# a compact one the shorter ids (a track's URI is spotify:track:<id>)
+TEXT_TRACK_FIELDS = "name,artists,uri"
+COMPACT_TRACK_FIELDS = "name,artists,id"
+
+def default_track_fields(fields: str, brief: bool) -> str:
+    """fields, or the default set for a text or compact reply if empty."""
+    return fields or (COMPACT_TRACK_FIELDS if brief else TEXT_TRACK_FIELDS)
+
+def track_field_names(fields: str) -> list[str]:
+    """Split and validate a comma-separated list of TRACK_FIELDS names."""
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in TRACK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown track field(s): {', '.join(unknown)}. Choose from: {', '.join(TRACK_FIELDS)}")
+    return names
+
+def track_fields_filter(fields: str) -> str:
+    """Turn 'name,artists,uri' into a Web API fields filter for playlist items."""
+    return f"total,items(track({','.join(TRACK_FIELDS[f] for f in track_field_names(fields))}))"
+
+async def gather_pages(*coros) -> list:
+    """Run coros concurrently like asyncio.gather, but cancel the rest as soon as one fails."""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        # The call has failed; don't spend slots and rate-limit tokens on its other pages
+        for task in tasks:
+            task.cancel()
+        raise
+
+async def fetch_playlist_items(playlist_id: str, fields_filter: str, offset: int = 0, limit: int | None = None) -> tuple[list, int]:
+    """
+    Fetch playlist items from offset up to limit (None for all) and the playlist total.
+
+    The first page tells us the total; the remaining pages are then fetched
+    concurrently, at most PAGE_CONCURRENCY at a time.
+    """
+    first_size = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit)
+    first = await call_spotify("playlist_tracks", playlist_id, fields=fields_filter, limit=first_size, offset=offset)
+    total = first["total"]
+    end = total if limit is None else min(total, offset + limit)
+    semaphore = asyncio.Semaphore(PAGE_CONCURRENCY)
+
+    async def fetch_page(page_offset: int) -> list:
+        async with semaphore:
+            page = await call_spotify(
+                "playlist_tracks",
+                playlist_id,
+                fields=fields_filter,
+                limit=min(PAGE_SIZE, end - page_offset),
+                offset=page_offset,
+            )
+            return page["items"]
+
+    pages = await gather_pages(*(fetch_page(o) for o in range(offset + first_size, end, PAGE_SIZE)))
+    items = list(first["items"])
+    for page in pages:
+        items.extend(page)
+    return items, total
+
+async def fetch_all_playlists() -> list[dict]:
+    """Fetch the user's whole playlist listing, pages after the first concurrently."""
+    first = await call_spotify("current_user_playlists", limit=PLAYLIST_PAGE_MAX, offset=0)
+    semaphore = asyncio.Semaphore(PAGE_CONCURRENCY)
+
+    async def fetch_page(page_offset: int) -> list:
+        async with semaphore:
+            page = await call_spotify("current_user_playlists", limit=PLAYLIST_PAGE_MAX, offset=page_offset)
+            return page["items"]
+
+    pages = await gather_pages(*(fetch_page(o) for o in range(PLAYLIST_PAGE_MAX, first["total"], PLAYLIST_PAGE_MAX)))
+    playlists = list(first["items"])
+    for page in pages:
+        playlists.extend(page)
+    return playlists
 
 # Initialize MCP server
 app = FastMCP("music-mcp-server")
 
+# Every tool registered below can be sampled by the profiler, and is timed unless metrics are off.
+# Text replies aren't also wrapped as {"result": text} structured content, which doubled their size;
+# listing tools can send compact structured content instead (see output.py).
+_register_tool = app.tool
+
+def queued(fn):
+    """Wrap a tool coroutine function to wait for one of tool_slots, if calls are limited."""
+    @functools.wraps(fn)
+    async def limited(*args, **kwargs):
+        if tool_slots is None:
+            return await fn(*args, **kwargs)
+        async with tool_slots:
+            return await fn(*args, **kwargs)
+    return limited
+
+# Tools that make many requests stop after this long in total, not this long per request
+TOOL_DEADLINE = float(os.environ.get("MUSIC_MCP_TOOL_DEADLINE", DEFAULT_TOOL_DEADLINE))
+
+def shared_deadline(fn):
+    """Wrap a tool coroutine function so all its Spotify calls share one TOOL_DEADLINE budget."""
+    @functools.wraps(fn)
+    async def bounded(*args, **kwargs):
+        with call_deadline(TOOL_DEADLINE):
+            return await fn(*args, **kwargs)
+    return bounded
+
+def instrumented_tool(*args, **kwargs):
+    kwargs.setdefault("structured_output", False)
+    register = _register_tool(*args, **kwargs)
+
+    def wrap(fn):
+        fn = queued(profiler.tool(fn))
+        return register(metrics.tool(fn) if metrics is not None else fn)
+    return wrap
+
+app.tool = instrumented_tool
+
+if metrics is not None:
+    def cache_counts() -> dict[str, dict[str, int]]:
+        counts = {}
+        responses = cache.stats().values()
+        counts["response"] = {"hits": sum(c["hits"] for c in responses), "misses": sum(c["misses"] for c in responses)}
+        flights = singleflight.stats()
+        counts["coalesced"] = {"hits": flights["coalesced"], "misses": flights["started"]}
+        if etag_cache is not None:
+            etags = etag_cache.stats()
+            counts["conditional"] = {"hits": etags["revalidated"], "misses": etags["full"]}
+        if search_cache is not None:
+            searches = search_cache.stats()
+            counts["search"] = {"hits": searches["hits"], "misses": searches["misses"]}
+        return counts
+
+    metrics.collectors.append(cache_counts)
+    metrics.components["lane"] = scheduler.stats
+    metrics.components["library"] = lambda: {"mirror": library.stats()}
+    if watcher is not None:
+        def watcher_counts() -> dict[str, dict[str, float]]:
+            counts = watcher.stats()
+            del counts["diverged_fields"]
+            counts["running"] = int(counts["running"])
+            return {"playback": counts}
+
+        metrics.components["watcher"] = watcher_counts
+        # Predicted fields that Spotify later reported otherwise, by field
+        metrics.components["prediction"] = lambda: {
+            field: {"diverged": count} for field, count in watcher.stats()["diverged_fields"].items()
+        }
+
 # =============================================================================
 # Playback Controls
 # =============================================================================
@@ -81,7 +459,7 @@ app = FastMCP("music-mcp-server")
 async def play_music() -> str:
     """Play or resume music on Spotify."""
     try:
-        sp.start_playback()
+        await call_spotify("start_playback")
         return "▶️ Music started playing."
     except Exception as e:
         return f"Error: {str(e)}"
@@ -90,7 +468,7 @@ async def play_music() -> str:
 async def pause_music() -> str:
     """Pause music on Spotify."""
     try:
-        sp.pause_playback()
+        await call_spotify("pause_playback")
         return "⏸️ Music paused."
     except Exception as e:
         return f"Error: {str(e)}"
@@ -99,7 +477,7 @@ async def pause_music() -> str:
 async def next_track() -> str:
     """Skip to the next track."""
     try:
-        sp.next_track()
+        await call_spotify("next_track")
         return "⏭️ Skipped to next track."
     except Exception as e:
         return f"Error: {str(e)}"
@@ -108,7 +486,7 @@ async def next_track() -> str:
 async def previous_track() -> str:
     """Go to the previous track."""
     try:
-        sp.previous_track()
+        await call_spotify("previous_track")
         return "⏮️ Went to previous track."
     except Exception as e:
         return f"Error: {str(e)}"
@@ -117,29 +495,92 @@ async def previous_track() -> str:
 async def current_track() -> str:
     """Get information about the currently playing track."""
     try:
-        current = sp.currently_playing()
-        if current and current['item']:
-            track = current['item']
-            artists = ', '.join([artist['name'] for artist in track['artists']])
-            return f"🎵 Now playing: {track['name']} by {artists}"
+        if watcher is not None:
+            track = (await watcher.latest())["track"]
+        else:
+            track = summarize(await call_spotify("currently_playing"))["track"]
+        if track:
+            return f"🎵 Now playing: {track['name']} by {', '.join(track['artists'])}"
         else:
             return "No track is currently playing."
     except Exception as e:
         return f"Error: {str(e)}"
 
+PLAYBACK_URI = "spotify://playback"
+
+@app.resource(PLAYBACK_URI, name="playback", mime_type="application/json")
+async def playback_state() -> str:
+    """Current playback state: track, device, progress and shuffle/repeat modes. Subscribe for updates."""
+    if watcher is None:
+        return json.dumps(summarize(await call_spotify("current_playback")))
+    return json.dumps(await watcher.latest())
+
+if watcher is not None:
+    # Keeps notification tasks referenced until they finish
+    _notifications: set[asyncio.Task] = set()
+
+    async def notify_playback_changed(session) -> None:
+        try:
+            await session.send_resource_updated(PLAYBACK_URI)
+        except Exception:
+            # The client has gone away
+            watcher.subscribers.discard(session)
+
+    def publish_playback(snapshot: dict, changed: list[str]) -> None:
+        for session in list(watcher.subscribers):
+            task = asyncio.ensure_future(notify_playback_changed(session))
+            _notifications.add(task)
+            task.add_done_callback(_notifications.discard)
+
+    watcher.listeners.append(publish_playback)
+
+    @app._mcp_server.subscribe_resource()
+    async def subscribe_resource(uri) -> None:
+        if str(uri) != PLAYBACK_URI:
+            raise ValueError(f"Resource {uri} does not support subscriptions")
+        watcher.subscribers.add(app._mcp_server.request_context.session)
+        watcher.start()
+
+    @app._mcp_server.unsubscribe_resource()
+    async def unsubscribe_resource(uri) -> None:
+        if str(uri) == PLAYBACK_URI:
+            watcher.subscribers.discard(app._mcp_server.request_context.session)
+            if not watcher.subscribers:
+                watcher.stop()
+
+    # The SDK always advertises resources.subscribe as false
+    _get_capabilities = app._mcp_server.get_capabilities
+
+    def get_capabilities(*args, **kwargs):
+        capabilities = _get_capabilities(*args, **kwargs)
+        if capabilities.resources is not None:
+            capabilities.resources.subscribe = True
+        return capabilities
+
+    app._mcp_server.get_capabilities = get_capabilities
+
 # =============================================================================
 # Device Management
 # =============================================================================
 
 @app.tool()
-async def get_devices() -> str:
-    """Get list of available Spotify devices."""
+async def get_devices(output: str = "text") -> str | CallToolResult:
+    """Get list of available Spotify devices. output is "text", "json" or "structured"."""
     try:
-        devices = sp.devices()
-        if not devices['devices']:
+        brief = check_output(output)
+        devices = watcher.devices() if watcher is not None else None
+        if devices is None:
+            devices = (await call_spotify("devices"))['devices']
+            if watcher is not None:
+                watcher.remember_devices(devices)
+        if brief:
+            fields = ["id", "name", "type", "is_active"]
+            rows = [[device.get(key) for key in fields] for device in devices]
+            return compact({"fields": fields, "devices": rows}, output, f"{len(rows)} devices.")
+        if not devices:
             return "No devices found. Make sure Spotify is open on at least one device."
         device_info = []
-        for device in devices['devices']:
+        for device in devices:
             status = "🟢 Active" if device['is_active'] else "⚪ Inactive"
             device_info.append(f"{device['name']} ({device['type']}) - {status}\n  ID: {device['id']}")
         return "Available devices:\n" + "\n".join(device_info)
@@ -150,7 +591,7 @@ async def get_devices() -> str:
 async def transfer_playback(device_id: str) -> str:
     """Transfer playback to a specific device by its ID."""
     try:
-        sp.transfer_playback(device_id)
+        await call_spotify("transfer_playback", device_id)
         return f"🔄 Transferred playback to device."
     except Exception as e:
         return f"Error: {str(e)}"
@@ -160,16 +601,44 @@ async def transfer_playback(device_id: str) -> str:
 # =============================================================================
 
 @app.tool()
-async def get_playlists() -> str:
-    """Get your Spotify playlists."""
+async def get_playlists(
+    offset: int = 0, limit: int = PLAYLIST_PAGE_MAX, cursor: str = "", output: str = "text"
+) -> str | CallToolResult:
+    """
+    Get your Spotify playlists, one page at a time.
+
+    Returns at most limit (up to 50) playlists starting at offset. If more
+    remain, the reply ends with a cursor to pass back for the next page.
+    output="json" or "structured" returns the page as a compact table,
+    with the cursor.
+    """
     try:
-        playlists = sp.current_user_playlists()
-        if not playlists['items']:
-            return "No playlists found."
-        playlist_info = []
-        for pl in playlists['items']:
-            playlist_info.append(f"📋 {pl['name']}\n  ID: {pl['id']}")
-        return "Your playlists:\n" + "\n".join(playlist_info)
+        brief = check_output(output)
+        offset, limit = page_window(offset, limit, cursor, PLAYLIST_PAGE_MAX)
+        mirrored = await dispatcher.run(library.playlists, offset, limit)
+        if mirrored is not None:
+            items, total = mirrored
+        else:
+            playlists = await call_spotify("current_user_playlists", limit=limit, offset=offset)
+            items = playlists['items']
+            total = playlists.get('total', offset + len(items))
+        if brief:
+            page = {
+                "total": total,
+                "offset": offset,
+                "cursor": next_cursor(offset, len(items), total, limit),
+                "fields": ["id", "name"],
+                "playlists": [[pl['id'], pl['name']] for pl in items],
+            }
+            return compact(page, output, f"Playlists {offset + 1}-{offset + len(items)} of {total}.")
+        if not items:
+            return "No playlists found." if offset == 0 else "No more playlists."
+        header = f"Your playlists ({offset + 1}-{offset + len(items)} of {total}):\n"
+        return (
+            header
+            + "\n".join(f"📋 {pl['name']}\n  ID: {pl['id']}" for pl in items)
+            + more_footer(offset, len(items), total, limit)
+        )
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -177,8 +646,8 @@ async def get_playlists() -> str:
 async def create_playlist(name: str, description: str = "", public: bool = True) -> str:
     """Create a new playlist."""
     try:
-        user_id = sp.current_user()['id']
-        playlist = sp.user_playlist_create(user_id, name, public=public, description=description)
+        user_id = (await call_spotify("current_user"))['id']
+        playlist = await call_spotify("user_playlist_create", user_id, name, public=public, description=description)
         return f"✅ Created playlist '{name}'\n  ID: {playlist['id']}"
     except Exception as e:
         return f"Error: {str(e)}"
@@ -187,7 +656,7 @@ async def create_playlist(name: str, description: str = "", public: bool = True)
 async def add_to_playlist(playlist_id: str, track_uri: str) -> str:
     """Add a track to a playlist. Track URI format: spotify:track:XXXXXX"""
     try:
-        sp.playlist_add_items(playlist_id, [track_uri])
+        await call_spotify("playlist_add_items", playlist_id, [track_uri])
         return f"✅ Added track to playlist."
     except Exception as e:
         return f"Error: {str(e)}"
@@ -196,24 +665,230 @@ async def add_to_playlist(playlist_id: str, track_uri: str) -> str:
 async def remove_from_playlist(playlist_id: str, track_uri: str) -> str:
     """Remove a track from a playlist. Track URI format: spotify:track:XXXXXX"""
     try:
-        sp.playlist_remove_all_occurrences_of_items(playlist_id, [track_uri])
+        await call_spotify("playlist_remove_all_occurrences_of_items", playlist_id, [track_uri])
         return f"✅ Removed track from playlist."
     except Exception as e:
         return f"Error: {str(e)}"
 
+# The Web API accepts at most 100 URIs per playlist add/remove request
+MUTATION_CHUNK = 100
+
+def chunked(items: list, size: int = MUTATION_CHUNK) -> list[list]:
+    """Split items into consecutive chunks of at most size."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def batch_summary(verb: str, done: int, total: int, requests: int, failures: list[str], snapshot_id: str | None) -> str:
+    """Describe the outcome of a chunked playlist mutation."""
+    icon = "✅" if not failures else "⚠️"
+    lines = [f"{icon} {verb} {done} of {total} tracks in {requests} request(s)."]
+    lines.extend(failures)
+    if snapshot_id:
+        lines.append(f"  Snapshot: {snapshot_id}")
+    return "\n".join(lines)
+
+@app.tool()
+@shared_deadline
+async def add_tracks_to_playlist(playlist_id: str, track_uris: list[str], position: int | None = None) -> str:
+    """
+    Add many tracks to a playlist, keeping their order.
+
+    URIs are sent in chunks of 100. With position, the tracks are inserted
+    there (0 = top); otherwise they are appended. A failed chunk is reported
+    and the remaining chunks are still sent.
+    """
+    if not track_uris:
+        return "No tracks given."
+    added = 0
+    failures = []
+    snapshot_id = None
+    chunks = chunked(track_uris)
+    for index, chunk in enumerate(chunks):
+        try:
+            # Earlier chunks shifted the insertion point by the tracks they actually added
+            chunk_position = None if position is None else position + added
+            result = await call_spotify("playlist_add_items", playlist_id, chunk, position=chunk_position)
+            snapshot_id = result.get('snapshot_id', snapshot_id) if result else snapshot_id
+            added += len(chunk)
+        except Exception as e:
+            start = index * MUTATION_CHUNK
+            failures.append(f"  ❌ Tracks {start + 1}-{start + len(chunk)}: {str(e)}")
+    return batch_summary("Added", added, len(track_uris), len(chunks), failures, snapshot_id)
+
 @app.tool()
-async def get_playlist_tracks(playlist_id: str) -> str:
-    """Get tracks in a playlist."""
+@shared_deadline
+async def remove_tracks_from_playlist(playlist_id: str, track_uris: list[str]) -> str:
+    """
+    Remove all occurrences of many tracks from a playlist.
+
+    URIs are sent in chunks of 100, each made against the snapshot the
+    previous chunk produced. A failed chunk is reported and the remaining
+    chunks are still sent.
+    """
+    if not track_uris:
+        return "No tracks given."
+    removed = 0
+    failures = []
+    snapshot_id = None
+    chunks = chunked(track_uris)
+    for index, chunk in enumerate(chunks):
+        try:
+            result = await call_spotify("playlist_remove_all_occurrences_of_items", playlist_id, chunk, snapshot_id=snapshot_id)
+            snapshot_id = result.get('snapshot_id', snapshot_id) if result else snapshot_id
+            removed += len(chunk)
+        except Exception as e:
+            start = index * MUTATION_CHUNK
+            failures.append(f"  ❌ Tracks {start + 1}-{start + len(chunk)}: {str(e)}")
+    return batch_summary("Removed", removed, len(track_uris), len(chunks), failures, snapshot_id)
+
+def describe_step(step: tuple) -> str:
+    """One line of a sync_playlist plan."""
+    kind = step[0]
+    if kind == "remove":
+        count = sum(len(item['positions']) for item in step[1])
+        return f"  ➖ Remove {count} track(s)"
+    if kind == "move":
+        _, start, before, length = step
+        return f"  ↕️ Move {length} track(s) from position {start + 1} to {before + 1}"
+    if kind == "add":
+        _, uris, position = step
+        where = "at the end" if position is None else f"at position {position + 1}"
+        return f"  ➕ Add {len(uris)} track(s) {where}"
+    if not step[1]:
+        return "  🔁 Clear the playlist"
+    return f"  🔁 Replace the playlist's contents with the first {len(step[1])} track(s)"
+
+@app.tool()
+@shared_deadline
+async def sync_playlist(playlist_id: str, track_uris: list[str], dry_run: bool = False) -> str:
+    """
+    Make a playlist contain exactly track_uris, in that order.
+
+    Diffs the current contents against the target and sends the fewest
+    remove/move/add requests it can find (100 tracks per request), each
+    against the snapshot the previous one produced. Tracks already in place
+    are left alone. With dry_run, only shows the plan.
+    """
+    try:
+        # Read the live playlist; positions in the plan must match it exactly
+        cache.invalidate("playlist_tracks", playlist_id)
+        snapshot_id = (await call_spotify("playlist", playlist_id, fields="snapshot_id"))['snapshot_id']
+        items, _ = await fetch_playlist_items(playlist_id, "total,items(track(uri))")
+        if any(not item.get('track') for item in items):
+            return "Error: Playlist has unavailable items without a URI, so it can't be synced exactly."
+        current = [item['track']['uri'] for item in items]
+        steps = plan_sync(current, track_uris)
+        if not steps:
+            return "✅ Playlist already matches."
+        naive = len(current) + len(track_uris)
+        plan = [describe_step(step) for step in steps]
+        if dry_run:
+            return "\n".join([f"Plan: {len(steps)} request(s) instead of {naive} one track at a time."] + plan)
+        for done, step in enumerate(steps):
+            kind = step[0]
+            try:
+                if kind == "remove":
+                    result = await call_spotify(
+                        "playlist_remove_specific_occurrences_of_items", playlist_id, step[1], snapshot_id=snapshot_id
+                    )
+                elif kind == "move":
+                    _, start, before, length = step
+                    result = await call_spotify(
+                        "playlist_reorder_items", playlist_id, start, before, range_length=length, snapshot_id=snapshot_id
+                    )
+                elif kind == "add":
+                    result = await call_spotify("playlist_add_items", playlist_id, step[1], position=step[2])
+                else:
+                    result = await call_spotify("playlist_replace_items", playlist_id, step[1])
+            except Exception as e:
+                # Later steps assume this one was applied; a re-run plans from the new state
+                return "\n".join(
+                    [f"⚠️ Synced {done} of {len(steps)} step(s), then failed: {str(e)}"]
+                    + plan[:done]
+                    + ["Run sync_playlist again to finish from the playlist's current state."]
+                )
+            snapshot_id = (result or {}).get('snapshot_id', snapshot_id)
+        return "\n".join(
+            [f"✅ Playlist synced in {len(steps)} request(s) instead of {naive} one track at a time."]
+            + plan
+            + [f"  Snapshot: {snapshot_id}"]
+        )
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+def format_track(track: dict) -> str:
+    """Format a (possibly field-filtered) track object for display."""
+    artists = ', '.join([artist['name'] for artist in track.get('artists', [])])
+    line = f"🎵 {track.get('name', '')} - {artists}" if artists else f"🎵 {track.get('name', '')}"
+    if 'album' in track:
+        line += f"\n  Album: {track['album']['name']}"
+    if 'uri' in track:
+        line += f"\n  URI: {track['uri']}"
+    return line
+
+def track_row(track: dict, names: list[str]) -> list:
+    """The named TRACK_FIELDS of a track object, with artists and album reduced to their names."""
+    row = []
+    for name in names:
+        value = track.get(name)
+        if name == 'artists':
+            value = ', '.join(artist['name'] for artist in value or [])
+        elif name == 'album':
+            value = (value or {}).get('name')
+        row.append(value)
+    return row
+
+@app.tool()
+@shared_deadline
+async def get_playlist_tracks(
+    playlist_id: str,
+    fields: str = "",
+    offset: int = 0,
+    limit: int = TRACK_PAGE_DEFAULT,
+    cursor: str = "",
+    output: str = "text",
+) -> str | CallToolResult:
+    """
+    Get tracks in a playlist, one page at a time.
+
+    Returns at most limit (up to 1000) tracks starting at offset. If more
+    remain, the reply ends with a cursor to pass back for the next page.
+    fields is a comma-separated list of track attributes to fetch
+    (name, artists, uri, album, id, duration_ms), by default name, artists
+    and uri. output="json" or "structured" returns just those fields as a
+    compact table, with the cursor; there the default is name, artists and
+    id (a track's URI is spotify:track:<id>).
+    """
     try:
-        results = sp.playlist_tracks(playlist_id)
-        if not results['items']:
-            return "Playlist is empty."
-        tracks = []
-        for item in results['items']:
-            track = item['track']
-            artists = ', '.join([artist['name'] for artist in track['artists']])
-            tracks.append(f"🎵 {track['name']} - {artists}\n  URI: {track['uri']}")
-        return "Tracks in playlist:\n" + "\n".join(tracks)
+        brief = check_output(output)
+        offset, limit = page_window(offset, limit, cursor, TRACK_PAGE_MAX)
+        fields = default_track_fields(fields, brief)
+        names = track_field_names(fields)
+        mirrored = await dispatcher.run(library.playlist_items, playlist_id, offset, limit)
+        if mirrored is not None:
+            items, total = mirrored
+            # Show exactly the requested fields, as a filtered API response would
+            for item in items:
+                if item['track']:
+                    item['track'] = {name: item['track'][name] for name in names}
+        else:
+            items, total = await fetch_playlist_items(playlist_id, track_fields_filter(fields), offset, limit)
+        if brief:
+            page = {
+                "total": total,
+                "offset": offset,
+                "cursor": next_cursor(offset, len(items), total, limit),
+                "fields": names,
+                "tracks": [track_row(item['track'], names) for item in items if item.get('track')],
+            }
+            return compact(page, output, f"Tracks {offset + 1}-{offset + len(items)} of {total}.")
+        if not items:
+            return "Playlist is empty." if offset == 0 else "No more tracks."
+        header = f"Tracks in playlist ({offset + 1}-{offset + len(items)} of {total}):\n"
+        return (
+            header
+            + "\n".join(format_track(item['track']) for item in items if item.get('track'))
+            + more_footer(offset, len(items), total, limit)
+        )
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -221,27 +896,130 @@ async def get_playlist_tracks(playlist_id: str) -> str:
 async def delete_playlist(playlist_id: str) -> str:
     """Delete (unfollow) a playlist."""
     try:
-        user_id = sp.current_user()['id']
-        sp.user_playlist_unfollow(user_id, playlist_id)
+        user_id = (await call_spotify("current_user"))['id']
+        await call_spotify("user_playlist_unfollow", user_id, playlist_id)
         return f"🗑️ Deleted playlist."
     except Exception as e:
         return f"Error: {str(e)}"
 
+# Playlists fetched at once during a library sync (each fetches its pages concurrently too)
+SYNC_CONCURRENCY = 2
+
+@app.tool()
+@shared_deadline
+async def sync_library() -> str:
+    """
+    Sync the local mirror of your playlists and their tracks.
+
+    Only playlists that changed since the last sync are fetched again. While
+    the mirror is fresh, get_playlists and get_playlist_tracks answer from it
+    without calling Spotify.
+    """
+    try:
+        start = time.monotonic()
+        listing = await fetch_all_playlists()
+        new, changed, removed = await dispatcher.run(library.diff, listing)
+        mirror_fields = track_fields_filter(",".join(TRACK_FIELDS))
+        semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+        failures = []
+
+        async def sync_playlist_tracks(playlist: dict) -> int:
+            async with semaphore:
+                try:
+                    # A mutation landing while the tracks are fetched keeps the playlist dirty
+                    generation = await dispatcher.run(library.generation, playlist['id'])
+                    items, _ = await fetch_playlist_items(playlist['id'], mirror_fields)
+                    await dispatcher.run(library.store_playlist, playlist, items, generation)
+                    return len(items)
+                except Exception as e:
+                    failures.append(f"  ❌ {playlist.get('name', playlist['id'])}: {str(e)}")
+                    return 0
+
+        fetched = await asyncio.gather(*(sync_playlist_tracks(p) for p in new + changed))
+        await dispatcher.run(library.store_listing, listing)
+        unchanged = len(listing) - len(new) - len(changed)
+        icon = "✅" if not failures else "⚠️"
+        lines = [
+            f"{icon} Library synced in {time.monotonic() - start:.1f}s: {len(listing)} playlists "
+            f"({len(new)} new, {len(changed)} changed, {len(removed)} removed, {unchanged} unchanged), "
+            f"{sum(fetched)} tracks fetched."
+        ]
+        touched = [f"  ➕ {p.get('name', p['id'])}" for p in new] + [f"  ✏️ {p.get('name', p['id'])}" for p in changed]
+        lines.extend(touched[:20])
+        if len(touched) > 20:
+            lines.append(f"  … and {len(touched) - 20} more")
+        lines.extend(failures)
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+@app.tool()
+async def search_library(
+    query: str, limit: int = 20, fields: str = "", output: str = "text"
+) -> str | CallToolResult:
+    """
+    Search your own playlists by track, artist, album or playlist name.
+
+    Answers offline from the local mirror filled by sync_library, best
+    matches first; words match as prefixes ("daft pun" finds Daft Punk).
+    output="json" or "structured" returns the given track fields of each
+    match (by default name, artists and id), and the playlists it is in,
+    as a compact table.
+    """
+    try:
+        brief = check_output(output)
+        names = track_field_names(default_track_fields(fields, brief))
+        synced_at = await dispatcher.run(library.synced_at)
+        if synced_at is None:
+            return "Your library hasn't been synced yet. Run sync_library first."
+        hits = await dispatcher.run(library.search, query, max(1, min(limit, 100)))
+        if brief:
+            matches = {
+                "synced_at": synced_at,
+                "fields": [*names, "playlists"],
+                "tracks": [[*track_row(hit, names), hit['playlists']] for hit in hits],
+            }
+            return compact(matches, output, f"{len(hits)} library matches for '{query}'.")
+        if not hits:
+            return f"No tracks in your library match '{query}'."
+        age = int((time.time() - synced_at) // 60)
+        header = f"Library matches for '{query}' (synced {age} min ago):\n"
+        return header + "\n".join(f"{format_track(hit)}\n  In: {', '.join(hit['playlists'])}" for hit in hits)
+    except Exception as e:
+        return f"Error: {str(e)}"
+
 # =============================================================================
 # Search
 # =============================================================================
 
 @app.tool()
-async def search_tracks(query: str, limit: int = 5) -> str:
-    """Search for tracks on Spotify."""
+async def search_tracks(
+    query: str, limit: int = 5, fields: str = "", output: str = "text"
+) -> str | CallToolResult:
+    """
+    Search for tracks on Spotify.
+
+    output="json" or "structured" returns just the given track fields
+    (name, artists, uri, album, id, duration_ms; by default name, artists
+    and id) of each result as a compact table.
+    """
     try:
-        results = sp.search(q=query, type='track', limit=limit)
-        if not results['tracks']['items']:
+        brief = check_output(output)
+        names = track_field_names(default_track_fields(fields, brief))
+        results = await dispatcher.run(search_cache.get, query, "track", limit) if search_cache else None
+        if results is None:
+            results = await call_spotify("search", q=query, type='track', limit=limit)
+            if search_cache:
+                await dispatcher.run(search_cache.put, query, "track", limit, results)
+        items = results['tracks']['items']
+        if watcher is not None:
+            watcher.remember_tracks(items)
+        if brief:
+            rows = [track_row(track, names) for track in items]
+            return compact({"fields": names, "tracks": rows}, output, f"{len(rows)} results for '{query}'.")
+        if not items:
             return f"No tracks found for '{query}'."
-        tracks = []
-        for track in results['tracks']['items']:
-            artists = ', '.join([artist['name'] for artist in track['artists']])
-            tracks.append(f"🎵 {track['name']} - {artists}\n  URI: {track['uri']}")
+        tracks = [format_track({name: track[name] for name in names if name in track}) for track in items]
         return f"Search results for '{query}':\n" + "\n".join(tracks)
     except Exception as e:
         return f"Error: {str(e)}"
@@ -250,14 +1028,177 @@ async def search_tracks(query: str, limit: int = 5) -> str:
 async def play_track(track_uri: str) -> str:
     """Play a specific track by URI. Format: spotify:track:XXXXXX"""
     try:
-        sp.start_playback(uris=[track_uri])
+        await call_spotify("start_playback", uris=[track_uri])
         return f"▶️ Playing track."
     except Exception as e:
         return f"Error: {str(e)}"
 
-def main():
-    """Run the MCP server."""
-    app.run()
+# =============================================================================
+# Diagnostics
+# =============================================================================
+
+@app.tool()
+async def get_cache_stats() -> str:
+    """Get hit and miss counts of the server's Spotify response, conditional-request and search caches, and playback watcher activity."""
+    stats = cache.stats()
+    lines = ["Response cache:" if stats else "Response cache is disabled."]
+    for method, counts in stats.items():
+        lookups = counts["hits"] + counts["misses"]
+        rate = f"{counts['hits'] / lookups:.0%}" if lookups else "-"
+        lines.append(
+            f"{method}: {counts['hits']} hits, {counts['misses']} misses ({rate}), "
+            f"{counts['invalidations']} invalidated, {counts['discarded']} stale responses not cached, "
+            f"{counts['entries']} cached"
+        )
+    flights = singleflight.stats()
+    lines.append(f"Coalesced requests: {flights['coalesced']} joined {flights['started']} in-flight reads")
+    if etag_cache is None:
+        lines.append("Conditional requests are disabled.")
+    else:
+        counts = etag_cache.stats()
+        lines.append(
+            f"Conditional requests: {counts['revalidated']} not modified, {counts['full']} full responses, "
+            f"{counts['bytes_saved'] / 2**20:.1f} MB not re-downloaded ({counts['entries']} bodies stored)"
+        )
+    if search_cache is None:
+        lines.append("Search cache is disabled.")
+    else:
+        counts = await dispatcher.run(search_cache.stats)
+        lines.append(
+            f"Search cache: {counts['hits']} hits, {counts['misses']} misses, "
+            f"{counts['entries']} stored ({counts['bytes'] / 2**20:.1f} MB)"
+        )
+    if watcher is None:
+        lines.append("Playback watcher is disabled.")
+    else:
+        counts = watcher.stats()
+        lines.append(
+            f"Playback watcher: {counts['polls']} polls, {counts['changes']} changes, {counts['errors']} errors, "
+            + (f"polling every {counts['interval']:g} s for {counts['subscribers']} subscribers" if counts["running"] else "idle")
+        )
+        diverged = ", ".join(f"{field} {n}" for field, n in sorted(counts["diverged_fields"].items()))
+        lines.append(
+            f"Optimistic playback updates: {counts['applied']} applied, {counts['reconciled']} reconciled, "
+            f"{counts['diverged']} diverged from Spotify" + (f" ({diverged})" if diverged else "")
+        )
+    return "\n".join(lines)
+
+def format_latency(data: dict) -> str:
+    errors = sum(data["errors"].values())
+    line = (
+        f"{data['count']} calls, p50 {data['p50'] * 1000:.1f} ms, p95 {data['p95'] * 1000:.1f} ms, "
+        f"p99 {data['p99'] * 1000:.1f} ms"
+    )
+    if errors:
+        line += f", {errors} failed (" + ", ".join(f"{kind} {n}" for kind, n in sorted(data["errors"].items())) + ")"
+    return line
+
+@app.tool()
+async def get_server_stats() -> str:
+    """Get latency percentiles and error counts per tool and per Spotify endpoint, cache hit rates and bytes transferred."""
+    if metrics is None:
+        return "Metrics are disabled (MUSIC_MCP_METRICS=0)."
+    # The library counts query SQLite, so the snapshot is taken off the event loop
+    snapshot = await dispatcher.run(metrics.snapshot)
+    uptime = int(snapshot["uptime_seconds"])
+    lines = [f"Up {uptime // 3600}h{uptime // 60 % 60:02d}m{uptime % 60:02d}s"]
+    lines.append("Tools:" if snapshot["tools"] else "No tool calls yet.")
+    lines.extend(f"  {name}: {format_latency(data)}" for name, data in snapshot["tools"].items())
+    if snapshot["upstream"]:
+        lines.append("Spotify requests (including time queued for the rate limit):")
+        lines.extend(f"  {name}: {format_latency(data)}" for name, data in snapshot["upstream"].items())
+    if scheduler.throttled:
+        lines.append(f"429 Too Many Requests answers retried: {scheduler.throttled}")
+    lines.append("Request lanes:")
+    lines.extend(
+        f"  {name}: {lane['active']} active, {lane['queued']} queued, {lane['started']} started, "
+        f"{lane['shed']} shed when the queue was full, {lane['queued_seconds']:.1f}s spent queued"
+        for name, lane in snapshot["lane"].items()
+    )
+    mirror = snapshot["library"]["mirror"]
+    lines.append(f"Library mirror: {mirror['playlists']} playlists ({mirror['dirty']} to re-sync), {mirror['tracks']} tracks")
+    transfer = snapshot["transfer"]
+    lines.append(
+        f"Transferred: {transfer['bytes_received'] / 2**10:.1f} KB received, "
+        f"{transfer['bytes_sent'] / 2**10:.1f} KB sent in {transfer['responses']} responses"
+    )
+    rates = []
+    for name, counts in snapshot["caches"].items():
+        lookups = counts["hits"] + counts["misses"]
+        rates.append(f"{name} {counts['hits'] / lookups:.0%} of {lookups}" if lookups else f"{name} -")
+    lines.append("Cache hit rates: " + ", ".join(rates))
+    return "\n".join(lines)
+
+@app.tool()
+async def set_profiling(
+    enabled: bool, threshold_ms: int | None = None, sample_rate: float | None = None, memory: bool | None = None,
+) -> str:
+    """
+    Turn profiling of slow tool calls on or off.
+
+    While on, sampled calls (sample_rate, 0-1) run under cProfile, plus
+    tracemalloc if memory is true, and calls slower than threshold_ms leave
+    a profile in the server's profiles directory.
+    """
+    try:
+        profiler.configure(
+            enabled=enabled,
+            threshold=threshold_ms / 1000 if threshold_ms is not None else None,
+            sample_rate=sample_rate,
+            memory=memory,
+        )
+        stats = profiler.stats()
+        if not stats["enabled"]:
+            return f"⏹️ Profiling is off. {stats['stored']} profiles kept in {profiler.directory}"
+        return (
+            f"⏺️ Profiling {stats['sample_rate']:.0%} of tool calls"
+            + (" with memory tracing" if stats["memory"] else "")
+            + f"; calls over {stats['threshold'] * 1000:.0f} ms are saved to {profiler.directory}\n"
+            f"  {stats['profiled']} calls profiled, {stats['dumped']} saved, {stats['stored']} kept (newest {profiler.keep})"
+        )
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+# Transports main() can serve; the HTTP ones take any number of clients at once
+TRANSPORTS = ("stdio", "sse", "streamable-http")
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+def main(
+    transport: str | None = None,
+    host: str | None = None,
+    port: int | None = None,
+    workers: int | None = None,
+    max_concurrency: int | None = None,
+):
+    """
+    Run the MCP server over stdio, or over HTTP for many clients at once.
+
+    Arguments left as None come from MUSIC_MCP_TRANSPORT, MUSIC_MCP_HOST,
+    MUSIC_MCP_PORT, MUSIC_MCP_WORKERS and MUSIC_MCP_MAX_CONCURRENCY.
+    """
+    global tool_slots
+    transport = transport or os.environ.get("MUSIC_MCP_TRANSPORT", "stdio")
+    if transport not in TRANSPORTS:
+        raise SystemExit(f"Unknown transport '{transport}'. Choose from: {', '.join(TRANSPORTS)}")
+    if workers:
+        # The pool is created on first use, so this still takes effect
+        dispatcher.max_workers = workers
+    if max_concurrency is not None:
+        tool_slots = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+    if transport != "stdio":
+        app.settings.host = host or os.environ.get("MUSIC_MCP_HOST", DEFAULT_HOST)
+        app.settings.port = port or int(os.environ.get("MUSIC_MCP_PORT", DEFAULT_PORT))
+        if app.settings.host not in LOOPBACK_HOSTS:
+            # DNS rebinding protection only admits localhost Host headers; other
+            # clients on the network reach the server by its own name or address
+            app.settings.transport_security = None
+        path = app.settings.streamable_http_path if transport == "streamable-http" else app.settings.sse_path
+        shown = f"[{app.settings.host}]" if ":" in app.settings.host else app.settings.host
+        print(f"🎵 Serving MCP over {transport} at http://{shown}:{app.settings.port}{path}", file=sys.stderr)
+    threading.Thread(target=warm_up, name="spotify-warm-up", daemon=True).start()
+    app.run(transport)
 
 if __name__ == "__main__":
     main()
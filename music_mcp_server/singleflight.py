@@ -0,0 +1,62 @@
+"""
+Single-flight coalescing of identical in-flight Spotify reads.
+
+When several tool calls ask for the same endpoint with the same arguments
+while a request for it is still in flight, they all wait for that one
+request instead of sending their own.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable
+
+# Read-only endpoints whose concurrent identical calls can share one request
+COALESCED_METHODS = frozenset({
+    "current_user",
+    "devices",
+    "currently_playing",
+    "current_playback",
+    "current_user_playlists",
+    "playlist_tracks",
+    "search",
+})
+
+
+class SingleFlight:
+    """
+    Share one in-flight request between identical concurrent calls.
+
+    Results are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, methods: frozenset[str] = COALESCED_METHODS):
+        self.methods = methods
+        self._flights: dict[tuple, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, method: str, key: tuple, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Return fetch()'s result, joining an identical request already in flight."""
+        flight_key = (method, key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            # Run as its own task so a cancelled caller does not cancel the others
+            flight = asyncio.ensure_future(fetch())
+            self._flights[flight_key] = flight
+            flight.add_done_callback(lambda done: self._land(flight_key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(flight)
+
+    def _land(self, flight_key: tuple, flight: asyncio.Task) -> None:
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
+        if not flight.cancelled():
+            # Mark the error as retrieved even if every waiter was cancelled
+            flight.exception()
+
+    def forget(self) -> None:
+        """Make later calls start fresh requests instead of joining ones already in flight."""
+        self._flights.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"started": self.started, "coalesced": self.coalesced, "in_flight": len(self._flights)}
@@ -0,0 +1,227 @@
+"""
+Access token management.
+
+Keeps the Spotify access token fresh on a background thread, so tool calls
+never wait on accounts.spotify.com. The real expiry is persisted to the
+spotipy-compatible `.spotify_cache` file in the config dir, so a restart
+reuses a still-valid token instead of refreshing it.
+
+Every editor window runs its own server process, and they all share that
+file. Writes are atomic (write a temp file, then os.replace) and refreshes
+happen under an advisory lock on `.spotify_cache.lock`: whoever takes the
+lock first refreshes, the rest re-read the file and adopt its token.
+"""
+import base64
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+SCOPE = "user-read-playback-state user-modify-playback-state user-read-currently-playing playlist-modify-public playlist-modify-private playlist-read-private"
+
+# Refresh this many seconds before the token expires
+REFRESH_MARGIN = 300
+# Backoff between failed refresh attempts: full jitter, capped
+RETRY_BASE = 1.0
+RETRY_CAP = 60.0
+
+
+@contextlib.contextmanager
+def file_lock(path: Path):
+    """Hold an exclusive advisory lock on path for the duration of the block."""
+    with open(path, "a+b") as f:
+        if sys.platform == "win32":
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after ~10s; keep waiting
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def write_atomic(path: Path, data: dict) -> None:
+    """Replace path with data as JSON so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+class TokenManager:
+    """
+    Spotify auth manager that refreshes ahead of expiry.
+
+    Implements get_access_token()/get_cached_token() so it can be passed to
+    spotipy.Spotify(auth_manager=...) and AsyncSpotify.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        refresh_token: str,
+        cache_path: Path,
+        token_url: str = TOKEN_URL,
+        margin: float = REFRESH_MARGIN,
+    ):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.cache_path = Path(cache_path)
+        self.token_url = token_url
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.lock_path = self.cache_path.with_name(self.cache_path.name + ".lock")
+        self._token = self._load(refresh_token)
+
+    def _read(self) -> dict | None:
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _load(self, refresh_token: str) -> dict:
+        """Read the cached token, reseeding it if credentials.json has changed."""
+        token = self._read()
+        if not token or token.get("credentials_refresh_token") != refresh_token:
+            # Unknown age: expires_at 0 makes the first refresh happen right away
+            token = {
+                "access_token": "",
+                "refresh_token": refresh_token,
+                "credentials_refresh_token": refresh_token,
+                "token_type": "Bearer",
+                "expires_in": 3600,
+                "scope": SCOPE,
+                "expires_at": 0,
+            }
+        return token
+
+    def _expires_in(self) -> float:
+        return self._token["expires_at"] - time.time()
+
+    def get_cached_token(self) -> dict:
+        """Return the current token info dict."""
+        return self._token
+
+    def get_access_token(self, as_dict: bool = False) -> str | dict:
+        """
+        Return a valid access token.
+
+        Normally this just reads memory. Only if the token has actually
+        expired (e.g. the background refresh kept failing) does the caller
+        block on a refresh.
+        """
+        if self._expires_in() <= 0:
+            self.refresh(min_valid=0)
+        return self._token if as_dict else self._token["access_token"]
+
+    def refresh(self, min_valid: float | None = None) -> dict:
+        """
+        Make sure the token is valid for at least min_valid more seconds.
+
+        Another thread or process may have refreshed while we waited for the
+        locks; if the shared file now holds a token that is fresh enough it
+        is adopted without a network round-trip. min_valid=None always
+        refreshes.
+        """
+        with self._lock, file_lock(self.lock_path):
+            shared = self._read()
+            if shared and shared.get("credentials_refresh_token") == self._token.get("credentials_refresh_token"):
+                if shared["expires_at"] > self._token["expires_at"]:
+                    self._token = shared
+            if min_valid is not None and self._expires_in() > min_valid:
+                return self._token
+            token = dict(self._token)
+            token.update(self._request_token(token["refresh_token"]))
+            token["expires_at"] = int(time.time()) + token["expires_in"]
+            write_atomic(self.cache_path, token)
+            self._token = token
+            return token
+
+    def _request_token(self, refresh_token: str) -> dict:
+        auth_header = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+        data = urllib.parse.urlencode({
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        }).encode()
+        req = urllib.request.Request(
+            self.token_url,
+            data=data,
+            headers={
+                "Authorization": f"Basic {auth_header}",
+                "Content-Type": "application/x-www-form-urlencoded",
+            },
+        )
+        with urllib.request.urlopen(req, timeout=10) as response:
+            token_data = json.loads(response.read().decode())
+        return {key: token_data[key] for key in ("access_token", "token_type", "expires_in", "scope", "refresh_token") if key in token_data}
+
+    # =========================================================================
+    # Background refresh
+    # =========================================================================
+
+    def start(self) -> None:
+        """Start the background refresh thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="spotify-token", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh thread."""
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self) -> None:
+        attempt = 0
+        # Spread wake-ups so sibling processes don't all queue on the lock at once
+        spread = random.uniform(0, self.margin / 5)
+        while not self._stop.is_set():
+            delay = self._expires_in() - self.margin - spread
+            if delay > 0:
+                self._wake.wait(delay)
+                self._wake.clear()
+                continue
+            try:
+                self.refresh(min_valid=self.margin)
+                attempt = 0
+            except Exception as e:
+                delay = random.uniform(0, min(RETRY_CAP, RETRY_BASE * 2 ** attempt))
+                attempt += 1
+                print(f"⚠️ Token refresh failed ({e}), retrying in {delay:.1f}s", file=sys.stderr)
+                self._wake.wait(delay)
+                self._wake.clear()
@@ -0,0 +1,396 @@
+"""
+Background watcher of the Spotify playback state.
+
+PlaybackWatcher polls the player on an adaptive interval: every few seconds
+while a track plays (and again just after it is due to end), less often
+while paused, and with a growing back-off while nothing plays or the API
+keeps failing. Consecutive states are diffed and listeners are told which
+fields changed, so tools can answer from memory and MCP clients can
+subscribe to the playback resource instead of polling it.
+
+Playback commands are applied to the state optimistically, so reading it
+back right after a command costs no request. For a consistency window
+afterwards reads are answered from the prediction; then a poll reconciles
+it with what Spotify reports, and any predicted field that came out
+different is counted as a divergence.
+
+The watcher polls in the background only while an MCP client is
+subscribed. Otherwise reads poll on demand, when the state in memory is
+older than they accept or a prediction is due to be reconciled.
+"""
+import asyncio
+import time
+import weakref
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable
+
+PLAYING_INTERVAL = 5.0
+PAUSED_INTERVAL = 15.0
+IDLE_INTERVAL = 30.0
+MAX_INTERVAL = 120.0
+# Readers accept state this old without polling
+DEFAULT_MAX_AGE = 10.0
+# Spotify takes a moment to reflect a playback command
+SETTLE_DELAY = 0.5
+# After a playback command, reads trust the predicted state for this long
+DEFAULT_WINDOW = 5.0
+# Tracks seen in search results, so playing one can be predicted
+MAX_KNOWN_TRACKS = 1000
+# A position this far from where playback should have got to counts as a seek
+SEEK_TOLERANCE_MS = 3000
+
+# Calls after which the watcher polls again shortly instead of waiting out its interval
+PLAYBACK_WRITES = frozenset({
+    "start_playback",
+    "pause_playback",
+    "next_track",
+    "previous_track",
+    "transfer_playback",
+})
+
+# Positional parameters of the playback commands, as the clients define them
+COMMAND_PARAMS = {
+    "start_playback": ("device_id", "context_uri", "uris", "offset", "position_ms"),
+    "pause_playback": ("device_id",),
+    "next_track": ("device_id",),
+    "previous_track": ("device_id",),
+    "transfer_playback": ("device_id", "force_play"),
+}
+
+
+def track_summary(item: dict) -> dict[str, Any]:
+    return {
+        "uri": item.get("uri"),
+        "name": item.get("name"),
+        "artists": [artist["name"] for artist in item.get("artists", [])],
+        "album": (item.get("album") or {}).get("name"),
+        "duration_ms": item.get("duration_ms"),
+    }
+
+
+def device_summary(device: dict) -> dict[str, Any]:
+    return {
+        "id": device.get("id"),
+        "name": device.get("name"),
+        "type": device.get("type"),
+        "volume_percent": device.get("volume_percent"),
+    }
+
+
+def summarize(playback: dict | None) -> dict[str, Any]:
+    """The parts of a current_playback response the watcher keeps and diffs."""
+    playback = playback or {}
+    item = playback.get("item")
+    device = playback.get("device")
+    context = playback.get("context")
+    return {
+        "is_playing": bool(playback.get("is_playing")),
+        "track": item and track_summary(item),
+        "progress_ms": playback.get("progress_ms"),
+        "device": device and device_summary(device),
+        "shuffle_state": playback.get("shuffle_state"),
+        "repeat_state": playback.get("repeat_state"),
+        "context_uri": context and context.get("uri"),
+    }
+
+
+def changed_fields(old: dict | None, new: dict, elapsed: float) -> list[str]:
+    """
+    Fields that differ between two summaries taken elapsed seconds apart.
+
+    Progress only counts as changed when it jumped (a seek or a restart),
+    not when it moved on as playback went on.
+    """
+    if old is None:
+        return list(new)
+    changed = [field for field in new if field != "progress_ms" and new[field] != old[field]]
+    if "track" not in changed and new["progress_ms"] is not None and old["progress_ms"] is not None:
+        expected = old["progress_ms"] + (elapsed * 1000 if old["is_playing"] else 0)
+        if abs(new["progress_ms"] - expected) > SEEK_TOLERANCE_MS:
+            changed.append("progress_ms")
+    return changed
+
+
+def predict(
+    state: dict, method: str, args: tuple, kwargs: dict, tracks: dict[str, dict], devices: list[dict] | None
+) -> tuple[dict[str, Any], set[str]]:
+    """
+    Expected effect of a successful playback command on state.
+
+    Returns the fields whose new value is known, and the fields the command
+    changes in ways that can't be told in advance (e.g. the track after a
+    skip, or a device that isn't in the last device list).
+    """
+    params = dict(zip(COMMAND_PARAMS[method], args), **kwargs)
+    predicted: dict[str, Any] = {}
+    unknown: set[str] = set()
+    if method == "pause_playback":
+        predicted["is_playing"] = False
+    elif method == "start_playback":
+        predicted["is_playing"] = True
+        if params.get("uris") or params.get("context_uri"):
+            predicted["progress_ms"] = params.get("position_ms") or 0
+            predicted["context_uri"] = params.get("context_uri")
+            track = None
+            if params.get("uris") and params.get("offset") is None:
+                track = tracks.get(params["uris"][0])
+            if track:
+                predicted["track"] = track
+            else:
+                unknown.add("track")
+    elif method in ("next_track", "previous_track"):
+        predicted["progress_ms"] = 0
+        unknown.add("track")
+    elif method == "transfer_playback" and params.get("force_play", True):
+        predicted["is_playing"] = True
+    device_id = params.get("device_id")
+    if device_id and device_id != (state["device"] or {}).get("id"):
+        device = next((d for d in devices or [] if d["id"] == device_id), None)
+        if device:
+            predicted["device"] = device_summary(device)
+        else:
+            unknown.add("device")
+    return predicted, unknown
+
+
+class PlaybackWatcher:
+    """Poll the playback state in the background and publish its changes."""
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[dict | None]],
+        playing_interval: float = PLAYING_INTERVAL,
+        paused_interval: float = PAUSED_INTERVAL,
+        idle_interval: float = IDLE_INTERVAL,
+        max_interval: float = MAX_INTERVAL,
+        window: float = DEFAULT_WINDOW,
+    ):
+        self.fetch = fetch
+        self.playing_interval = playing_interval
+        self.paused_interval = paused_interval
+        self.idle_interval = idle_interval
+        self.max_interval = max_interval
+        self.window = window
+        self.state: dict | None = None
+        self.version = 0
+        self.changed: list[str] = []
+        # Called with (snapshot, changed fields) from the event loop on every change
+        self.listeners: list[Callable[[dict, list[str]], None]] = []
+        # The watcher polls in the background while anything (e.g. a subscribed MCP session) is in here
+        self.subscribers: weakref.WeakSet = weakref.WeakSet()
+        self.interval = idle_interval
+        self.polls = 0
+        self.errors = 0
+        # Optimistic updates, and how many of them Spotify later disagreed with
+        self.applied = 0
+        self.reconciled = 0
+        self.diverged = 0
+        self.diverged_fields: Counter = Counter()
+        self.tracks: OrderedDict[str, dict] = OrderedDict()
+        self._devices: list[dict] | None = None
+        self._predicted: dict[str, Any] = {}
+        self._unknown: set[str] = set()
+        self._written_at = 0.0
+        self._transferred_at = 0.0
+        self._fetched_at = 0.0
+        self._polled_at = 0.0
+        self._stale = False
+        self._quiet_polls = 0
+        self._failures = 0
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start polling in the running event loop unless already started; it stops without subscribers."""
+        loop = asyncio.get_running_loop()
+        if self.running and self._task.get_loop() is loop:
+            return
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._run(), name="playback-watcher")
+
+    def stop(self) -> None:
+        """Stop polling in the background."""
+        if self.running:
+            self._task.cancel()
+        self._task = None
+
+    def poke(self) -> None:
+        """Treat the state as stale and poll again once a playback command has settled."""
+        self._stale = True
+        self._polled_at = time.monotonic()
+        self.interval = SETTLE_DELAY
+        self._quiet_polls = 0
+        if self._wake is not None:
+            self._wake.set()
+
+    def apply(self, method: str, args: tuple, kwargs: dict) -> None:
+        """Update the state with the expected effect of a successful playback command."""
+        if self.state is None:
+            self.poke()
+            return
+        now = time.monotonic()
+        state = self.snapshot()
+        predicted, unknown = predict(state, method, args, kwargs, self.tracks, self._devices)
+        changed = [field for field in predicted if predicted[field] != state[field]] + sorted(unknown)
+        self.state = {field: predicted.get(field, state[field]) for field in self.state}
+        self._fetched_at = now
+        self._stale = False
+        self._predicted = {
+            field: value for field, value in {**self._predicted, **predicted}.items() if field not in unknown
+        }
+        self._unknown = (self._unknown | unknown) - predicted.keys()
+        self._written_at = now
+        self.applied += 1
+        if method == "transfer_playback" and self._devices is not None and "device" not in unknown:
+            self._transferred_at = now
+            active = (predicted.get("device") or state["device"] or {}).get("id")
+            for device in self._devices:
+                device["is_active"] = device["id"] == active
+        # Reconcile after the window, or as soon as Spotify can tell what's unknown
+        self._polled_at = now
+        self.interval = SETTLE_DELAY if self._unknown else self.window
+        if self._wake is not None:
+            self._wake.set()
+        if changed:
+            self._publish(changed)
+
+    def remember_tracks(self, items: list[dict]) -> None:
+        """Keep track details from e.g. search results, for predicting what a play starts."""
+        for item in items:
+            if item and item.get("uri"):
+                self.tracks[item["uri"]] = track_summary(item)
+                self.tracks.move_to_end(item["uri"])
+        while len(self.tracks) > MAX_KNOWN_TRACKS:
+            self.tracks.popitem(last=False)
+
+    def remember_devices(self, devices: list[dict]) -> None:
+        """Keep the device list so transfers can be predicted and read back."""
+        self._devices = [dict(device) for device in devices]
+
+    def devices(self) -> list[dict] | None:
+        """The device list as a transfer left it, while inside its consistency window."""
+        if self._devices is None or time.monotonic() - self._transferred_at >= self.window:
+            return None
+        return [dict(device) for device in self._devices]
+
+    async def latest(self, max_age: float = DEFAULT_MAX_AGE) -> dict:
+        """
+        The current state, polling now if the one in memory is older than max_age seconds.
+
+        Inside the consistency window of a playback command the predicted
+        state is returned as is; if the command made a field unknown, this
+        waits for Spotify to settle and polls. After the window a prediction
+        is reconciled by the next read if no background poll has done so.
+        """
+        now = time.monotonic()
+        if self._unknown:
+            await asyncio.sleep(self._written_at + SETTLE_DELAY - now)
+            if self._unknown:
+                await self.refresh()
+        elif self.state is None:
+            await self.refresh()
+        elif not (self._predicted and now - self._written_at < self.window):
+            if self._stale or self._predicted or now - self._fetched_at > max_age:
+                await self.refresh()
+        return self.snapshot()
+
+    async def refresh(self) -> None:
+        """Poll once and publish the changes."""
+        self._polled_at = time.monotonic()
+        try:
+            playback = await self.fetch()
+        except Exception:
+            self.errors += 1
+            self._failures += 1
+            self.interval = min(self.idle_interval * 2 ** (self._failures - 1), self.max_interval)
+            raise
+        now = time.monotonic()
+        self.polls += 1
+        self._failures = 0
+        new = summarize(playback)
+        changed = changed_fields(self.state, new, now - self._fetched_at)
+        if self._predicted or self._unknown:
+            self.reconciled += 1
+            diverged = [field for field in changed if field in self._predicted]
+            if diverged:
+                self.diverged += 1
+                self.diverged_fields.update(diverged)
+            self._predicted = {}
+            self._unknown = set()
+        self.state = new
+        self._fetched_at = now
+        self._stale = False
+        self.interval = self.next_interval(new, bool(changed))
+        if changed:
+            self._publish(changed)
+        if self._wake is not None:
+            self._wake.set()
+
+    def next_interval(self, state: dict, changed: bool) -> float:
+        """Seconds until the next poll after seeing state."""
+        track = state["track"]
+        if state["is_playing"] and track:
+            self._quiet_polls = 0
+            if track["duration_ms"] and state["progress_ms"] is not None:
+                # Look again right after the track should have ended
+                remaining = (track["duration_ms"] - state["progress_ms"]) / 1000
+                return max(min(self.playing_interval, remaining + SETTLE_DELAY), SETTLE_DELAY)
+            return self.playing_interval
+        self._quiet_polls = 0 if changed else self._quiet_polls + 1
+        base = self.paused_interval if track else self.idle_interval
+        return min(base * 2 ** min(self._quiet_polls, 8), self.max_interval)
+
+    def _publish(self, changed: list[str]) -> None:
+        self.version += 1
+        self.changed = changed
+        snapshot = self.snapshot()
+        for listener in self.listeners:
+            listener(snapshot, changed)
+
+    def snapshot(self) -> dict | None:
+        """The last state seen, with the progress extrapolated to now."""
+        if self.state is None:
+            return None
+        state = dict(self.state, version=self.version, changed=self.changed)
+        if state["is_playing"] and state["progress_ms"] is not None:
+            progress = state["progress_ms"] + int((time.monotonic() - self._fetched_at) * 1000)
+            if state["track"] and state["track"]["duration_ms"]:
+                progress = min(progress, state["track"]["duration_ms"])
+            state["progress_ms"] = progress
+        return state
+
+    async def _run(self) -> None:
+        while True:
+            if not self.subscribers:
+                return
+            now = time.monotonic()
+            due = self._polled_at + self.interval
+            if now >= due:
+                try:
+                    await self.refresh()
+                except Exception:
+                    pass  # Counted in errors; the interval has already backed off
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), due - now)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self.running,
+            "polls": self.polls,
+            "errors": self.errors,
+            "changes": self.version,
+            "interval": self.interval,
+            "subscribers": len(self.subscribers),
+            "applied": self.applied,
+            "reconciled": self.reconciled,
+            "diverged": self.diverged,
+            "diverged_fields": dict(self.diverged_fields),
+        }
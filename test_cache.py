@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests of the response cache in front of the Spotify client.
+
+Drives call_spotify in process with a stand-in client whose reads can be
+held open, to check how cached reads interleave with mutations.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fake_spotify import prepare_home
+
+class HeldClient:
+    """A playlist of track IDs whose reads wait for release once they have looked."""
+
+    def __init__(self):
+        self.items = ["a"]
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def playlist_tracks(self, playlist_id, **kwargs):
+        items = list(self.items)
+        self.reading.set()
+        self.release.wait(5)
+        return {"items": items}
+
+    def playlist_add_items(self, playlist_id, items, position=None):
+        self.items.extend(items)
+        return {"snapshot_id": str(len(self.items))}
+
+def test_read_overlapping_a_write_is_not_cached():
+    """A read that started before a mutation must not cache its older result over it."""
+    home = os.environ.get("HOME")
+    try:
+        with tempfile.TemporaryDirectory() as scratch:
+            prepare_home(Path(scratch))
+            from music_mcp_server import server
+
+            client = HeldClient()
+            server.sp = client
+
+            async def interleave():
+                read = asyncio.ensure_future(server.call_spotify("playlist_tracks", "p1"))
+                await asyncio.to_thread(client.reading.wait, 5)
+                await server.call_spotify("playlist_add_items", "p1", ["b"])
+                client.release.set()
+                overlapping = await read
+                after = await server.call_spotify("playlist_tracks", "p1")
+                return overlapping, after
+
+            overlapping, after = asyncio.run(interleave())
+    finally:
+        if home is not None:
+            os.environ["HOME"] = home
+    assert overlapping == {"items": ["a"]}
+    assert after == {"items": ["a", "b"]}
+    assert server.cache.stats()["playlist_tracks"]["discarded"] == 1
+
+if __name__ == "__main__":
+    test_read_overlapping_a_write_is_not_cached()
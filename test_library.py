@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests of the local playlist mirror.
+
+Drives LibraryMirror directly on a temporary SQLite file, the way
+sync_library and the mutating tools do, and reads it back, through the
+playlist reads and the full-text search.
+"""
+
+import tempfile
+from pathlib import Path
+
+from music_mcp_server.library import LibraryMirror
+
+def playlist(pid: str, name: str, snapshot_id: str) -> dict:
+    return {"id": pid, "name": name, "snapshot_id": snapshot_id, "owner": {"id": "me"}}
+
+def items(*names: str, artist: str | None = None) -> list[dict]:
+    """Playlist items for tracks called names, by artist or else each by "<name> Band"."""
+    return [
+        {"track": {
+            "uri": f"spotify:track:{name.replace(' ', '')}",
+            "id": name.replace(" ", ""),
+            "name": name,
+            "artists": [{"name": artist or f"{name} Band"}],
+            "album": {"name": f"{name} Album"},
+            "duration_ms": 180000,
+        }}
+        for name in names
+    ]
+
+def track_names(mirror: LibraryMirror, pid: str) -> list[str] | None:
+    page = mirror.playlist_items(pid, 0, 100)
+    return None if page is None else [item["track"]["name"] for item in page[0]]
+
+def test_changed_playlist_that_failed_to_sync_is_not_served():
+    """A playlist whose snapshot changed but whose tracks weren't re-fetched stays dirty."""
+    with tempfile.TemporaryDirectory() as scratch:
+        mirror = LibraryMirror(Path(scratch) / "library.sqlite3")
+        road, gym = playlist("p1", "Road trip", "s1"), playlist("p2", "Gym", "g1")
+        mirror.store_playlist(road, items("Old song"))
+        mirror.store_playlist(gym, items("Warm up"))
+        mirror.store_listing([road, gym])
+        assert track_names(mirror, "p1") == ["Old song"]
+
+        edited = dict(road, snapshot_id="s2")
+        new, changed, removed = mirror.diff([edited, gym])
+        assert (new, changed, removed) == ([], [edited], [])
+        # The re-fetch of p1 failed, so only the listing is stored
+        mirror.store_listing([edited, gym])
+
+        assert track_names(mirror, "p1") is None
+        assert track_names(mirror, "p2") == ["Warm up"]
+        assert mirror.diff([edited, gym])[1] == [edited]
+
+def test_mutation_during_a_sync_keeps_the_playlist_dirty():
+    """Tracks fetched before a mutation's dirty mark must not clear it when stored."""
+    with tempfile.TemporaryDirectory() as scratch:
+        mirror = LibraryMirror(Path(scratch) / "library.sqlite3")
+        road, gym = playlist("p1", "Road trip", "s1"), playlist("p2", "Gym", "g1")
+        mirror.store_playlist(road, items("Old song"))
+        mirror.store_listing([road])
+
+        # sync_library reads the generations, then fetches; meanwhile tracks are added to p1 and p2
+        generations = {pid: mirror.generation(pid) for pid in ("p1", "p2")}
+        fetched = items("Old song")
+        mirror.mark_dirty_for("playlist_add_items", ("p1", ["spotify:track:New"]))
+        mirror.mark_dirty_for("playlist_add_items", ("p2", ["spotify:track:New"]))
+        mirror.store_playlist(road, fetched, generations["p1"])
+        mirror.store_playlist(gym, items("Warm up"), generations["p2"])
+        mirror.store_listing([road, gym])
+
+        assert track_names(mirror, "p1") is None
+        assert track_names(mirror, "p2") is None
+        assert {p["id"] for p in mirror.diff([road, gym])[1]} == {"p1", "p2"}
+
+        # The next sync starts after the mutation and clears the mark
+        mirror.store_playlist(road, items("Old song", "New"), mirror.generation("p1"))
+        mirror.store_listing([road, gym])
+        assert track_names(mirror, "p1") == ["Old song", "New"]
+
+def test_search_ranks_prefix_matches_and_follows_the_listing():
+    with tempfile.TemporaryDirectory() as scratch:
+        mirror = LibraryMirror(Path(scratch) / "library.sqlite3")
+        road, gym = playlist("p1", "Road trip", "s1"), playlist("p2", "Gym", "g1")
+        mirror.store_playlist(road, items("Around the World", "Harder Better", artist="Daft Punk"))
+        mirror.store_playlist(gym, items("Around the World", artist="Daft Punk") + items("Punk Rock", "Beyoncé Medley"))
+        mirror.store_listing([road, gym])
+
+        # Every word matches as a prefix; a track in two playlists is one hit listing both
+        hits = {hit["name"]: hit for hit in mirror.search("daft pun", 10)}
+        assert set(hits) == {"Around the World", "Harder Better"}
+        assert sorted(hits["Around the World"]["playlists"]) == ["Gym", "Road trip"]
+        assert hits["Harder Better"]["artists"] == [{"name": "Daft Punk"}]
+        # A match in the track name outranks one in the artist
+        assert [hit["name"] for hit in mirror.search("punk", 10)][0] == "Punk Rock"
+        assert [hit["name"] for hit in mirror.search("beyonce", 10)] == ["Beyoncé Medley"]
+        assert [hit["name"] for hit in mirror.search("punk", 1)] == ["Punk Rock"]
+        assert mirror.search("  ", 10) == []
+
+        # Renaming a playlist re-indexes its tracks; an unlisted playlist leaves the index
+        workout = dict(gym, name="Workout")
+        mirror.store_listing([workout])
+        assert mirror.search("gym", 10) == []
+        assert {hit["name"] for hit in mirror.search("workout", 10)} == {"Around the World", "Punk Rock", "Beyoncé Medley"}
+        assert mirror.search("harder", 10) == []
+        assert mirror.search("around", 10)[0]["playlists"] == ["Workout"]
+
+def test_stats_survive_an_unreadable_file():
+    """The metrics read stats from other threads; a broken file reads as empty instead of raising."""
+    with tempfile.TemporaryDirectory() as scratch:
+        path = Path(scratch) / "library.sqlite3"
+        path.write_bytes(b"not a database" * 512)
+        assert LibraryMirror(path).stats() == {"playlists": 0, "dirty": 0, "tracks": 0}
+
+if __name__ == "__main__":
+    test_changed_playlist_that_failed_to_sync_is_not_served()
+    test_mutation_during_a_sync_keeps_the_playlist_dirty()
+    test_search_ranks_prefix_matches_and_follows_the_listing()
+    test_stats_survive_an_unreadable_file()
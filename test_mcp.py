@@ -1,115 +1,84 @@
 #!/usr/bin/env python3
 """
 Simple MCP client for testing the music MCP server.
-This script sends MCP protocol messages and displays responses.
+
+Starts music_mcp_server.server over stdio, the way an MCP client does, with
+the Spotify API and token endpoint pointed at the local stand-in in
+benchmarks/fake_spotify.py, and checks the handshake and a few tools.
+Runs under pytest or on its own.
 """
 
 import asyncio
 import json
+import os
 import sys
-from typing import Dict, Any
-
-async def test_mcp_server():
+import tempfile
+from pathlib import Path
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fake_spotify import FakeSpotifyServer, prepare_home
+
+async def exercise_server(env: dict) -> dict:
+    """Run the server and return the text of a few tool calls, keyed by tool (and output format)."""
+    params = StdioServerParameters(
+        command=sys.executable, args=["-m", "music_mcp_server.server"], env=env, cwd=str(ROOT),
+    )
+    with open(os.devnull, "w") as devnull:
+        async with stdio_client(params, errlog=devnull) as (read, write):
+            async with ClientSession(read, write) as session:
+                init = await session.initialize()
+                print(f"Connected to {init.serverInfo.name}")
+                tools = [tool.name for tool in (await session.list_tools()).tools]
+                print(f"Tools: {', '.join(tools)}")
+                results = {"tools": tools}
+                for key, name, arguments in [
+                    ("current_track", "current_track", {}),
+                    ("get_devices", "get_devices", {}),
+                    ("get_playlists", "get_playlists", {"limit": 2}),
+                    ("search_tracks", "search_tracks", {"query": "test", "limit": 2}),
+                    ("search_tracks:json", "search_tracks", {"query": "test", "limit": 2, "fields": "uri", "output": "json"}),
+                    ("search_tracks:default", "search_tracks", {"query": "test", "limit": 2, "output": "json"}),
+                ]:
+                    result = await session.call_tool(name, arguments)
+                    results[key] = result.content[0].text
+                    print(f"\n{key}: {results[key]}")
+                return results
+
+def test_mcp_server():
     """Test the MCP server by running it and sending test messages."""
-
-    # Import the server module
-    import server
-
-    # Create a mock stdin/stdout for testing
-    from io import StringIO
-    import threading
-    import queue
-
-    # We'll run the server in a separate thread and communicate via queues
-    request_queue = queue.Queue()
-    response_queue = queue.Queue()
-
-    class MockStream:
-        def __init__(self, input_queue, output_queue):
-            self.input_queue = input_queue
-            self.output_queue = output_queue
-
-        async def read(self):
-            # Wait for a message from the input queue
-            while True:
-                try:
-                    message = self.input_queue.get_nowait()
-                    return message
-                except queue.Empty:
-                    await asyncio.sleep(0.1)
-
-        async def write(self, message):
-            self.output_queue.put(message)
-
-    # Create mock streams
-    mock_read_stream = MockStream(request_queue, response_queue)
-    mock_write_stream = MockStream(response_queue, request_queue)
-
-    # Start the server in a separate task
-    async def run_server():
-        try:
-            await server.server.run(
-                mock_read_stream,
-                mock_write_stream,
-                server.server.create_initialization_options()
-            )
-        except Exception as e:
-            print(f"Server error: {e}")
-
-    server_task = asyncio.create_task(run_server())
-
-    # Wait a bit for server to start
-    await asyncio.sleep(1)
-
-    # Test messages
-    test_messages = [
-        {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {
-                    "name": "test-client",
-                    "version": "1.0.0"
-                }
-            }
-        },
-        {
-            "jsonrpc": "2.0",
-            "id": 2,
-            "method": "tools/list",
-            "params": {}
-        }
-    ]
-
-    print("Testing MCP Server...")
-    print("=" * 50)
-
-    for i, message in enumerate(test_messages):
-        print(f"\nTest {i+1}: {message['method']}")
-        print(f"Request: {json.dumps(message, indent=2)}")
-
-        # Send message to server
-        request_queue.put(json.dumps(message).encode() + b'\n')
-
-        # Wait for response
-        try:
-            response_data = await asyncio.wait_for(mock_read_stream.read(), timeout=5.0)
-            response = json.loads(response_data.decode())
-            print(f"Response: {json.dumps(response, indent=2)}")
-        except asyncio.TimeoutError:
-            print("Timeout waiting for response")
-        except Exception as e:
-            print(f"Error: {e}")
-
-    # Clean up
-    server_task.cancel()
+    fake = FakeSpotifyServer(("127.0.0.1", 0)).start()
+    home = os.environ.get("HOME")
     try:
-        await server_task
-    except asyncio.CancelledError:
-        pass
+        with tempfile.TemporaryDirectory() as scratch:
+            prepare_home(Path(scratch))
+            env = dict(
+                os.environ,
+                PYTHONPATH=str(ROOT),
+                MUSIC_MCP_API_URL=fake.url,
+                MUSIC_MCP_TOKEN_URL=fake.token_url,
+            )
+            results = asyncio.run(exercise_server(env))
+    finally:
+        if home is not None:
+            os.environ["HOME"] = home
+        fake.shutdown()
+
+    assert {"play_music", "current_track", "get_playlists", "search_tracks"} <= set(results["tools"])
+    assert results["current_track"].startswith("🎵 Now playing: Track 0")
+    assert "Laptop" in results["get_devices"]
+    assert results["get_playlists"].startswith("Your playlists (1-2 of 5)")
+    assert results["search_tracks"].startswith("Search results for 'test'")
+    compact = json.loads(results["search_tracks:json"])
+    assert compact["fields"] == ["uri"] and len(compact["tracks"]) == 2
+    assert compact["tracks"][0][0].startswith("spotify:track:")
+    default = json.loads(results["search_tracks:default"])
+    assert default["fields"] == ["name", "artists", "id"]
+    assert all(isinstance(row[1], str) for row in default["tracks"])
 
 if __name__ == "__main__":
-    asyncio.run(test_mcp_server())
\ No newline at end of file
+    test_mcp_server()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Randomized check of the playlist sync planner.
+
+Applies every plan_sync plan to the playlist it was made for, step by step,
+and checks it lands on the target within the Web API's per-request limits.
+"""
+
+import random
+
+from music_mcp_server.playlist_diff import MAX_ITEMS, apply_step, plan_sync, replace_steps
+
+def random_playlist(rng: random.Random, size: int, alphabet: int) -> list[str]:
+    return [f"spotify:track:{rng.randrange(alphabet)}" for _ in range(size)]
+
+def test_plans_reach_the_target():
+    """Plans for random playlists, with duplicates and past one request's worth of items, are exact."""
+    rng = random.Random(17)
+    for case in range(3000):
+        alphabet = rng.choice([3, 20, 400])
+        current = random_playlist(rng, rng.randrange(0, 250), alphabet)
+        if rng.random() < 0.5:
+            # A nearby edit of current, the common case for sync_playlist
+            target = [uri for uri in current if rng.random() > 0.1]
+            if rng.random() < 0.2:
+                rng.shuffle(target)
+            for _ in range(rng.randrange(0, 150)):
+                target.insert(rng.randrange(len(target) + 1), random_playlist(rng, 1, alphabet)[0])
+        else:
+            target = random_playlist(rng, rng.randrange(0, 250), alphabet)
+
+        plan = plan_sync(current, target)
+        tracks = list(current)
+        for step in plan:
+            if step[0] != "move":
+                assert len(step[1]) <= MAX_ITEMS, (case, step[0], len(step[1]))
+            tracks = apply_step(tracks, step)
+        assert tracks == target, case
+        assert len(plan) <= len(replace_steps(target)) or current == target, case
+
+if __name__ == "__main__":
+    test_plans_reach_the_target()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Tests of the scheduler in front of outbound Spotify calls.
+
+Runs Scheduler.run with stand-in calls that count their attempts and answer
+429s like spotipy does: with the response headers when Spotify throttled,
+and without them when spotipy's own retries ran out. The lane tests starve
+the bucket to see which queued call gets the next token.
+"""
+
+import asyncio
+import time
+
+import pytest
+from spotipy.exceptions import SpotifyException
+
+from music_mcp_server.scheduler import BULK, INTERACTIVE, Overloaded, Scheduler, call_deadline
+
+def throttled(retry_after: str | None = "0.2") -> SpotifyException:
+    headers = None if retry_after is None else {"Retry-After": retry_after}
+    return SpotifyException(429, -1, "API rate limit exceeded", headers=headers)
+
+class FlakyCall:
+    """Fails with each of errors in turn, then returns "ok"; records when each attempt started."""
+
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.attempts: list[float] = []
+
+    async def __call__(self, remaining: float) -> str:
+        self.attempts.append(time.monotonic())
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+def test_token_bucket_spaces_out_calls_past_the_burst():
+    """Calls beyond the burst wait for the bucket to refill at rate per second."""
+    async def burst_of_calls():
+        scheduler = Scheduler(rate=20, burst=2, lanes={"bulk": (10, 0, 0)})
+        calls = [FlakyCall() for _ in range(6)]
+        start = time.monotonic()
+        await asyncio.gather(*(scheduler.run(call) for call in calls))
+        return sorted(call.attempts[0] - start for call in calls)
+
+    started = asyncio.run(burst_of_calls())
+    assert started[1] < 0.05
+    # Four more tokens at 20 per second
+    assert started[-1] >= 0.18
+
+def test_429_pauses_everyone_and_requeues_the_call():
+    """A 429 with Retry-After holds back every call for that long, then retries the throttled one."""
+    async def throttle_once():
+        scheduler = Scheduler(rate=100, burst=10)
+        call, other = FlakyCall(throttled("0.3")), FlakyCall()
+        start = time.monotonic()
+        first = asyncio.ensure_future(scheduler.run(call))
+        await asyncio.sleep(0.05)
+        assert await scheduler.run(other) == "ok"
+        assert await first == "ok"
+        return scheduler, call, other, start
+
+    scheduler, call, other, start = asyncio.run(throttle_once())
+    assert scheduler.throttled == 1
+    assert len(call.attempts) == 2
+    assert call.attempts[1] - start >= 0.3
+    assert other.attempts[0] - start >= 0.3
+
+def test_429_without_headers_is_not_retried():
+    """spotipy's own give-up after its retries is raised as is, without pausing the bucket."""
+    async def exhausted():
+        scheduler = Scheduler()
+        call = FlakyCall(throttled(None))
+        with pytest.raises(SpotifyException):
+            await scheduler.run(call)
+        return scheduler, call
+
+    scheduler, call = asyncio.run(exhausted())
+    assert len(call.attempts) == 1
+    assert scheduler.throttled == 0
+    assert scheduler._paused_until == 0.0
+
+def test_server_errors_are_not_retried():
+    async def unavailable():
+        scheduler = Scheduler()
+        call = FlakyCall(SpotifyException(503, -1, "Service unavailable", headers={"Retry-After": "1"}))
+        with pytest.raises(SpotifyException):
+            await scheduler.run(call)
+        return scheduler, call
+
+    scheduler, call = asyncio.run(unavailable())
+    assert len(call.attempts) == 1
+    assert scheduler.throttled == 0
+
+def test_retry_after_past_the_deadline_gives_up_at_once():
+    async def long_pause():
+        scheduler = Scheduler(deadline=0.5)
+        call = FlakyCall(throttled("5"))
+        start = time.monotonic()
+        with pytest.raises(TimeoutError, match="past this call's deadline"):
+            await scheduler.run(call)
+        return time.monotonic() - start, call
+
+    elapsed, call = asyncio.run(long_pause())
+    assert elapsed < 0.2
+    assert len(call.attempts) == 1
+
+def test_queueing_past_the_deadline_times_out():
+    """A call still waiting for a token when its deadline passes gives up with TimeoutError."""
+    async def starved():
+        scheduler = Scheduler(rate=1, burst=1, deadline=0.3)
+        await scheduler.run(FlakyCall())
+        start = time.monotonic()
+        with pytest.raises(TimeoutError, match="gave up waiting"):
+            await scheduler.run(FlakyCall())
+        return time.monotonic() - start, scheduler
+
+    elapsed, scheduler = asyncio.run(starved())
+    assert 0.25 <= elapsed < 0.6
+    # The abandoned waiter doesn't linger in the queue
+    assert scheduler.stats()["bulk"]["queued"] == 0
+
+def test_shared_deadline_limits_every_call_in_the_block():
+    async def shared():
+        scheduler = Scheduler(rate=1, burst=1)
+        await scheduler.run(FlakyCall())
+        with call_deadline(0.2), pytest.raises(TimeoutError):
+            await scheduler.run(FlakyCall())
+
+    start = time.monotonic()
+    asyncio.run(shared())
+    assert time.monotonic() - start < 0.5
+
+def test_interactive_calls_jump_a_full_bulk_queue():
+    """The next token goes to an interactive call queued after bulk ones, and bulk past max_queue is shed."""
+    async def contend():
+        scheduler = Scheduler(rate=10, burst=1, lanes={INTERACTIVE: (4, 0, 0), BULK: (4, 2, 0)})
+        order = []
+
+        def recorded(name):
+            async def call(remaining):
+                order.append(name)
+            return call
+
+        await scheduler.run(recorded("first"), BULK)
+        queued = [asyncio.ensure_future(scheduler.run(recorded(f"bulk {n}"), BULK)) for n in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded):
+            await scheduler.run(recorded("shed"), BULK)
+        await scheduler.run(recorded("interactive"), INTERACTIVE)
+        await asyncio.gather(*queued)
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(contend())
+    assert order == ["first", "interactive", "bulk 0", "bulk 1"]
+    assert stats[BULK]["shed"] == 1
+    assert stats[BULK]["started"] == 3
+    assert stats[INTERACTIVE]["started"] == 1
+
+def test_bulk_leaves_reserve_tokens_for_interactive_calls():
+    async def reserve():
+        scheduler = Scheduler(rate=1, burst=3, lanes={INTERACTIVE: (4, 0, 0), BULK: (4, 0, 2)})
+        await scheduler.run(FlakyCall(), BULK)
+        held = asyncio.ensure_future(scheduler.run(FlakyCall(), BULK))
+        await asyncio.sleep(0.01)
+        start = time.monotonic()
+        await scheduler.run(FlakyCall(), INTERACTIVE)
+        elapsed = time.monotonic() - start
+        queued = scheduler.stats()[BULK]["queued"]
+        held.cancel()
+        return elapsed, queued
+
+    elapsed, queued = asyncio.run(reserve())
+    assert elapsed < 0.05
+    # The second bulk call waits for the bucket to refill above the reserve
+    assert queued == 1
+
+if __name__ == "__main__":
+    test_token_bucket_spaces_out_calls_past_the_burst()
+    test_429_pauses_everyone_and_requeues_the_call()
+    test_429_without_headers_is_not_retried()
+    test_server_errors_are_not_retried()
+    test_retry_after_past_the_deadline_gives_up_at_once()
+    test_queueing_past_the_deadline_times_out()
+    test_shared_deadline_limits_every_call_in_the_block()
+    test_interactive_calls_jump_a_full_bulk_queue()
+    test_bulk_leaves_reserve_tokens_for_interactive_calls()
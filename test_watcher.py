@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Tests of the playback watcher.
+
+Feeds PlaybackWatcher current_playback responses from a stand-in fetch and
+checks what it reports as changed, how often it polls, and that its
+background poll loop keeps going while someone is subscribed.
+"""
+
+import asyncio
+
+from music_mcp_server.watcher import SETTLE_DELAY, PlaybackWatcher, changed_fields, summarize
+
+def playback(track: int | None = 1, progress_ms: int = 10_000, is_playing: bool = True, duration_ms: int = 200_000) -> dict:
+    """A current_playback response playing track number track, or nothing if None."""
+    if track is None:
+        return {"is_playing": False, "item": None, "progress_ms": None, "device": None}
+    return {
+        "is_playing": is_playing,
+        "progress_ms": progress_ms,
+        "item": {
+            "uri": f"spotify:track:{track}",
+            "name": f"Track {track}",
+            "artists": [{"name": "Artist"}],
+            "album": {"name": "Album"},
+            "duration_ms": duration_ms,
+        },
+        "device": {"id": "laptop", "name": "Laptop", "type": "Computer", "volume_percent": 50},
+        "shuffle_state": False,
+        "repeat_state": "off",
+        "context": None,
+    }
+
+class Session:
+    """Stands in for a subscribed MCP session."""
+
+def test_progress_only_changes_on_a_seek():
+    playing = summarize(playback(progress_ms=10_000))
+    # Two seconds of playback later
+    assert changed_fields(playing, summarize(playback(progress_ms=12_000)), 2.0) == []
+    # A jump well past where playback should have got to
+    assert changed_fields(playing, summarize(playback(progress_ms=90_000)), 2.0) == ["progress_ms"]
+    # Restarting the track
+    assert changed_fields(playing, summarize(playback(progress_ms=0)), 2.0) == ["progress_ms"]
+    # Paused progress stays put however long it has been
+    paused = summarize(playback(progress_ms=10_000, is_playing=False))
+    assert changed_fields(paused, summarize(playback(progress_ms=10_000, is_playing=False)), 60.0) == []
+    # A new track is reported as such, not also as a seek
+    assert changed_fields(playing, summarize(playback(track=2, progress_ms=0)), 2.0) == ["track"]
+    assert changed_fields(None, playing, 0.0) == list(playing)
+
+def test_interval_follows_playback_and_backs_off_while_idle():
+    watcher = PlaybackWatcher(fetch=None, playing_interval=5, paused_interval=15, idle_interval=30, max_interval=120)
+    assert watcher.next_interval(summarize(playback(progress_ms=10_000)), False) == 5
+    # Look again right after the track should end
+    assert watcher.next_interval(summarize(playback(progress_ms=198_000)), False) == 2 + SETTLE_DELAY
+
+    idle = summarize(playback(track=None))
+    assert [watcher.next_interval(idle, False) for _ in range(4)] == [60, 120, 120, 120]
+    # A change resets the back-off
+    assert watcher.next_interval(idle, True) == 30
+    paused = summarize(playback(is_playing=False))
+    assert [watcher.next_interval(paused, False) for _ in range(2)] == [30, 60]
+
+def test_failed_polls_back_off():
+    async def failing():
+        async def fetch():
+            raise ConnectionError("offline")
+
+        watcher = PlaybackWatcher(fetch, idle_interval=30, max_interval=120)
+        intervals = []
+        for _ in range(4):
+            try:
+                await watcher.refresh()
+            except ConnectionError:
+                intervals.append(watcher.interval)
+        return watcher, intervals
+
+    watcher, intervals = asyncio.run(failing())
+    assert intervals == [30, 60, 120, 120]
+    assert watcher.errors == 4
+
+def test_poll_loop_keeps_polling_while_subscribed():
+    """The loop waits out its interval with a timeout and polls again, until the last subscriber leaves."""
+    async def subscribed():
+        polls = 0
+
+        async def fetch():
+            nonlocal polls
+            polls += 1
+            return playback(progress_ms=10_000 + polls * 50)
+
+        # Polls are never closer than SETTLE_DELAY apart
+        watcher = PlaybackWatcher(fetch, playing_interval=SETTLE_DELAY)
+        session = Session()
+        watcher.subscribers.add(session)
+        watcher.start()
+        await asyncio.sleep(2.2 * SETTLE_DELAY)
+        running, polled = watcher.running, polls
+        watcher.subscribers.discard(session)
+        await asyncio.sleep(1.2 * SETTLE_DELAY)
+        return running, polled, watcher.running
+
+    running, polled, still_running = asyncio.run(subscribed())
+    assert running
+    # At least one poll came after a wait that timed out
+    assert polled >= 2
+    assert not still_running
+
+def test_reads_without_subscribers_poll_on_demand():
+    async def unsubscribed():
+        polls = 0
+
+        async def fetch():
+            nonlocal polls
+            polls += 1
+            return playback()
+
+        watcher = PlaybackWatcher(fetch)
+        first = await watcher.latest()
+        again = await watcher.latest()
+        stale = await watcher.latest(max_age=0)
+        return watcher, polls, first, again, stale
+
+    watcher, polls, first, again, stale = asyncio.run(unsubscribed())
+    assert first["track"]["name"] == again["track"]["name"] == stale["track"]["name"] == "Track 1"
+    # The second read is answered from memory; max_age=0 asks again
+    assert polls == 2
+    assert not watcher.running
+
+class ScriptedFetch:
+    """Answers each poll with playback(**state), counting the polls."""
+
+    def __init__(self, **state):
+        self.state = state
+        self.polls = 0
+
+    async def __call__(self):
+        self.polls += 1
+        return playback(**self.state)
+
+def test_playing_known_uris_is_predicted():
+    async def play():
+        fetch = ScriptedFetch(track=1)
+        watcher = PlaybackWatcher(fetch, window=0.2)
+        await watcher.latest()
+        watcher.remember_tracks([playback(track=7)["item"]])
+        watcher.apply("start_playback", (), {"uris": ["spotify:track:7"]})
+        predicted = await watcher.latest()
+        return fetch.polls, predicted, watcher.changed
+
+    polls, predicted, changed = asyncio.run(play())
+    # Read back from the prediction, without another poll
+    assert polls == 1
+    assert predicted["track"]["name"] == "Track 7"
+    assert predicted["is_playing"] and predicted["progress_ms"] < 1000
+    assert "track" in changed and "progress_ms" in changed
+
+def test_playing_an_unknown_uri_waits_for_spotify():
+    async def play():
+        fetch = ScriptedFetch(track=1)
+        watcher = PlaybackWatcher(fetch)
+        await watcher.latest()
+        watcher.apply("start_playback", (), {"uris": ["spotify:track:9"]})
+        fetch.state = {"track": 9, "progress_ms": 0}
+        return fetch.polls, await watcher.latest(), watcher.stats()
+
+    polls, state, stats = asyncio.run(play())
+    assert polls == 1
+    assert state["track"]["name"] == "Track 9"
+    # Nothing was predicted about the track, so nothing diverged
+    assert stats["reconciled"] == 1 and stats["diverged"] == 0
+
+def test_transfer_is_predicted_from_the_device_list():
+    async def transfer():
+        fetch = ScriptedFetch(track=1)
+        watcher = PlaybackWatcher(fetch)
+        await watcher.latest()
+        watcher.remember_devices([
+            {"id": "laptop", "name": "Laptop", "type": "Computer", "volume_percent": 50, "is_active": True},
+            {"id": "phone", "name": "Phone", "type": "Smartphone", "volume_percent": 80, "is_active": False},
+        ])
+        watcher.apply("transfer_playback", ("phone",), {})
+        return fetch.polls, await watcher.latest(), watcher.devices()
+
+    polls, state, devices = asyncio.run(transfer())
+    assert polls == 1
+    assert state["device"]["name"] == "Phone" and state["is_playing"]
+    assert [device["id"] for device in devices if device["is_active"]] == ["phone"]
+
+def test_reconcile_counts_divergence_by_field():
+    async def disagree():
+        fetch = ScriptedFetch(track=1)
+        watcher = PlaybackWatcher(fetch, window=0.05)
+        await watcher.latest()
+        watcher.remember_tracks([playback(track=7)["item"]])
+        watcher.apply("start_playback", (), {"uris": ["spotify:track:7"]})
+        # Spotify ends up playing something else
+        fetch.state = {"track": 8, "progress_ms": 0}
+        await asyncio.sleep(0.1)
+        state = await watcher.latest()
+        return state, watcher.stats()
+
+    state, stats = asyncio.run(disagree())
+    assert state["track"]["name"] == "Track 8"
+    assert stats["applied"] == 1 and stats["reconciled"] == 1
+    assert stats["diverged"] == 1
+    assert stats["diverged_fields"] == {"track": 1}
+
+if __name__ == "__main__":
+    test_progress_only_changes_on_a_seek()
+    test_interval_follows_playback_and_backs_off_while_idle()
+    test_failed_polls_back_off()
+    test_poll_loop_keeps_polling_while_subscribed()
+    test_reads_without_subscribers_poll_on_demand()
+    test_playing_known_uris_is_predicted()
+    test_playing_an_unknown_uri_waits_for_spotify()
+    test_transfer_is_predicted_from_the_device_list()
+    test_reconcile_counts_divergence_by_field()